@@ -7,13 +7,18 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from dotenv import load_dotenv
+from app.services.db_routing import RoutingSession, replica_binds
+from app.services.sharding import shard_binds
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 import os
+import sqlite3
 
 # Load environment variables
 load_dotenv()
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 def create_app():
@@ -25,27 +30,101 @@ def create_app():
     
     # Database configuration
     database_url = os.getenv('DATABASE_URL', 'postgresql://postgres@localhost/chatbot_db')
-    if database_url.startswith('postgresql://'):
-        database_url = database_url.replace('postgresql://', 'postgresql+pg8000://', 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_DATABASE_URI'] = _driver_url(database_url)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Read replicas (DATABASE_REPLICA_URLS, comma-separated)
+    replica_urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    binds = replica_binds([_driver_url(url) for url in replica_urls])
+    
+    # Chat data shards (CHAT_SHARD_URLS, comma-separated; order is significant)
+    shard_urls = [url.strip() for url in os.getenv('CHAT_SHARD_URLS', '').split(',') if url.strip()]
+    binds.update(shard_binds([_driver_url(url) for url in shard_urls]))
+    if binds:
+        app.config['SQLALCHEMY_BINDS'] = binds
+    
     # Initialize extensions with app
     db.init_app(app)
+    
+    # Route read-only paths to the replicas, if any
+    from app.services.db_routing import init_replicas
+    init_replicas(app, db)
+    
+    # Server-side sessions (SESSION_BACKEND=memory|file|database; default: signed cookie)
+    from app.services.session_store import init_session_store
+    init_session_store(app)
+    
+    # Per-request timing breakdown (INSTRUMENTATION_ENABLED=true)
+    from app.services.instrumentation import init_instrumentation
+    init_instrumentation(app, db)
+    
+    # Prometheus /metrics endpoint (METRICS_ENABLED=true)
+    from app.services.metrics import init_metrics
+    init_metrics(app, db)
+    
+    # Group commit for chat messages (WRITE_BEHIND_ENABLED=true)
+    from app.services.write_behind import init_write_behind
+    init_write_behind(app)
+    
+    # Background purge of deleted chats (CHAT_PURGE_ASYNC=false to purge inline)
+    from app.services.chat_purge import init_chat_purge
+    init_chat_purge(app)
+    
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     
+    @login_manager.user_loader
+    def load_user(user_id):
+        """Load user for Flask-Login (served from the identity cache when warm)"""
+        from app.services.identity_cache import load_identity
+        return load_identity(int(user_id))
+    
     # Register blueprints
     from app.views.auth import auth_bp
     from app.views.chat import chat_bp
     from app.views.main import main_bp
+    from app.views.health import health_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(chat_bp)
     app.register_blueprint(main_bp)
+    app.register_blueprint(health_bp)
+    
+    # Background database/provider checks behind /healthz and /readyz
+    from app.views.chat import chat_controller
+    from app.services.health import init_health
+    init_health(app, chat_controller.providers, chat_controller.provider_names())
+    
+    # Optional multiplexed WebSocket channel
+    if os.getenv('ENABLE_WEBSOCKET', 'false').lower() in ('1', 'true', 'yes'):
+        from app.views.ws import init_websocket
+        init_websocket(app)
     
     # Create database tables
     with app.app_context():
-        db.create_all()
+        from app import models  # register all models before create_all
+        # Only the primary: replicas hold no tables of their own (and may be
+        # down at boot), and init_sharding creates the shard tables
+        db.create_all(bind_key=None)
+    
+    # Spread chat data over the shards, if any
+    from app.services.sharding import init_sharding
+    init_sharding(app, db)
     
     return app
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite only enforces foreign keys (and ON DELETE CASCADE) when enabled per connection"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+def _driver_url(database_url):
+    """Use the pg8000 driver for postgresql:// URLs"""
+    if database_url.startswith('postgresql://'):
+        return database_url.replace('postgresql://', 'postgresql+pg8000://', 1)
+    return database_url
@@ -5,5 +5,6 @@ Controllers Package
 from .auth_controller import AuthController
 from .chat_controller import ChatController
 from .user_controller import UserController
+from .usage_controller import UsageController
 
-__all__ = ['AuthController', 'ChatController', 'UserController']
+__all__ = ['AuthController', 'ChatController', 'UserController', 'UsageController']
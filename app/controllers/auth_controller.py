@@ -3,11 +3,16 @@ Authentication Controller
 Handles user registration, login, and logout
 """
 
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user
+from sqlalchemy.exc import IntegrityError
 from app.models.user import User
+from app.services.password_service import get_password_hasher
 from app import db
 
+# Substrings identifying the email unique constraints in IntegrityError messages
+# (Postgres constraint/index names, SQLite "table.column")
+EMAIL_CONSTRAINT_MARKERS = ('user_email_key', 'ix_user_email_lower', 'user.email')
+
 class AuthController:
     """Controller for authentication operations"""
     
@@ -24,42 +29,32 @@ class AuthController:
         Returns:
             tuple: (success, message, user)
         """
-        import pdb; pdb.set_trace()  # Debug breakpoint
-        
         try:
             print(f"DEBUG: Starting user registration for {username}")
             
-            # Check if username already exists
-            existing_user = User.query.filter_by(username=username).first()
-            if existing_user:
-                print(f"DEBUG: Username {username} already exists")
-                return False, 'Username already exists', None
-            
-            # Check if email already exists
-            existing_email = User.query.filter_by(email=email).first()
-            if existing_email:
-                print(f"DEBUG: Email {email} already registered")
-                return False, 'Email already registered', None
-            
-            print(f"DEBUG: Creating new user")
-            
-            # Create new user
+            # Uniqueness is enforced by the database; a violation means the
+            # username or email is taken, so no existence queries up front
             user = User(
                 username=username,
                 email=email,
-                password_hash=generate_password_hash(password)
+                password_hash=get_password_hasher().hash(password)
             )
             
-            print(f"DEBUG: User object created: {user}")
-            
             db.session.add(user)
-            print(f"DEBUG: User added to session")
-            
             db.session.commit()
             print(f"DEBUG: User committed to database")
             
             return True, 'Registration successful! Please login.', user
             
+        except IntegrityError as e:
+            db.session.rollback()
+            detail = str(e.orig).lower()
+            if any(marker in detail for marker in EMAIL_CONSTRAINT_MARKERS):
+                print(f"DEBUG: Email {email} already registered")
+                return False, 'Email already registered', None
+            print(f"DEBUG: Username {username} already exists")
+            return False, 'Username already exists', None
+            
         except Exception as e:
             print(f"DEBUG: Exception occurred: {str(e)}")
             db.session.rollback()
@@ -78,18 +73,24 @@ class AuthController:
             tuple: (success, message, user)
         """
         try:
-            # Try to find user by username first, then by email
-            user = User.query.filter_by(username=username_or_email).first()
-            if not user:
-                user = User.query.filter_by(email=username_or_email).first()
+            # Username or email in a single query
+            user = User.find_by_login(username_or_email)
+            
+            hasher = get_password_hasher()
+            matches, needs_rehash = hasher.verify(user.password_hash, password) if user else (False, False)
             
-            if user and check_password_hash(user.password_hash, password):
+            if matches:
+                # Upgrade hashes made with old parameters while we have the plaintext
+                if needs_rehash:
+                    user.password_hash = hasher.hash(password)
+                    db.session.commit()
                 login_user(user)
                 return True, 'Login successful', user
             else:
                 return False, 'Invalid username/email or password', None
                 
         except Exception as e:
+            db.session.rollback()
             return False, f'Login failed: {str(e)}', None
     
     @staticmethod
@@ -144,4 +145,4 @@ class AuthController:
         Returns:
             User: User object or None
         """
-        return User.query.filter_by(email=email).first()
+        return User.query.filter(db.func.lower(User.email) == email.lower()).first()
@@ -3,56 +3,181 @@ Chat Controller
 Handles chat operations and messaging
 """
 
+from flask import current_app
 from flask_login import current_user
 from app.models.chat import Chat, ChatHistory
-from app.services.openai_service import OpenAIService
+from app.models.usage import UsageRollup
+from app.services.llm_providers import ProviderRegistry
+from app.services.model_router import init_model_router, classify_prompt
+from app.services.generation import AnswerLengthEstimator, merge_generation_settings, parse_generation_settings
+from app.services.single_flight import SingleFlight
+from app.services.idempotency import IdempotencyStore
+from app.services.search import search as search_history
+from app.services.archive import rehydrate_chat
+from app.services.chat_purge import configured_batch_size, schedule_purge, soft_delete_chats
+from app.services.db_routing import note_write, replica_reads
+from app.services.instrumentation import span
+from app.services.metrics import record_cache
+from app.services.sharding import chat_shard, user_shard
+from app.services.system_prompts import compile_template, describe_system_prompt, next_version, resolve_system_prompt
 from app import db
-from datetime import datetime
+from datetime import datetime, timedelta
+import hashlib
+import os
 
 class ChatController:
     """Controller for chat operations"""
     
     def __init__(self):
-        self.openai_service = OpenAIService()
+        # Chat backends by name (LLM_PROVIDER is the default)
+        self.providers = ProviderRegistry()
+        self.title_provider = os.getenv('LLM_TITLE_PROVIDER') or None
+        # Picks a model tier per turn when MODEL_ROUTING_ENABLED (None otherwise)
+        self.router = init_model_router()
+        # Sizes max_tokens from observed answer lengths when ADAPTIVE_MAX_TOKENS (None otherwise)
+        self.answer_lengths = AnswerLengthEstimator.from_env()
+        # Coalesces duplicate in-flight sends (double clicks, retrying tabs)
+        self.in_flight = SingleFlight()
+        # Results of sends with an Idempotency-Key, shared by all workers
+        self.idempotency = IdempotencyStore(result_ttl=int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '600')))
+        # Tokens a user may spend per UTC day (0 = unlimited)
+        self.daily_token_budget = int(os.getenv('USER_DAILY_TOKEN_BUDGET', '0'))
     
-    def create_chat(self, title="New Chat", first_message=""):
+    def provider_names(self):
+        """
+        Get the providers this controller answers with (default, titles, routed tiers)
+        
+        Returns:
+            list: Provider names
+        """
+        names = [self.providers.default, self.title_provider or self.providers.default]
+        if self.router:
+            names.extend(tier.provider or self.providers.default for tier in self.router.tiers)
+        return sorted(set(names))
+    
+    def get_models(self, provider=None):
+        """
+        Get a provider's model catalog (cached; see LLMProvider.get_models)
+        
+        Args:
+            provider: Provider name (default: LLM_PROVIDER)
+            
+        Returns:
+            tuple: (success, message, models)
+        """
+        try:
+            return True, 'Models retrieved successfully', self.providers.get(provider).get_models()
+        except ValueError as e:
+            return False, str(e), None
+    
+    def over_budget(self, user_id):
+        """
+        Check the user's daily token budget against today's rollup
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            bool: True if the user has used up today's budget
+        """
+        if not self.daily_token_budget:
+            return False
+        with chat_shard(user_id):
+            return UsageRollup.tokens_for_day(user_id) >= self.daily_token_budget
+    
+    def _generate_title(self, first_message):
+        """Title a chat on LLM_TITLE_PROVIDER, or on the cheapest routed tier"""
+        if self.router and not self.title_provider:
+            tier = self.router.title_tier()
+            return self.providers.get(tier.provider).generate_chat_title(first_message, model=tier.model)
+        return self.providers.get(self.title_provider).generate_chat_title(first_message)
+    
+    @staticmethod
+    def _exchange_values(chat_id, question, ai_result):
+        """Column values of the ChatHistory row for a question/answer pair"""
+        usage = ai_result.get('usage') or {}
+        return {
+            'chat_id': chat_id,
+            'question': question,
+            'answer': ai_result['response'],
+            'created_at': datetime.utcnow(),
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'completion_tokens': usage.get('completion_tokens'),
+            'total_tokens': usage.get('total_tokens'),
+            'model': ai_result.get('model'),
+            'latency_ms': ai_result.get('latency_ms'),
+            'stopped': bool(ai_result.get('stopped'))
+        }
+    
+    def _save_exchange(self, chat, question, ai_result):
+        """
+        Add a question/answer row with its usage and bump the chat and user rollups
+        
+        Nothing is committed; the caller commits so the message and the
+        rollups land in one transaction.
+        
+        Returns:
+            ChatHistory: The new (pending) row
+        """
+        usage = ai_result.get('usage') or {}
+        chat_history = ChatHistory(**self._exchange_values(chat.id, question, ai_result))
+        db.session.add(chat_history)
+        chat.updated_at = chat_history.created_at
+        chat.total_tokens = Chat.total_tokens + (usage.get('total_tokens') or 0)
+        UsageRollup.record(chat.user_id, usage)
+        return chat_history
+    
+    def create_chat(self, title="New Chat", first_message="", provider=None, system_prompt=None):
         """
         Create a new chat
         
         Args:
             title: Chat title
             first_message: First message for title generation and saving
+            provider: Provider name for the first answer (default: routed, or
+                      LLM_PROVIDER); titles use LLM_TITLE_PROVIDER or the
+                      cheapest routed tier
+            system_prompt: System prompt template for this chat (optional;
+                           default: the user's, then Bart's)
             
         Returns:
             tuple: (success, message, chat)
         """
         try:
+            if first_message and self.over_budget(current_user.id):
+                return False, 'Daily token budget exceeded', None
+            
+            llm = self.providers.get(provider)
+            if system_prompt:
+                compile_template(system_prompt)
+            
             # Generate title from first message if provided
             if first_message and title == "New Chat":
-                title = self.openai_service.generate_chat_title(first_message)
+                title = self._generate_title(first_message)
             
             chat = Chat(title=title, user_id=current_user.id)
-            db.session.add(chat)
-            db.session.commit()
+            if system_prompt:
+                chat.system_prompt = system_prompt
+                chat.system_prompt_version = next_version(0)
             
-            # If first message is provided, save it and get AI response
+            # If first message is provided, get the AI response before
+            # touching the database, so the chat and its first message
+            # are saved in a single commit
+            ai_result = None
             if first_message:
-                # Get AI response for the first message
                 conversation_history = [{"role": "user", "content": first_message}]
-                ai_result = self.openai_service.get_chat_response(conversation_history)
-                
-                if ai_result['success']:
-                    ai_response = ai_result['response']
-                    
-                    # Save to database
-                    chat_history = ChatHistory(
-                        chat_id=chat.id,
-                        question=first_message,
-                        answer=ai_response
-                    )
-                    db.session.add(chat_history)
-                    chat.updated_at = datetime.utcnow()
-                    db.session.commit()
+                prompt = resolve_system_prompt(current_user, chat)
+                if self.router and not provider:
+                    ai_result = self.router.get_chat_response(self.providers, conversation_history,
+                                                              system_prompt=prompt)
+                else:
+                    ai_result = llm.get_chat_response(conversation_history, system_prompt=prompt)
+            
+            db.session.add(chat)
+            if ai_result and ai_result['success']:
+                db.session.flush()
+                self._save_exchange(chat, first_message, ai_result)
+            db.session.commit()
             
             return True, 'Chat created successfully', chat
             
@@ -60,26 +185,115 @@ class ChatController:
             db.session.rollback()
             return False, f'Failed to create chat: {str(e)}', None
     
-    def send_message(self, chat_id, message):
+    def send_message(self, chat_id, message, idempotency_key=None, provider=None, settings=None):
         """
         Send a message and get AI response
         
         Args:
             chat_id: Chat ID
             message: User message
+            idempotency_key: Client-supplied key; retries with the same key
+                             get the original result instead of a new call
+            provider: Provider name (default: routed, or LLM_PROVIDER)
+            settings: Generation settings for this message (max_tokens,
+                      temperature, stop); override the chat's defaults
             
         Returns:
             tuple: (success, message, response_data)
         """
+        try:
+            llm = self.providers.get(provider)
+        except ValueError as e:
+            return False, str(e), None
+        
+        def complete(conversation_history, generation, suggested_max_tokens=None):
+            if self.router and not provider:
+                return self.router.get_chat_response(self.providers, conversation_history,
+                                                     suggested_max_tokens=suggested_max_tokens, **generation)
+            if suggested_max_tokens:
+                generation['max_tokens'] = suggested_max_tokens
+            return llm.get_chat_response(conversation_history, **generation)
+        
+        return self._send_once(chat_id, message, idempotency_key, provider,
+                               lambda: self._send(chat_id, message, llm, complete, settings))
+    
+    def stream_message(self, chat_id, message, on_token, idempotency_key=None, provider=None,
+                       settings=None, cancel=None):
+        """
+        Send a message and stream the AI response token by token
+        
+        Args:
+            chat_id: Chat ID
+            message: User message
+            on_token: Callable invoked with each text delta
+            idempotency_key: Client-supplied key (see send_message)
+            provider: Provider name (default: routed, or LLM_PROVIDER)
+            settings: Generation settings (see send_message)
+            cancel: threading.Event that stops generation; the partial
+                    answer is saved and flagged 'stopped'
+            
+        Returns:
+            tuple: (success, message, response_data)
+        """
+        try:
+            llm = self.providers.get(provider)
+        except ValueError as e:
+            return False, str(e), None
+        
+        def complete(conversation_history, generation, suggested_max_tokens=None):
+            if self.router and not provider:
+                return self.router.stream_chat_response(self.providers, conversation_history, on_token,
+                                                        cancel=cancel, suggested_max_tokens=suggested_max_tokens,
+                                                        **generation)
+            if suggested_max_tokens:
+                generation['max_tokens'] = suggested_max_tokens
+            return llm.stream_chat_response(conversation_history, on_token=on_token, cancel=cancel, **generation)
+        
+        return self._send_once(chat_id, message, idempotency_key, provider,
+                               lambda: self._send(chat_id, message, llm, complete, settings))
+    
+    def _send_once(self, chat_id, message, idempotency_key, provider_name, send):
+        """
+        Coalesce concurrent duplicate sends into one upstream call and one insert
+        
+        Duplicates in this process are keyed on user, chat and message hash.
+        An idempotency key instead goes through the idempotency_keys table,
+        which makes the result stick for IDEMPOTENCY_TTL_SECONDS across all
+        worker processes, so late retries are answered without a second call.
+        """
+        if idempotency_key:
+            user_id = current_user.id
+            key = ('idempotency', user_id, idempotency_key)
+            (result, stored), shared = self.in_flight.do(
+                key, lambda: self.idempotency.do(user_id, idempotency_key, send))
+            shared = shared or stored
+        else:
+            digest = hashlib.sha256(str(message).encode('utf-8')).hexdigest()
+            key = ('message', current_user.id, chat_id, provider_name, digest)
+            result, shared = self.in_flight.do(key, send)
+        record_cache('send_coalescing', shared)
+        if shared and result[2] is not None:
+            return result[0], result[1], dict(result[2], coalesced=True)
+        return result
+    
+    def _send(self, chat_id, message, llm, complete, settings=None):
+        """Shared send path: validate ownership, build context, call the model, save the exchange"""
         try:
             # Validate chat ownership
-            chat = Chat.query.get_or_404(chat_id)
+            chat = Chat.get_active_or_404(chat_id)
             if chat.user_id != current_user.id:
                 return False, 'Access denied', None
             
+            if self.over_budget(chat.user_id):
+                return False, 'Daily token budget exceeded', None
+            
+            if chat.archived_at:
+                rehydrate_chat(chat)
+            
             # Get conversation history
-            chat_history_records = ChatHistory.query.filter_by(chat_id=chat_id).order_by(ChatHistory.created_at).all()
-            conversation_history = self.openai_service.get_conversation_history(chat_history_records)
+            chat_history_records = ChatHistory.for_chat(chat).all()
+            with span('history'):
+                conversation_history = llm.get_conversation_history(chat_history_records)
             
             # Add current user message to conversation
             conversation_history.append({
@@ -87,28 +301,50 @@ class ChatController:
                 "content": message
             })
             
+            # Request settings win over chat defaults, which win over the adaptive size
+            generation = merge_generation_settings(settings, chat.generation_settings)
+            system_prompt = resolve_system_prompt(current_user, chat)
+            features = suggested = None
+            # A user's own cap says nothing about how long answers need to
+            # be, so only answers under the adaptive size are observed
+            if self.answer_lengths and 'max_tokens' not in generation:
+                _, features = classify_prompt(conversation_history)
+                suggested = self.answer_lengths.suggest(features)
+            
             # Get AI response with full conversation context
-            ai_result = self.openai_service.get_chat_response(conversation_history)
+            ai_result = complete(conversation_history, dict(generation, system_prompt=system_prompt), suggested)
             
             if not ai_result['success']:
                 return False, ai_result['error'], None
             
-            ai_response = ai_result['response']
+            if features is not None and not ai_result.get('stopped'):
+                self.answer_lengths.observe(features, (ai_result.get('usage') or {}).get('completion_tokens'),
+                                            ai_result.get('max_tokens'))
             
-            # Save to database
-            chat_history = ChatHistory(
-                chat_id=chat_id,
-                question=message,
-                answer=ai_response
-            )
-            db.session.add(chat_history)
-            chat.updated_at = datetime.utcnow()
-            db.session.commit()
+            # Save to database (group-committed with other requests when
+            # WRITE_BEHIND_ENABLED; either way durable before returning)
+            write_behind = current_app.extensions.get('write_behind')
+            with span('commit'):
+                if write_behind:
+                    values = self._exchange_values(chat.id, message, ai_result)
+                    db.session.commit()  # end this request's read transaction first
+                    write_behind.submit(values, chat.user_id)
+                    note_write()
+                    created_at = values['created_at']
+                else:
+                    chat_history = self._save_exchange(chat, message, ai_result)
+                    db.session.commit()
+                    created_at = chat_history.created_at
             
             response_data = {
-                'response': ai_response,
-                'timestamp': chat_history.created_at.isoformat(),
-                'usage': ai_result.get('usage', {})
+                'response': ai_result['response'],
+                'timestamp': created_at.isoformat(),
+                'usage': ai_result.get('usage', {}),
+                'model': ai_result.get('model'),
+                'stopped': bool(ai_result.get('stopped')),
+                'max_tokens': ai_result.get('max_tokens'),
+                # The routed tier allows less than the max_tokens asked for
+                'max_tokens_clamped': bool(ai_result.get('max_tokens_clamped'))
             }
             
             return True, 'Message sent successfully', response_data
@@ -117,6 +353,7 @@ class ChatController:
             db.session.rollback()
             return False, f'Failed to send message: {str(e)}', None
     
+    @replica_reads
     def get_user_chats(self):
         """
         Get all chats for current user
@@ -124,8 +361,9 @@ class ChatController:
         Returns:
             list: List of Chat objects
         """
-        return Chat.query.filter_by(user_id=current_user.id).order_by(Chat.updated_at.desc()).all()
+        return Chat.active().filter_by(user_id=current_user.id).order_by(Chat.updated_at.desc()).all()
     
+    @replica_reads
     def get_chat(self, chat_id):
         """
         Get specific chat with messages
@@ -137,11 +375,15 @@ class ChatController:
             tuple: (success, message, chat_data)
         """
         try:
-            chat = Chat.query.get_or_404(chat_id)
+            chat = Chat.get_active_or_404(chat_id)
             if chat.user_id != current_user.id:
                 return False, 'Access denied', None
             
-            messages = ChatHistory.query.filter_by(chat_id=chat_id).order_by(ChatHistory.created_at).all()
+            # Cold chats are restored from their archive on first access
+            if chat.archived_at:
+                rehydrate_chat(chat)
+            
+            messages = ChatHistory.for_chat(chat).all()
             
             chat_data = {
                 'chat': {
@@ -155,7 +397,10 @@ class ChatController:
                         'id': msg.id,
                         'message': msg.question,
                         'response': msg.answer,
-                        'timestamp': msg.created_at.isoformat()
+                        'timestamp': msg.created_at.isoformat(),
+                        'model': msg.model,
+                        'total_tokens': msg.total_tokens,
+                        'stopped': msg.stopped
                     }
                     for msg in messages
                 ]
@@ -170,6 +415,9 @@ class ChatController:
         """
         Delete a chat and all its messages
         
+        The chat is only marked deleted here, so this returns at once; its
+        messages are purged in the background (app/services/chat_purge.py).
+        
         Args:
             chat_id: Chat ID
             
@@ -177,13 +425,15 @@ class ChatController:
             tuple: (success, message)
         """
         try:
-            chat = Chat.query.get_or_404(chat_id)
+            chat = Chat.get_active_or_404(chat_id)
             if chat.user_id != current_user.id:
                 return False, 'Access denied'
             
-            # Delete chat (cascade will delete messages)
-            db.session.delete(chat)
+            chat.deleted_at = datetime.utcnow()
+            chat.updated_at = Chat.updated_at
             db.session.commit()
+            schedule_purge(current_app._get_current_object(), user_shard(current_user.id),
+                           user_id=current_user.id, chat_id=chat_id)
             
             return True, 'Chat deleted successfully'
             
@@ -191,6 +441,138 @@ class ChatController:
             db.session.rollback()
             return False, f'Failed to delete chat: {str(e)}'
     
+    def delete_chats(self, older_than_days=None):
+        """
+        Delete all of the current user's chats, or those not updated for a while
+        
+        Args:
+            older_than_days: Only chats not updated for this many days (optional)
+            
+        Returns:
+            tuple: (success, message, count)
+        """
+        try:
+            before = datetime.utcnow() - timedelta(days=older_than_days) if older_than_days is not None else None
+            count = soft_delete_chats(user_id=current_user.id, before=before, batch_size=configured_batch_size())
+            if count:
+                schedule_purge(current_app._get_current_object(), user_shard(current_user.id),
+                               user_id=current_user.id)
+            return True, f'{count} chats deleted', count
+            
+        except Exception as e:
+            db.session.rollback()
+            return False, f'Failed to delete chats: {str(e)}', 0
+    
+    @replica_reads
+    def search(self, query, limit=20, offset=0, chat_id=None):
+        """
+        Full-text search over the current user's messages and chat titles
+        
+        Args:
+            query: Free-text query
+            limit: Maximum messages returned
+            offset: Messages to skip
+            chat_id: Restrict messages to one chat (optional)
+            
+        Returns:
+            tuple: (success, message, results)
+        """
+        try:
+            results = search_history(current_user.id, query, limit=limit, offset=offset, chat_id=chat_id)
+            return True, 'Search completed successfully', results
+        except Exception as e:
+            db.session.rollback()
+            return False, f'Search failed: {str(e)}', None
+    
+    def get_generation_settings(self, chat_id):
+        """
+        Get a chat's default generation settings
+        
+        Args:
+            chat_id: Chat ID
+            
+        Returns:
+            tuple: (success, message, settings)
+        """
+        chat = Chat.get_active_or_404(chat_id)
+        if chat.user_id != current_user.id:
+            return False, 'Access denied', None
+        return True, 'Settings retrieved successfully', chat.generation_settings or {}
+    
+    def update_generation_settings(self, chat_id, data):
+        """
+        Replace a chat's default generation settings
+        
+        Args:
+            chat_id: Chat ID
+            data: max_tokens, temperature and/or stop; omitted fields fall
+                  back to the adaptive or provider defaults
+            
+        Returns:
+            tuple: (success, message, settings)
+        """
+        try:
+            chat = Chat.get_active_or_404(chat_id)
+            if chat.user_id != current_user.id:
+                return False, 'Access denied', None
+            
+            chat.generation_settings = parse_generation_settings(data) or None
+            db.session.commit()
+            return True, 'Settings updated successfully', chat.generation_settings or {}
+            
+        except ValueError as e:
+            return False, str(e), None
+        except Exception as e:
+            db.session.rollback()
+            return False, f'Failed to update settings: {str(e)}', None
+    
+    def get_system_prompt(self, chat_id):
+        """
+        Get a chat's system prompt template
+        
+        Args:
+            chat_id: Chat ID
+            
+        Returns:
+            tuple: (success, message, prompt) where prompt holds
+                   'system_prompt' (None: the user's or the default),
+                   'version' and 'placeholders'
+        """
+        chat = Chat.get_active_or_404(chat_id)
+        if chat.user_id != current_user.id:
+            return False, 'Access denied', None
+        return True, 'System prompt retrieved successfully', describe_system_prompt(chat)
+    
+    def update_system_prompt(self, chat_id, system_prompt):
+        """
+        Replace a chat's system prompt template
+        
+        Args:
+            chat_id: Chat ID
+            system_prompt: Template text, or None/empty to use the user's default
+            
+        Returns:
+            tuple: (success, message, prompt)
+        """
+        try:
+            chat = Chat.get_active_or_404(chat_id)
+            if chat.user_id != current_user.id:
+                return False, 'Access denied', None
+            
+            if system_prompt:
+                compile_template(system_prompt)
+            chat.system_prompt = system_prompt or None
+            chat.system_prompt_version = next_version(chat.system_prompt_version)
+            db.session.commit()
+            return True, 'System prompt updated successfully', describe_system_prompt(chat)
+            
+        except ValueError as e:
+            return False, str(e), None
+        except Exception as e:
+            db.session.rollback()
+            return False, f'Failed to update system prompt: {str(e)}', None
+    
+    @replica_reads
     def get_chat_summary(self, chat_id):
         """
         Get a summary of chat activity
@@ -202,7 +584,7 @@ class ChatController:
             dict: Chat summary data
         """
         try:
-            chat = Chat.query.get_or_404(chat_id)
+            chat = Chat.get_active_or_404(chat_id)
             if chat.user_id != current_user.id:
                 return None
             
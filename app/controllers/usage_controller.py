@@ -0,0 +1,90 @@
+"""
+Usage Controller
+Token usage reporting for dashboards and budgets
+"""
+
+from flask_login import current_user
+from app.models.chat import Chat
+from app.models.usage import UsageRollup
+from app.services.db_routing import replica_reads
+from app.services.sharding import chat_shard
+from datetime import datetime, timedelta
+
+class UsageController:
+    """Controller for token usage queries (served from rollups, never from chat history)"""
+    
+    @staticmethod
+    @replica_reads
+    def get_usage(days=30, user_id=None):
+        """
+        Get daily token usage and totals for a user
+        
+        Args:
+            days: Number of days to report, including today
+            user_id: User ID (optional, defaults to current user)
+            
+        Returns:
+            dict: 'since', 'days' (oldest first) and 'totals'
+        """
+        if user_id is None:
+            user_id = current_user.id
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        
+        # The user's rollups live on their shard (no-op when unsharded)
+        with chat_shard(user_id):
+            rollups = UsageRollup.query.filter(
+                UsageRollup.user_id == user_id,
+                UsageRollup.day >= since
+            ).order_by(UsageRollup.day).all()
+        
+        daily = [
+            {
+                'day': rollup.day.isoformat(),
+                'prompt_tokens': rollup.prompt_tokens,
+                'completion_tokens': rollup.completion_tokens,
+                'total_tokens': rollup.total_tokens,
+                'message_count': rollup.message_count
+            }
+            for rollup in rollups
+        ]
+        totals = {
+            key: sum(day[key] for day in daily)
+            for key in ('prompt_tokens', 'completion_tokens', 'total_tokens', 'message_count')
+        }
+        
+        return {
+            'since': since.isoformat(),
+            'days': daily,
+            'totals': totals
+        }
+    
+    @staticmethod
+    @replica_reads
+    def get_top_chats(limit=10, user_id=None):
+        """
+        Get the user's most expensive chats by total tokens
+        
+        Args:
+            limit: Maximum number of chats
+            user_id: User ID (optional, defaults to current user)
+            
+        Returns:
+            list: Chat dictionaries, most tokens first
+        """
+        if user_id is None:
+            user_id = current_user.id
+        
+        with chat_shard(user_id):
+            chats = Chat.active().filter_by(user_id=user_id).order_by(
+                Chat.total_tokens.desc()
+            ).limit(limit).all()
+            
+            return [
+                {
+                    'id': chat.id,
+                    'title': chat.title,
+                    'total_tokens': chat.total_tokens,
+                    'updated_at': chat.updated_at.isoformat()
+                }
+                for chat in chats
+            ]
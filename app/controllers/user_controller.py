@@ -6,6 +6,10 @@ Handles user management operations
 from flask_login import current_user
 from app.models.user import User
 from app.models.chat import Chat
+from app.services.identity_cache import identity_cache
+from app.services.db_routing import replica_reads
+from app.services.sharding import chat_shard
+from app.services.system_prompts import compile_template, describe_system_prompt, next_version
 from datetime import datetime
 from app import db
 
@@ -13,6 +17,7 @@ class UserController:
     """Controller for user operations"""
     
     @staticmethod
+    @replica_reads
     def get_user_profile(user_id=None):
         """
         Get user profile information
@@ -29,19 +34,22 @@ class UserController:
             else:
                 user = User.query.get_or_404(user_id)
             
-            return {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'created_at': user.created_at.isoformat(),
-                'chat_count': user.chat_count,
-                'total_messages': user.total_messages
-            }
+            # The user's chats live on their shard (no-op when unsharded)
+            with chat_shard(user.id):
+                return {
+                    'id': user.id,
+                    'username': user.username,
+                    'email': user.email,
+                    'created_at': user.created_at.isoformat(),
+                    'chat_count': user.chat_count,
+                    'total_messages': user.total_messages
+                }
             
         except Exception as e:
             return None
     
     @staticmethod
+    @replica_reads
     def get_user_stats(user_id=None):
         """
         Get user statistics
@@ -58,25 +66,27 @@ class UserController:
             else:
                 user = User.query.get_or_404(user_id)
             
-            # Get recent activity
-            recent_chats = Chat.query.filter_by(user_id=user.id).order_by(Chat.updated_at.desc()).limit(5).all()
-            
-            stats = {
-                'total_chats': user.chat_count,
-                'total_messages': user.total_messages,
-                'account_age_days': (datetime.utcnow() - user.created_at).days,
-                'recent_chats': [
-                    {
-                        'id': chat.id,
-                        'title': chat.title,
-                        'message_count': chat.message_count,
-                        'updated_at': chat.updated_at.isoformat()
-                    }
-                    for chat in recent_chats
-                ]
-            }
-            
-            return stats
+            # The user's chats live on their shard (no-op when unsharded)
+            with chat_shard(user.id):
+                # Get recent activity
+                recent_chats = Chat.active().filter_by(user_id=user.id).order_by(Chat.updated_at.desc()).limit(5).all()
+            
+                stats = {
+                    'total_chats': user.chat_count,
+                    'total_messages': user.total_messages,
+                    'account_age_days': (datetime.utcnow() - user.created_at).days,
+                    'recent_chats': [
+                        {
+                            'id': chat.id,
+                            'title': chat.title,
+                            'message_count': chat.message_count,
+                            'updated_at': chat.updated_at.isoformat()
+                        }
+                        for chat in recent_chats
+                    ]
+                }
+            
+                return stats
             
         except Exception as e:
             return None
@@ -107,6 +117,7 @@ class UserController:
                     setattr(user, field, value)
             
             db.session.commit()
+            identity_cache.invalidate(user.id)
             return True, 'Profile updated successfully'
             
         except Exception as e:
@@ -114,6 +125,47 @@ class UserController:
             return False, f'Failed to update profile: {str(e)}'
     
     @staticmethod
+    def get_system_prompt():
+        """
+        Get the current user's default system prompt template
+        
+        Returns:
+            dict: 'system_prompt' (None: Bart's default), 'version' and 'placeholders'
+        """
+        return describe_system_prompt(current_user)
+    
+    @staticmethod
+    def update_system_prompt(system_prompt):
+        """
+        Replace the current user's default system prompt template
+        
+        Chats with their own template keep it.
+        
+        Args:
+            system_prompt: Template text, or None/empty for Bart's default
+            
+        Returns:
+            tuple: (success, message, prompt)
+        """
+        try:
+            if system_prompt:
+                compile_template(system_prompt)
+            user = db.session.get(User, current_user.id)
+            user.system_prompt = system_prompt or None
+            user.system_prompt_version = next_version(user.system_prompt_version)
+            db.session.commit()
+            # Other workers pick up the new version within IDENTITY_CACHE_TTL
+            identity_cache.invalidate(user.id)
+            return True, 'System prompt updated successfully', describe_system_prompt(user)
+            
+        except ValueError as e:
+            return False, str(e), None
+        except Exception as e:
+            db.session.rollback()
+            return False, f'Failed to update system prompt: {str(e)}', None
+    
+    @staticmethod
+    @replica_reads
     def get_user_activity(user_id=None, limit=10):
         """
         Get user activity history
@@ -131,29 +183,31 @@ class UserController:
             else:
                 user = User.query.get_or_404(user_id)
             
-            # Get recent chats with messages
-            recent_chats = Chat.query.filter_by(user_id=user.id).order_by(Chat.updated_at.desc()).limit(limit).all()
-            
-            activity = []
-            for chat in recent_chats:
-                if chat.chat_history:
-                    last_message = chat.chat_history[-1]
-                    activity.append({
-                        'type': 'message',
-                        'chat_id': chat.id,
-                        'chat_title': chat.title,
-                        'message': last_message.question_preview,
-                        'timestamp': last_message.created_at.isoformat()
-                    })
-                else:
-                    activity.append({
-                        'type': 'chat_created',
-                        'chat_id': chat.id,
-                        'chat_title': chat.title,
-                        'timestamp': chat.created_at.isoformat()
-                    })
-            
-            return activity
+            # The user's chats live on their shard (no-op when unsharded)
+            with chat_shard(user.id):
+                # Get recent chats with messages
+                recent_chats = Chat.active().filter_by(user_id=user.id).order_by(Chat.updated_at.desc()).limit(limit).all()
+            
+                activity = []
+                for chat in recent_chats:
+                    if chat.chat_history:
+                        last_message = chat.chat_history[-1]
+                        activity.append({
+                            'type': 'message',
+                            'chat_id': chat.id,
+                            'chat_title': chat.title,
+                            'message': last_message.question_preview,
+                            'timestamp': last_message.created_at.isoformat()
+                        })
+                    else:
+                        activity.append({
+                            'type': 'chat_created',
+                            'chat_id': chat.id,
+                            'chat_title': chat.title,
+                            'timestamp': chat.created_at.isoformat()
+                        })
+            
+                return activity
             
         except Exception as e:
             return []
@@ -4,5 +4,12 @@ Database Models Package
 
 from .user import User
 from .chat import Chat, ChatHistory
+from .session import ServerSession
+from .usage import UsageRollup
+from .archive import ChatArchive
+from .node_lease import NodeLease
+from .idempotency import IdempotencyKey
+from . import search  # full-text search DDL, installed by create_all
 
-__all__ = ['User', 'Chat', 'ChatHistory']
+__all__ = ['User', 'Chat', 'ChatHistory', 'ServerSession', 'UsageRollup', 'ChatArchive', 'NodeLease',
+           'IdempotencyKey']
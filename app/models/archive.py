@@ -0,0 +1,30 @@
+"""
+Chat Archive Model
+"""
+
+from app import db
+from datetime import datetime
+from app.models.chat import ChatId
+
+
+class ChatArchive(db.Model):
+    """
+    A cold chat's messages packed into one compressed blob
+
+    The blob holds one JSON line per ChatHistory row and lives either in
+    `data` or in a file under ARCHIVE_DIR named by `path`.
+    """
+
+    __tablename__ = 'chat_archives'
+
+    chat_id = db.Column(ChatId, db.ForeignKey('chat.id', ondelete='CASCADE'), primary_key=True)
+    codec = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.LargeBinary)
+    path = db.Column(db.String(255))
+    message_count = db.Column(db.Integer, nullable=False)
+    raw_bytes = db.Column(db.Integer, nullable=False)
+    stored_bytes = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ChatArchive {self.chat_id}>'
@@ -3,27 +3,71 @@ Chat Models
 """
 
 from app import db
-from datetime import datetime
+from datetime import datetime, timedelta
+from flask import abort
+
+# Chat and message IDs: 64-bit so sharded databases can use globally unique
+# IDs (app/services/sharding.py); SQLite keeps INTEGER, its 64-bit rowid alias
+ChatId = db.BigInteger().with_variant(db.Integer, 'sqlite')
 
 class Chat(db.Model):
     """Chat model for conversation management"""
     
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(ChatId, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Running sum of ChatHistory.total_tokens, bumped with each saved message
+    total_tokens = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Default max_tokens/temperature/stop for messages in this chat (None = app defaults)
+    generation_settings = db.Column(db.JSON)
+    # Set while the messages are packed into chat_archives instead of chat_histories
+    archived_at = db.Column(db.DateTime)
+    # Last time an archived chat was restored; keeps it hot for another period
+    rehydrated_at = db.Column(db.DateTime)
+    # Set when the user deletes the chat; the rows are purged in the background
+    deleted_at = db.Column(db.DateTime)
+    # System prompt template for this chat (None = the user's or the default);
+    # the version changes with it and keys the compiled template cache
+    system_prompt = db.Column(db.Text)
+    system_prompt_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        db.Index('ix_chat_user_total_tokens', 'user_id', 'total_tokens'),
+        db.Index('ix_chat_deleted_at', 'deleted_at',
+                 postgresql_where=db.text('deleted_at IS NOT NULL'),
+                 sqlite_where=db.text('deleted_at IS NOT NULL')),
+    )
     
-    # Relationships
-    chat_history = db.relationship('ChatHistory', backref='chat', lazy=True, 
-                                  order_by='ChatHistory.created_at', cascade='all, delete-orphan')
+    # Relationships; the database deletes messages and archive with the chat
+    # (ON DELETE CASCADE), so deleting a chat never loads its messages
+    chat_history = db.relationship('ChatHistory', backref='chat', lazy=True, order_by='ChatHistory.created_at',
+                                   cascade='all, delete-orphan', passive_deletes=True)
+    archive = db.relationship('ChatArchive', uselist=False, lazy=True, cascade='all, delete-orphan',
+                              passive_deletes=True)
     
     def __repr__(self):
         return f'<Chat {self.title}>'
     
+    @classmethod
+    def active(cls):
+        """Query chats that are not deleted"""
+        return cls.query.filter(cls.deleted_at.is_(None))
+    
+    @classmethod
+    def get_active_or_404(cls, chat_id):
+        """Get a chat by ID, or abort with 404 if it does not exist or is deleted"""
+        chat = db.session.get(cls, chat_id)
+        if chat is None or chat.deleted_at is not None:
+            abort(404)
+        return chat
+    
     @property
     def message_count(self):
-        """Get the number of messages in this chat"""
+        """Get the number of messages in this chat, including archived ones"""
+        if self.archived_at and self.archive:
+            return len(self.chat_history) + self.archive.message_count
         return len(self.chat_history)
     
     @property
@@ -48,20 +92,55 @@ class Chat(db.Model):
         return " | ".join(summary)
 
 class ChatHistory(db.Model):
-    """Chat history model for storing conversation messages"""
+    """
+    Chat history model for storing conversation messages
+    
+    On PostgreSQL the table may be range-partitioned by created_at month
+    (app/services/partitions.py); its primary key is then (id, created_at),
+    while IDs stay unique on their own.
+    """
     
     __tablename__ = 'chat_histories'
     
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(ChatId, primary_key=True)
     question = db.Column(db.Text, nullable=False)
     answer = db.Column(db.Text, nullable=False)
-    chat_id = db.Column(db.Integer, db.ForeignKey('chat.id'), nullable=False)
+    chat_id = db.Column(ChatId, db.ForeignKey('chat.id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
+    # Token usage and latency of the model call that produced the answer
+    prompt_tokens = db.Column(db.Integer)
+    completion_tokens = db.Column(db.Integer)
+    total_tokens = db.Column(db.Integer)
+    model = db.Column(db.String(100))
+    latency_ms = db.Column(db.Integer)
+    # True when the user stopped generation and only a partial answer was saved
+    stopped = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    
+    __table_args__ = (
+        db.Index('ix_chat_histories_chat_created', 'chat_id', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<ChatHistory {self.id}>'
     
+    @classmethod
+    def for_chat(cls, chat):
+        """
+        Query a chat's messages, oldest first
+        
+        Messages never predate their chat, so the query is bounded below by
+        the chat's creation time (less a day for clock skew between hosts);
+        on a partitioned table only the months since then are scanned.
+        """
+        query = cls.query.filter(cls.chat_id == chat.id)
+        if chat.created_at:
+            query = query.filter(cls.created_at >= chat.created_at - timedelta(days=1))
+        # id breaks created_at ties, so the history (and the prompt prefix
+        # built from it) comes back in the same order every turn
+        return query.order_by(cls.created_at, cls.id)
+    
     @property
     def question_preview(self):
         """Get a preview of the user question"""
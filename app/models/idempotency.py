@@ -0,0 +1,20 @@
+"""
+Idempotency Key Model
+"""
+
+from app import db
+
+
+class IdempotencyKey(db.Model):
+    """Result of a send made with an Idempotency-Key, shared by all workers"""
+
+    __tablename__ = 'idempotency_keys'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    # JSON [success, message, response_data]; NULL while the send is running
+    result = db.Column(db.JSON)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.user_id} {self.key}>'
@@ -0,0 +1,20 @@
+"""
+ID Node Lease Model
+"""
+
+from app import db
+
+
+class NodeLease(db.Model):
+    """One of the 128 node numbers in sharded IDs, leased by a live process"""
+
+    __tablename__ = 'node_leases'
+
+    node = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    owner = db.Column(db.String(128))
+    expires_at = db.Column(db.DateTime, nullable=False)
+    # Millisecond timestamp of the last ID issued under this node
+    issued_until = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<NodeLease {self.node} {self.owner}>'
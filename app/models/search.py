@@ -0,0 +1,113 @@
+"""
+Full-Text Search Schema
+Not mapped models: the search structures are plain DDL kept in sync by
+the database itself, so every committed message is indexed without any
+application code on the write path.
+
+    postgresql  Generated tsvector columns with GIN indexes
+    sqlite      FTS5 tables (porter stemming) maintained by triggers. Each
+                row carries an indexed owner token ('u<user_id>') so a
+                user's matches are intersected inside the index instead of
+                ranking every user's matches and filtering afterwards.
+
+Archived chats keep one index entry per chat for their messages, written
+when the chat is archived (the messages themselves are compressed):
+
+    postgresql  chat_archives.search_vector (stripped tsvector, GIN index)
+    sqlite      chat_archive_search FTS5 table, cleared by a trigger when
+                the archive row is deleted (rehydrate, purge)
+"""
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from app.models.archive import ChatArchive
+from app.models.chat import ChatHistory
+
+SEARCH_DDL = {
+    'postgresql': [
+        """ALTER TABLE chat_histories ADD COLUMN IF NOT EXISTS search_vector tsvector
+           GENERATED ALWAYS AS (
+               setweight(to_tsvector('english', coalesce(question, '')), 'A') ||
+               setweight(to_tsvector('english', coalesce(answer, '')), 'B')
+           ) STORED""",
+        'CREATE INDEX IF NOT EXISTS ix_chat_histories_search ON chat_histories USING GIN (search_vector)',
+        """CREATE INDEX IF NOT EXISTS ix_chat_title_search ON chat
+           USING GIN (to_tsvector('english', title))""",
+    ],
+    'sqlite': [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS chat_search USING fts5(
+               question, answer, owner, chat_id UNINDEXED,
+               tokenize='porter unicode61', prefix='2 3')""",
+        """CREATE TRIGGER IF NOT EXISTS chat_search_insert AFTER INSERT ON chat_histories BEGIN
+               INSERT INTO chat_search (rowid, question, answer, owner, chat_id)
+               SELECT new.id, new.question, new.answer, 'u' || chat.user_id, new.chat_id
+               FROM chat WHERE chat.id = new.chat_id;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS chat_search_update AFTER UPDATE OF question, answer ON chat_histories BEGIN
+               UPDATE chat_search SET question = new.question, answer = new.answer WHERE rowid = new.id;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS chat_search_delete AFTER DELETE ON chat_histories BEGIN
+               DELETE FROM chat_search WHERE rowid = old.id;
+           END""",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS chat_title_search USING fts5(
+               title, owner, tokenize='porter unicode61', prefix='2 3')""",
+        """CREATE TRIGGER IF NOT EXISTS chat_title_search_insert AFTER INSERT ON chat BEGIN
+               INSERT INTO chat_title_search (rowid, title, owner) VALUES (new.id, new.title, 'u' || new.user_id);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS chat_title_search_update AFTER UPDATE OF title ON chat BEGIN
+               UPDATE chat_title_search SET title = new.title WHERE rowid = new.id;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS chat_title_search_delete AFTER DELETE ON chat BEGIN
+               DELETE FROM chat_title_search WHERE rowid = old.id;
+           END""",
+    ],
+}
+
+ARCHIVE_SEARCH_DDL = {
+    'postgresql': [
+        'ALTER TABLE chat_archives ADD COLUMN IF NOT EXISTS search_vector tsvector',
+        'CREATE INDEX IF NOT EXISTS ix_chat_archives_search ON chat_archives USING GIN (search_vector)',
+    ],
+    'sqlite': [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS chat_archive_search USING fts5(
+               body, owner, tokenize='porter unicode61', prefix='2 3')""",
+        """CREATE TRIGGER IF NOT EXISTS chat_archive_search_delete AFTER DELETE ON chat_archives BEGIN
+               DELETE FROM chat_archive_search WHERE rowid = old.chat_id;
+           END""",
+    ],
+}
+
+# Index rows that existed before the search tables (Postgres backfills itself)
+SEARCH_BACKFILL = {
+    'sqlite': [
+        """INSERT INTO chat_search (rowid, question, answer, owner, chat_id)
+           SELECT h.id, h.question, h.answer, 'u' || c.user_id, h.chat_id
+           FROM chat_histories h JOIN chat c ON c.id = h.chat_id
+           WHERE h.id NOT IN (SELECT rowid FROM chat_search)""",
+        """INSERT INTO chat_title_search (rowid, title, owner)
+           SELECT id, title, 'u' || user_id FROM chat
+           WHERE id NOT IN (SELECT rowid FROM chat_title_search)""",
+    ],
+}
+
+
+@event.listens_for(ChatHistory.__table__, 'after_create')
+def create_search_index(target, connection, **kw):
+    """Install the search structures when create_all() creates chat_histories"""
+    statements = SEARCH_DDL.get(connection.dialect.name, [])
+    try:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+    except OperationalError as e:
+        # e.g. SQLite built without FTS5; search falls back to LIKE
+        print(f"Full-text search index not created: {e}")
+
+
+@event.listens_for(ChatArchive.__table__, 'after_create')
+def create_archive_search_index(target, connection, **kw):
+    """Install the archived chat index when create_all() creates chat_archives"""
+    try:
+        for statement in ARCHIVE_SEARCH_DDL.get(connection.dialect.name, []):
+            connection.exec_driver_sql(statement)
+    except OperationalError as e:
+        print(f"Archived chat search index not created: {e}")
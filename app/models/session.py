@@ -0,0 +1,18 @@
+"""
+Server-Side Session Model
+"""
+
+from app import db
+
+
+class ServerSession(db.Model):
+    """Session payload stored by the 'database' session backend"""
+
+    __tablename__ = 'sessions'
+
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ServerSession {self.id[:8]}>'
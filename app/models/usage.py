@@ -0,0 +1,78 @@
+"""
+Usage Rollup Model
+"""
+
+from app import db
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+
+ROLLUP_COUNTERS = ('prompt_tokens', 'completion_tokens', 'total_tokens', 'message_count')
+
+
+class UsageRollup(db.Model):
+    """Token usage per user per UTC day, maintained as messages are saved"""
+
+    __tablename__ = 'usage_rollups'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    prompt_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    completion_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    total_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UsageRollup {self.user_id} {self.day}>'
+
+    @classmethod
+    def record(cls, user_id, usage, day=None, messages=1):
+        """
+        Add one message's (or a batch's summed) usage to the user's rollup for the day
+
+        Runs in the caller's transaction so the rollup commits (or rolls back)
+        together with the message row. Concurrent writers are safe: the
+        upsert increments in SQL instead of read-modify-write.
+
+        Args:
+            user_id: User ID
+            usage: Usage dict with prompt/completion/total token counts
+            day: UTC date (default: today)
+            messages: Messages the usage covers
+        """
+        increments = {
+            'prompt_tokens': usage.get('prompt_tokens') or 0,
+            'completion_tokens': usage.get('completion_tokens') or 0,
+            'total_tokens': usage.get('total_tokens') or 0,
+            'message_count': messages
+        }
+        day = day or datetime.utcnow().date()
+
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = insert(cls).values(user_id=user_id, day=day, **increments)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[cls.user_id, cls.day],
+                set_={name: getattr(cls, name) + stmt.excluded[name] for name in ROLLUP_COUNTERS}
+            )
+            db.session.execute(stmt)
+            return
+
+        updated = cls.query.filter_by(user_id=user_id, day=day).update(
+            {getattr(cls, name): getattr(cls, name) + value for name, value in increments.items()},
+            synchronize_session=False
+        )
+        if not updated:
+            db.session.add(cls(user_id=user_id, day=day, **increments))
+
+    @classmethod
+    def tokens_for_day(cls, user_id, day=None):
+        """
+        Get a user's total tokens for a day (one primary key lookup)
+
+        Returns:
+            int: Total tokens, 0 if the user has no usage that day
+        """
+        day = day or datetime.utcnow().date()
+        total = db.session.query(cls.total_tokens).filter_by(user_id=user_id, day=day).scalar()
+        return total or 0
@@ -12,26 +12,56 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=True)  # Nullable for OneLogin users
+    password_hash = db.Column(db.String(255), nullable=True)  # Nullable for OneLogin users
     one_login_id = db.Column(db.String(255), unique=True, nullable=True)
     name = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Default system prompt template for the user's chats (None = Bart's);
+    # the version changes with it and keys the compiled template cache
+    system_prompt = db.Column(db.Text)
+    system_prompt_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
     
     # Relationships
     chats = db.relationship('Chat', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        # Case-insensitive email lookups and uniqueness
+        db.Index('ix_user_email_lower', db.func.lower(email), unique=True),
+    )
+    
     def __repr__(self):
         return f'<User {self.username}>'
     
+    @classmethod
+    def find_by_login(cls, username_or_email):
+        """
+        Find a user by username or (case-insensitive) email in one query
+        
+        Args:
+            username_or_email: Username or email
+            
+        Returns:
+            User: User object or None; an exact username match wins
+        """
+        candidates = cls.query.filter(
+            db.or_(cls.username == username_or_email,
+                   db.func.lower(cls.email) == username_or_email.lower())
+        ).limit(2).all()
+        for user in candidates:
+            if user.username == username_or_email:
+                return user
+        return candidates[0] if candidates else None
+    
     @property
     def chat_count(self):
         """Get the number of chats for this user"""
-        return len(self.chats)
+        return sum(1 for chat in self.chats if chat.deleted_at is None)
     
     @property
     def total_messages(self):
         """Get the total number of messages for this user"""
         total = 0
         for chat in self.chats:
-            total += len(chat.chat_history)
+            if chat.deleted_at is None:
+                total += chat.message_count
         return total
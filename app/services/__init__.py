@@ -2,6 +2,10 @@
 Services Package
 """
 
+from .llm_providers import LLMProvider, EchoProvider, LlamaCppProvider, ProviderRegistry, UnknownProviderError
 from .openai_service import OpenAIService
+from .single_flight import SingleFlight
+from .onelogin_service import OneLoginService, OneLoginError
 
-__all__ = ['OpenAIService']
+__all__ = ['LLMProvider', 'EchoProvider', 'LlamaCppProvider', 'ProviderRegistry', 'UnknownProviderError',
+           'OpenAIService', 'SingleFlight', 'OneLoginService', 'OneLoginError']
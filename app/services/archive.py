@@ -0,0 +1,314 @@
+"""
+Chat Archive
+Moves the messages of chats nobody has touched for ARCHIVE_AFTER_DAYS out
+of chat_histories into one compressed blob per chat (JSON lines, zstd when
+the zstandard package is installed, gzip otherwise), and restores them
+when the chat is opened again. Archived messages stay searchable at the
+chat level through a per-chat index (see app/services/search.py).
+
+    ARCHIVE_STORAGE=database  blob stored in chat_archives.data (default)
+    ARCHIVE_STORAGE=disk      blob written to a file under ARCHIVE_DIR
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, update
+from app import db
+from app.models.archive import ChatArchive
+from app.models.chat import Chat, ChatHistory
+from app.services.search import index_archived_chat
+from app.services.sharding import shard_indexes, use_shard
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ChatHistory columns kept in the blob, in order
+ARCHIVE_FIELDS = ('id', 'question', 'answer', 'created_at', 'updated_at', 'prompt_tokens',
+                  'completion_tokens', 'total_tokens', 'model', 'latency_ms', 'stopped')
+DATETIME_FIELDS = ('created_at', 'updated_at')
+
+
+def encode(rows, codec):
+    """
+    Pack ChatHistory rows into a compressed JSON-lines blob
+
+    Args:
+        rows: ChatHistory objects
+        codec: 'zstd' or 'gzip'
+
+    Returns:
+        tuple: (blob bytes, uncompressed size)
+    """
+    lines = []
+    for row in rows:
+        record = {field: getattr(row, field) for field in ARCHIVE_FIELDS}
+        for field in DATETIME_FIELDS:
+            record[field] = record[field].isoformat() if record[field] else None
+        lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+    raw = '\n'.join(lines).encode('utf-8')
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(raw), len(raw)
+    return gzip.compress(raw, compresslevel=6), len(raw)
+
+
+def decode(blob, codec):
+    """
+    Unpack a blob made by encode()
+
+    Returns:
+        list: One dict of ChatHistory column values per message
+    """
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read this archive')
+        raw = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        raw = gzip.decompress(blob)
+    records = []
+    for line in raw.decode('utf-8').splitlines():
+        record = json.loads(line)
+        for field in DATETIME_FIELDS:
+            if record[field]:
+                record[field] = datetime.fromisoformat(record[field])
+        records.append(record)
+    return records
+
+
+class ArchiveStore:
+    """Where archive blobs are kept: the chat_archives row or local files"""
+
+    def __init__(self, storage='database', directory=None, codec=None):
+        """
+        Initialize the store
+
+        Args:
+            storage: 'database' or 'disk'
+            directory: Directory for 'disk' storage
+            codec: 'zstd' or 'gzip' (default: zstd when available)
+        """
+        if storage not in ('database', 'disk'):
+            raise ValueError(f'Unknown ARCHIVE_STORAGE: {storage}')
+        if storage == 'disk' and not directory:
+            raise ValueError('Disk archive storage needs a directory')
+        if codec == 'zstd' and zstandard is None:
+            raise ValueError('ARCHIVE_CODEC=zstd needs the zstandard package')
+        self.storage = storage
+        self.directory = directory
+        self.codec = codec or ('zstd' if zstandard is not None else 'gzip')
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build the store from ARCHIVE_STORAGE, ARCHIVE_DIR and ARCHIVE_CODEC
+
+        Returns:
+            ArchiveStore: Configured store
+        """
+        return cls(
+            storage=os.getenv('ARCHIVE_STORAGE', 'database').lower(),
+            directory=os.getenv('ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archives'),
+            codec=os.getenv('ARCHIVE_CODEC') or None
+        )
+
+    def write(self, chat_id, blob):
+        """
+        Store a blob
+
+        Returns:
+            tuple: (data for the row, path for the row); one of them is None
+        """
+        if self.storage == 'database':
+            return blob, None
+        os.makedirs(self.directory, exist_ok=True)
+        path = f'chat-{chat_id}.jsonl.{"zst" if self.codec == "zstd" else "gz"}'
+        tmp_path = os.path.join(self.directory, path + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.directory, path))
+        return None, path
+
+    def read(self, archive):
+        """
+        Load an archive's blob
+
+        Returns:
+            bytes: Compressed blob
+        """
+        if archive.data is not None:
+            return archive.data
+        with open(os.path.join(self.directory, archive.path), 'rb') as f:
+            return f.read()
+
+    def discard(self, path):
+        """Remove an archive file once its row is gone (no-op for database storage)"""
+        if not path:
+            return
+        try:
+            os.remove(os.path.join(self.directory, path))
+        except OSError as e:
+            print(f"Archive file not removed: {e}")
+
+
+def archive_chat(chat, store):
+    """
+    Move one chat's messages into an archive blob
+
+    The blob is written first and the rows are deleted in the same
+    transaction that records the archive, so a failure leaves the chat
+    fully hot. Only the rows read here are deleted; a message saved
+    concurrently stays in chat_histories.
+
+    Args:
+        chat: Chat to archive
+        store: ArchiveStore
+
+    Returns:
+        int: Messages archived (0 if the chat had none)
+    """
+    rows = ChatHistory.for_chat(chat).order_by(ChatHistory.id).all()
+    if not rows:
+        return 0
+
+    blob, raw_bytes = encode(rows, store.codec)
+    data, path = store.write(chat.id, blob)
+    try:
+        db.session.add(ChatArchive(
+            chat_id=chat.id,
+            codec=store.codec,
+            data=data,
+            path=path,
+            message_count=len(rows),
+            raw_bytes=raw_bytes,
+            stored_bytes=len(blob)
+        ))
+        db.session.flush()
+        index_archived_chat(chat, rows)
+        db.session.execute(delete(ChatHistory).where(ChatHistory.id.in_([row.id for row in rows])))
+        # updated_at is listed so its onupdate does not mark the chat as touched
+        db.session.execute(update(Chat).where(Chat.id == chat.id)
+                           .values(archived_at=datetime.utcnow(), updated_at=Chat.updated_at))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        store.discard(path)
+        raise
+    db.session.expire(chat)
+    return len(rows)
+
+
+def archive_cold_chats(days, limit=None, store=None):
+    """
+    Archive every chat untouched (no new message, not reopened) for `days`,
+    on every shard
+
+    Args:
+        days: Idle days before a chat is archived
+        limit: Maximum chats to archive in this run
+        store: ArchiveStore (default: from the environment)
+
+    Returns:
+        dict: Chats and messages archived, and bytes before/after compression
+    """
+    store = store or ArchiveStore.from_env()
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    stats = {'chats': 0, 'messages': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+    for shard in shard_indexes():
+        if limit and stats['chats'] >= limit:
+            break
+        with use_shard(shard):
+            _archive_shard(cutoff, limit and limit - stats['chats'], store, stats)
+    return stats
+
+
+def _archive_shard(cutoff, limit, store, stats):
+    query = (Chat.query
+             .filter(Chat.archived_at.is_(None), Chat.deleted_at.is_(None),
+                     func.coalesce(Chat.rehydrated_at, Chat.updated_at) < cutoff)
+             .order_by(Chat.updated_at))
+    if limit:
+        query = query.limit(limit)
+
+    for chat_id in [chat.id for chat in query.with_entities(Chat.id)]:
+        chat = db.session.get(Chat, chat_id)
+        count = archive_chat(chat, store)
+        if count:
+            stats['chats'] += 1
+            stats['messages'] += count
+            stats['raw_bytes'] += chat.archive.raw_bytes
+            stats['stored_bytes'] += chat.archive.stored_bytes
+        db.session.expunge_all()
+
+
+def index_archives(store=None):
+    """
+    Rebuild the archived chat index entry of every archived chat, on every
+    shard: for archives made before the index existed, or copied by reshard.py
+
+    Args:
+        store: ArchiveStore (default: from the environment)
+
+    Returns:
+        int: Archived chats indexed
+    """
+    store = store or ArchiveStore.from_env()
+    indexed = 0
+    for shard in shard_indexes():
+        with use_shard(shard):
+            chat_ids = [row.chat_id for row in db.session.query(ChatArchive.chat_id).order_by(ChatArchive.chat_id)]
+            for chat_id in chat_ids:
+                archive = db.session.get(ChatArchive, chat_id)
+                chat = db.session.get(Chat, chat_id)
+                if not index_archived_chat(chat, decode(store.read(archive), archive.codec)):
+                    break
+                db.session.commit()
+                db.session.expunge_all()
+                indexed += 1
+    return indexed
+
+
+def rehydrate_chat(chat, store=None):
+    """
+    Restore an archived chat's messages to chat_histories
+
+    Messages keep their original IDs, so links and search results stay
+    valid. The archive row is deleted first; if a concurrent request
+    already restored the chat, that delete matches nothing and this call
+    backs off.
+
+    Args:
+        chat: Archived Chat
+        store: ArchiveStore (default: from the environment)
+
+    Returns:
+        int: Messages restored
+    """
+    store = store or ArchiveStore.from_env()
+    archive = chat.archive
+    if archive is None:
+        return 0
+
+    records = decode(store.read(archive), archive.codec)
+    path = archive.path
+    try:
+        claimed = db.session.execute(delete(ChatArchive).where(ChatArchive.chat_id == chat.id)).rowcount
+        if not claimed:
+            db.session.rollback()
+            db.session.expire(chat)
+            return 0
+        db.session.execute(ChatHistory.__table__.insert(), [dict(record, chat_id=chat.id) for record in records])
+        db.session.execute(update(Chat).where(Chat.id == chat.id)
+                           .values(archived_at=None, rehydrated_at=datetime.utcnow(), updated_at=Chat.updated_at))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.expire(chat)
+    store.discard(path)
+    return len(records)
@@ -0,0 +1,209 @@
+"""
+Chat Purge
+Deleting a chat only marks it (Chat.deleted_at), so the request returns at
+once whatever the chat's size. A background thread then removes the
+messages in batches of CHAT_PURGE_BATCH_SIZE, each in its own short
+transaction, followed by the archive and the chat row. purge_chats.py
+sweeps chats whose purge a restart interrupted, and deletes chats in bulk.
+
+CHAT_PURGE_ASYNC=false purges inside the deleting request instead, and
+only the chats that request deleted.
+"""
+
+import atexit
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import delete, select, update
+from app import db
+from app.models.archive import ChatArchive
+from app.models.chat import Chat, ChatHistory
+from app.services.archive import ArchiveStore
+from app.services.sharding import use_shard
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def soft_delete_chats(user_id=None, before=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Mark chats deleted, in batches, on the current shard
+
+    Args:
+        user_id: Only this user's chats (optional)
+        before: Only chats not updated since this datetime (optional)
+        batch_size: Chats marked per transaction
+
+    Returns:
+        int: Chats marked
+    """
+    conditions = [Chat.deleted_at.is_(None)]
+    if user_id is not None:
+        conditions.append(Chat.user_id == user_id)
+    if before is not None:
+        conditions.append(Chat.updated_at < before)
+
+    marked = 0
+    while True:
+        batch = select(Chat.id).where(*conditions).limit(batch_size)
+        count = db.session.execute(
+            update(Chat).where(Chat.id.in_(batch)).values(deleted_at=datetime.utcnow(), updated_at=Chat.updated_at),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        db.session.commit()
+        marked += count
+        if count < batch_size:
+            return marked
+
+
+def purge_chat(chat_id, batch_size=DEFAULT_BATCH_SIZE, store=None):
+    """
+    Delete a marked chat's messages in batches, then its archive and the chat
+
+    Returns:
+        int: Messages deleted
+    """
+    deleted = 0
+    while True:
+        batch = select(ChatHistory.id).where(ChatHistory.chat_id == chat_id).limit(batch_size)
+        count = db.session.execute(
+            delete(ChatHistory).where(ChatHistory.chat_id == chat_id, ChatHistory.id.in_(batch)),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            break
+
+    archive_path = db.session.execute(select(ChatArchive.path).where(ChatArchive.chat_id == chat_id)).scalar()
+    db.session.execute(delete(ChatArchive).where(ChatArchive.chat_id == chat_id))
+    db.session.execute(delete(Chat).where(Chat.id == chat_id, Chat.deleted_at.is_not(None)))
+    db.session.commit()
+    if archive_path:
+        (store or ArchiveStore.from_env()).discard(archive_path)
+    return deleted
+
+
+def purge_deleted_chats(batch_size=DEFAULT_BATCH_SIZE, limit=None, user_id=None):
+    """
+    Purge every marked chat on the current shard
+
+    Args:
+        batch_size: Messages deleted per transaction
+        limit: Most chats to purge (optional)
+        user_id: Only this user's chats (optional)
+
+    Returns:
+        dict: Chats and messages purged
+    """
+    store = ArchiveStore.from_env()
+    query = select(Chat.id).where(Chat.deleted_at.is_not(None)).order_by(Chat.deleted_at)
+    if user_id is not None:
+        query = query.where(Chat.user_id == user_id)
+    if limit:
+        query = query.limit(limit)
+    stats = {'chats': 0, 'messages': 0}
+    for chat_id in db.session.execute(query).scalars().all():
+        stats['messages'] += purge_chat(chat_id, batch_size, store)
+        stats['chats'] += 1
+    return stats
+
+
+class ChatPurger:
+    """Per-process background thread purging marked chats"""
+
+    def __init__(self, app, batch_size=DEFAULT_BATCH_SIZE):
+        self.app = app
+        self.batch_size = batch_size
+        self._shards = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def wake(self, shard):
+        """Purge the marked chats of a shard (None: unsharded) soon"""
+        with self._cond:
+            if self._closed:
+                return
+            # Threads do not survive fork; start one per worker process on first use
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='chat-purge', daemon=True)
+                self._thread.start()
+            self._shards.add(shard)
+            self._cond.notify()
+
+    def close(self):
+        """Finish the current sweep and stop"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._shards and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                shards, self._shards = self._shards, set()
+            for shard in shards:
+                with self.app.app_context():
+                    try:
+                        with use_shard(shard):
+                            purge_deleted_chats(self.batch_size)
+                    except Exception as e:
+                        # The chats stay marked; the next wake or purge_chats.py retries
+                        db.session.rollback()
+                        self.app.logger.warning('Chat purge failed: %s', e)
+                    finally:
+                        db.session.remove()
+
+
+def schedule_purge(app, shard, user_id=None, chat_id=None):
+    """
+    Purge a shard's marked chats in the background, or right away when
+    CHAT_PURGE_ASYNC is off
+
+    The background sweep covers the whole shard. The synchronous purge only
+    covers the chat (or the user's chats) just deleted, so a request never
+    pays for anyone else's deletes.
+
+    Args:
+        app: Flask app
+        shard: Shard of the deleted chats (None: unsharded)
+        user_id: Owner of the deleted chats
+        chat_id: The deleted chat, when only one was deleted
+    """
+    purger = app.extensions.get('chat_purge')
+    if purger is not None:
+        purger.wake(shard)
+        return
+    with use_shard(shard):
+        if chat_id is not None:
+            purge_chat(chat_id, configured_batch_size())
+        else:
+            purge_deleted_chats(configured_batch_size(), user_id=user_id)
+
+
+def configured_batch_size():
+    """CHAT_PURGE_BATCH_SIZE: rows deleted per transaction"""
+    return int(os.getenv('CHAT_PURGE_BATCH_SIZE', str(DEFAULT_BATCH_SIZE)))
+
+
+def init_chat_purge(app):
+    """
+    Create the background purger unless CHAT_PURGE_ASYNC is off
+
+    Returns:
+        ChatPurger: Purger (also in app.extensions['chat_purge']), or None
+    """
+    if os.getenv('CHAT_PURGE_ASYNC', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    purger = ChatPurger(app, batch_size=configured_batch_size())
+    app.extensions['chat_purge'] = purger
+    atexit.register(purger.close)
+    return purger
@@ -0,0 +1,264 @@
+"""
+Database Routing
+Session that sends reads from read-only controller paths to read replicas
+(DATABASE_REPLICA_URLS) while writes, flushes and everything else stay on
+the primary.
+
+A user who has just written is kept on the primary for
+REPLICA_STICKY_SECONDS (or the replicas' measured lag, if longer) so they
+always read their own writes. The write time travels in its own small
+signed cookie rather than the session, so writes never cost a session
+store save. Replicas lagging more than
+REPLICA_MAX_LAG_SECONDS, or failing, are skipped until they recover.
+"""
+
+import logging
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+from app.services.metrics import record_db_read
+from app.services.sharding import shard_engine
+
+# Seconds the replica is behind, 0 when caught up; dialects without an
+# entry (e.g. SQLite copies used for local testing) are only probed for
+# reachability and assumed current
+DEFAULT_LAG_QUERY = 'SELECT 0'
+LAG_QUERIES = {
+    'postgresql': """SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END""",
+}
+
+WRITE_STAMP_COOKIE = 'db_write_at'
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    """One read replica and its last observed health"""
+
+    def __init__(self, key):
+        self.key = key
+        self.lag = None
+        self.checked_at = 0.0
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+
+
+class ReplicaSet:
+    """Chooses a healthy, current replica for each read"""
+
+    def __init__(self, keys, max_lag=5.0, check_interval=5.0, sticky_seconds=5.0, retry_seconds=30.0):
+        """
+        Initialize the set
+
+        Args:
+            keys: SQLALCHEMY_BINDS keys of the replica engines
+            max_lag: Skip replicas further behind than this (seconds)
+            check_interval: Seconds between lag checks per replica
+            sticky_seconds: Minimum time a user reads from the primary after writing
+            retry_seconds: How long a failed replica is skipped
+        """
+        self.replicas = [Replica(key) for key in keys]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+
+    def choose(self, engines):
+        """
+        Pick a replica for a read
+
+        Args:
+            engines: Flask-SQLAlchemy engines by bind key
+
+        Returns:
+            Replica: A usable replica, or None to read from the primary
+        """
+        now = time.monotonic()
+        usable = []
+        for replica in self.replicas:
+            if replica.down_until > now:
+                continue
+            if now - replica.checked_at >= self.check_interval:
+                self._check(replica, engines[replica.key])
+            if replica.down_until <= now and replica.lag is not None and replica.lag <= self.max_lag:
+                usable.append(replica)
+        return random.choice(usable) if usable else None
+
+    def mark_down(self, key):
+        """Skip a replica for retry_seconds after an error"""
+        for replica in self.replicas:
+            if replica.key == key:
+                replica.down_until = time.monotonic() + self.retry_seconds
+                replica.checked_at = 0.0
+                logger.warning('Read replica %s unavailable; reading from the primary', key)
+
+    def _check(self, replica, engine):
+        # One request refreshes a replica's lag; the others use the last value
+        if not replica.lock.acquire(blocking=False):
+            return
+        try:
+            query = LAG_QUERIES.get(engine.dialect.name, DEFAULT_LAG_QUERY)
+            with engine.connect() as connection:
+                replica.lag = float(connection.execute(text(query)).scalar() or 0)
+        except Exception as e:
+            replica.lag = None
+            replica.down_until = time.monotonic() + self.retry_seconds
+            logger.warning('Read replica %s lag check failed: %s', replica.key, e)
+        finally:
+            replica.checked_at = time.monotonic()
+            replica.lock.release()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that routes chat data to shards and read-only paths to replicas"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            # Chat data lives on the user's shard when sharding is on
+            engine = shard_engine(self._db.engines, mapper, clause)
+            if engine is not None:
+                return engine
+            if self._flushing or isinstance(clause, UpdateBase):
+                g._db_wrote = True
+            elif g.get('_read_replica'):
+                engine = _replica_for_read(self._db.engines)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _replica_for_read(engines):
+    replicas = current_app.extensions.get('replicas')
+    if replicas is None:
+        return None
+    if g.get('_db_wrote'):
+        record_db_read('primary', 'sticky')
+        return None
+    replica = replicas.choose(engines)
+    if replica is None:
+        record_db_read('primary', 'unavailable')
+        return None
+    # Stay on the primary until the replica has had time to apply the user's last write
+    if has_request_context() and \
+            time.time() - _last_write() < max(replicas.sticky_seconds, replica.lag):
+        record_db_read('primary', 'sticky')
+        return None
+    record_db_read('replica', 'routed')
+    return engines[replica.key]
+
+
+def _stamp_serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='db-write-stamp')
+
+
+def _last_write():
+    """When this client last wrote, from the stamp cookie (0 if none or tampered with)"""
+    value = request.cookies.get(WRITE_STAMP_COOKIE)
+    if not value:
+        return 0
+    try:
+        return float(_stamp_serializer().loads(value))
+    except (BadSignature, TypeError, ValueError):
+        return 0
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stamp_write(db_session):
+    """Remember when the user last wrote, for read-your-writes across requests"""
+    if has_request_context() and g.get('_db_wrote'):
+        g._db_write_at = time.time()
+
+
+def note_write():
+    """Record a write committed outside this request's session (e.g. write-behind)"""
+    if has_app_context():
+        g._db_wrote = True
+        if has_request_context():
+            g._db_write_at = time.time()
+
+
+def _set_write_stamp(response):
+    """Send the time of this request's last write; the cookie expires when it stops mattering"""
+    written = g.get('_db_write_at')
+    if written is not None:
+        replicas = current_app.extensions['replicas']
+        response.set_cookie(
+            WRITE_STAMP_COOKIE,
+            _stamp_serializer().dumps(written),
+            max_age=math.ceil(max(replicas.sticky_seconds, replicas.max_lag)),
+            httponly=True,
+            secure=current_app.config.get('SESSION_COOKIE_SECURE', False),
+            samesite=current_app.config.get('SESSION_COOKIE_SAMESITE') or 'Lax'
+        )
+    return response
+
+
+@contextmanager
+def read_replica():
+    """Send this block's reads to a replica when one is usable"""
+    previous = g.get('_read_replica', False)
+    g._read_replica = True
+    try:
+        yield
+    finally:
+        g._read_replica = previous
+
+
+def replica_reads(fn):
+    """Decorator for read-only controller methods (see read_replica)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with read_replica():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def replica_binds(urls):
+    """
+    Build SQLALCHEMY_BINDS entries for DATABASE_REPLICA_URLS
+
+    Returns:
+        dict: Bind key -> URL
+    """
+    return {f'replica_{index}': url for index, url in enumerate(urls)}
+
+
+def init_replicas(app, db):
+    """
+    Enable replica routing if the app has replica binds
+
+    Returns:
+        ReplicaSet: Replica set (also in app.extensions['replicas']), or None
+    """
+    keys = [key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith('replica_')]
+    if not keys:
+        return None
+    replicas = ReplicaSet(
+        keys,
+        max_lag=float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5')),
+        check_interval=float(os.getenv('REPLICA_CHECK_SECONDS', '5')),
+        sticky_seconds=float(os.getenv('REPLICA_STICKY_SECONDS', '5')),
+        retry_seconds=float(os.getenv('REPLICA_RETRY_SECONDS', '30'))
+    )
+    app.extensions['replicas'] = replicas
+    app.after_request(_set_write_stamp)
+
+    with app.app_context():
+        for key in keys:
+            def on_error(context, key=key):
+                # Connection-level failures take the replica out of rotation
+                if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                    replicas.mark_down(key)
+            event.listen(db.engines[key], 'handle_error', on_error)
+    return replicas
@@ -0,0 +1,169 @@
+"""
+Generation Settings
+Per-request and per-chat max_tokens/temperature/stop sequences, and
+max_tokens sized from the answer lengths observed for similar prompts.
+"""
+
+import os
+import threading
+from collections import defaultdict, deque
+
+GENERATION_FIELDS = ('max_tokens', 'temperature', 'stop')
+MAX_STOP_SEQUENCES = 4
+
+
+def parse_generation_settings(data, max_tokens_limit=None):
+    """
+    Validate client-supplied generation settings
+
+    Args:
+        data: Mapping that may hold max_tokens, temperature and stop
+        max_tokens_limit: Highest allowed max_tokens
+                          (default: GENERATION_MAX_TOKENS_LIMIT or 4096)
+
+    Returns:
+        dict: The settings present in data, normalized
+
+    Raises:
+        ValueError: If a setting is out of range or malformed
+    """
+    if max_tokens_limit is None:
+        max_tokens_limit = int(os.getenv('GENERATION_MAX_TOKENS_LIMIT', '4096'))
+    settings = {}
+    data = data or {}
+
+    if data.get('max_tokens') is not None:
+        try:
+            max_tokens = int(data['max_tokens'])
+        except (TypeError, ValueError):
+            raise ValueError('max_tokens must be an integer')
+        if not 1 <= max_tokens <= max_tokens_limit:
+            raise ValueError(f'max_tokens must be between 1 and {max_tokens_limit}')
+        settings['max_tokens'] = max_tokens
+
+    if data.get('temperature') is not None:
+        try:
+            temperature = float(data['temperature'])
+        except (TypeError, ValueError):
+            raise ValueError('temperature must be a number')
+        if not 0.0 <= temperature <= 2.0:
+            raise ValueError('temperature must be between 0 and 2')
+        settings['temperature'] = temperature
+
+    if data.get('stop'):
+        stop = data['stop']
+        if isinstance(stop, str):
+            stop = [stop]
+        if (not isinstance(stop, list) or len(stop) > MAX_STOP_SEQUENCES
+                or not all(isinstance(s, str) and s for s in stop)):
+            raise ValueError(f'stop must be a string or a list of up to {MAX_STOP_SEQUENCES} strings')
+        settings['stop'] = stop
+
+    return settings
+
+
+def merge_generation_settings(*layers):
+    """
+    Merge settings layers; earlier layers win
+
+    Returns:
+        dict: Merged settings
+    """
+    merged = {}
+    for layer in layers:
+        for field in GENERATION_FIELDS:
+            if field not in merged and (layer or {}).get(field) is not None:
+                merged[field] = layer[field]
+    return merged
+
+
+class AnswerLengthEstimator:
+    """
+    Sizes max_tokens from recent answer lengths of similar prompts
+
+    Prompts are bucketed by shape (code, reasoning keywords, length band).
+    The suggestion is a high percentile of the bucket's recent completion
+    lengths plus headroom, so typical answers are never cut off while short
+    questions stop reserving the full default. Answers that hit their cap
+    count as twice the cap, which grows the bucket's suggestion.
+    """
+
+    def __init__(self, window=200, percentile=0.95, headroom=1.25, floor=128, ceiling=2000, min_samples=20):
+        """
+        Initialize the estimator
+
+        Args:
+            window: Recent answers kept per bucket
+            percentile: Answer length percentile to cover
+            headroom: Multiplier applied to the percentile
+            floor: Smallest suggestion
+            ceiling: Largest suggestion
+            min_samples: Answers needed in a bucket before suggesting
+        """
+        self.window = window
+        self.percentile = percentile
+        self.headroom = headroom
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build an estimator if ADAPTIVE_MAX_TOKENS is enabled
+
+        Returns:
+            AnswerLengthEstimator: Estimator, or None when disabled
+        """
+        if os.getenv('ADAPTIVE_MAX_TOKENS', 'false').lower() not in ('1', 'true', 'yes'):
+            return None
+        return cls(
+            percentile=float(os.getenv('ADAPTIVE_MAX_TOKENS_PERCENTILE', '0.95')),
+            floor=int(os.getenv('ADAPTIVE_MAX_TOKENS_FLOOR', '128')),
+            ceiling=int(os.getenv('ADAPTIVE_MAX_TOKENS_CEILING', '2000'))
+        )
+
+    @staticmethod
+    def bucket(features):
+        """
+        Get the bucket of a prompt
+
+        Args:
+            features: Prompt features from classify_prompt
+
+        Returns:
+            tuple: Bucket key
+        """
+        return (features['has_code'], features['reasoning'], min(features['message_tokens'].bit_length(), 12))
+
+    def suggest(self, features):
+        """
+        Suggest max_tokens for a prompt
+
+        Returns:
+            int: Suggested max_tokens, or None until the bucket has enough samples
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(self.bucket(features), ()))
+        if len(samples) < self.min_samples:
+            return None
+        value = samples[int(self.percentile * (len(samples) - 1))] * self.headroom
+        return int(min(max(value, self.floor), self.ceiling))
+
+    def observe(self, features, completion_tokens, max_tokens):
+        """
+        Record an answer length
+
+        Args:
+            features: Prompt features from classify_prompt
+            completion_tokens: Tokens in the answer
+            max_tokens: Cap the answer was generated under
+        """
+        if completion_tokens is None:
+            return
+        if max_tokens and completion_tokens >= max_tokens:
+            completion_tokens = max_tokens * 2
+        with self._lock:
+            self._samples[self.bucket(features)].append(completion_tokens)
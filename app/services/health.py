@@ -0,0 +1,164 @@
+"""
+Health Checks
+Background probes behind /healthz and /readyz, so load balancer checks
+answer from memory in well under 10 ms and never spend tokens.
+
+Every HEALTH_CHECK_SECONDS (default 15) a per-process thread:
+
+    database      SELECT 1 on the primary and on each shard
+    provider:*    refreshes each provider's model catalog, a metadata call
+                  with a HEALTH_CHECK_TIMEOUT second timeout (default 2)
+                  that doubles as its reachability probe
+
+/healthz only says the process is serving. /readyz reports every check
+and fails (503) while the database checks fail or are older than three
+intervals. Provider failures fail it only with
+READYZ_REQUIRE_PROVIDERS=true: every instance shares the provider, so
+taking them all out of rotation would not help.
+"""
+
+import atexit
+import os
+import threading
+import time
+from sqlalchemy import text
+from app import db
+from app.services.sharding import shard_indexes, shard_key
+
+
+class HealthMonitor:
+    """Per-process background health checks with cached results"""
+
+    def __init__(self, app, providers, names, interval=15.0, timeout=2.0, require_providers=False):
+        """
+        Initialize the monitor
+
+        Args:
+            app: Flask app whose databases are checked
+            providers: ProviderRegistry whose providers are probed
+            names: Provider names to probe
+            interval: Seconds between rounds of checks
+            timeout: Seconds each provider probe may take
+            require_providers: Whether provider failures make /readyz fail
+        """
+        self.app = app
+        self.providers = providers
+        self.names = list(names)
+        self.interval = interval
+        self.timeout = timeout
+        self.require_providers = require_providers
+        self._results = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def readiness(self):
+        """
+        Evaluate the cached check results (no I/O)
+
+        Returns:
+            tuple: (ready, body) where body holds 'status' and per-check
+                   'ok', 'age_seconds', 'latency_ms', 'error' and details
+        """
+        self._ensure_running()
+        now = time.monotonic()
+        with self._lock:
+            results = dict(self._results)
+
+        if not results:
+            return False, {'status': 'starting', 'checks': {}}
+
+        checks = {}
+        ready = True
+        for name, result in results.items():
+            age = now - result['checked_at']
+            ok = result['ok'] and age <= self.interval * 3
+            checks[name] = dict(result, ok=ok, age_seconds=round(age, 1))
+            checks[name].pop('checked_at')
+            if not ok and (name == 'database' or self.require_providers):
+                ready = False
+        return ready, {'status': 'ready' if ready else 'not_ready', 'checks': checks}
+
+    def check_now(self):
+        """Run every check once and store the results"""
+        results = {'database': self._check(self._check_databases)}
+        for name in self.names:
+            results[f'provider:{name}'] = self._check(lambda: self._check_provider(name))
+        with self._lock:
+            self._results = results
+
+    def close(self):
+        """Stop the background checks"""
+        self._closed = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=self.timeout + 1)
+
+    def _ensure_running(self):
+        # Threads do not survive fork; start one per worker process on first use
+        if self._closed or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='health-checks', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self.check_now()
+            self._wakeup.wait(self.interval)
+
+    @staticmethod
+    def _check(probe):
+        started = time.perf_counter()
+        try:
+            details = probe() or {}
+            result = dict(details, ok=True, error=None)
+        except Exception as e:
+            result = {'ok': False, 'error': str(e)}
+        result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        result['checked_at'] = time.monotonic()
+        return result
+
+    def _check_databases(self):
+        with self.app.app_context():
+            engines = [db.engine]
+            engines.extend(db.engines[shard_key(index)] for index in shard_indexes() if index is not None)
+            for engine in engines:
+                with engine.connect() as connection:
+                    connection.execute(text('SELECT 1'))
+        return {'databases': len(engines)}
+
+    def _check_provider(self, name):
+        provider = self.providers.get(name)
+        models = provider.refresh_models(timeout=self.timeout)
+        return {'models': len(models)}
+
+
+def init_health(app, providers, names):
+    """
+    Create the health monitor behind /healthz and /readyz
+
+    Args:
+        providers: ProviderRegistry the app answers with
+        names: Provider names in use (HEALTH_CHECK_PROVIDERS overrides)
+
+    Returns:
+        HealthMonitor: Monitor (also in app.extensions['health'])
+    """
+    configured = [name.strip() for name in os.getenv('HEALTH_CHECK_PROVIDERS', '').split(',') if name.strip()]
+    monitor = HealthMonitor(
+        app,
+        providers,
+        configured or names,
+        interval=float(os.getenv('HEALTH_CHECK_SECONDS', '15')),
+        timeout=float(os.getenv('HEALTH_CHECK_TIMEOUT', '2')),
+        require_providers=os.getenv('READYZ_REQUIRE_PROVIDERS', 'false').lower() in ('1', 'true', 'yes')
+    )
+    app.extensions['health'] = monitor
+    atexit.register(monitor.close)
+    return monitor
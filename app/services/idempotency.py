@@ -0,0 +1,120 @@
+"""
+Idempotency Key Store
+Remembers the results of sends made with an Idempotency-Key in the
+idempotency_keys table, so a retry that lands on another worker process
+(or arrives after a restart) gets the original answer instead of a second
+OpenAI call and a second saved message.
+
+A send first claims its key with an insert. A caller that finds the key
+claimed by a send still running elsewhere polls until that send finishes
+or its claim expires.
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.idempotency import IdempotencyKey
+
+# A claim outlives any send; a worker that dies mid-send frees its key after this
+CLAIM_SECONDS = 300
+POLL_SECONDS = 0.25
+PURGE_PROBABILITY = 0.01
+
+# Marker for a key claimed by a send that has not finished
+_RUNNING = object()
+
+
+class IdempotencyStore:
+    """
+    idempotency_keys table store
+
+    Uses its own short transactions on the primary engine, like the
+    database session store, so claims are visible to other workers at once
+    and never commit work pending on db.session.
+    """
+
+    def __init__(self, result_ttl=600, wait_seconds=60):
+        """
+        Initialize the store
+
+        Args:
+            result_ttl: Seconds a successful result is remembered
+            wait_seconds: Longest wait for a send running in another process
+        """
+        self.result_ttl = result_ttl
+        self.wait_seconds = wait_seconds
+
+    def do(self, user_id, key, fn):
+        """
+        Run fn unless a send with the same key already ran or is running
+
+        Args:
+            user_id: Owner of the key
+            key: Client-supplied idempotency key
+            fn: Zero-argument callable returning (success, message, data)
+
+        Returns:
+            tuple: ((success, message, data), shared) where shared is True if
+                   the result came from an earlier or concurrent send
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            stored = self._claim(user_id, key)
+            if stored is None:
+                break
+            if stored is not _RUNNING:
+                return tuple(stored), True
+            if time.monotonic() >= deadline:
+                return (False, 'A request with this Idempotency-Key is still in progress', None), True
+            time.sleep(POLL_SECONDS)
+
+        try:
+            result = fn()
+        except BaseException:
+            self._release(user_id, key)
+            raise
+        if result[0]:
+            self._complete(user_id, key, result)
+        else:
+            # Failures are not remembered; a retry runs again
+            self._release(user_id, key)
+        return result, False
+
+    def _claim(self, user_id, key):
+        """Insert a running claim; returns None if claimed, else the stored result or _RUNNING"""
+        table = IdempotencyKey.__table__
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.delete().where(
+                    table.c.user_id == user_id, table.c.key == key, table.c.expires_at <= now))
+                conn.execute(table.insert().values(
+                    user_id=user_id, key=key, result=None, expires_at=now + timedelta(seconds=CLAIM_SECONDS)))
+        except IntegrityError:
+            with db.engine.connect() as conn:
+                row = conn.execute(db.select(table.c.result).where(
+                    table.c.user_id == user_id, table.c.key == key)).first()
+            if row is None:
+                return _RUNNING  # expired and deleted in between; claim again next round
+            return row[0] if row[0] is not None else _RUNNING
+        if random.random() < PURGE_PROBABILITY:
+            self.purge_expired()
+        return None
+
+    def _complete(self, user_id, key, result):
+        table = IdempotencyKey.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.user_id == user_id, table.c.key == key).values(
+                result=list(result), expires_at=datetime.utcnow() + timedelta(seconds=self.result_ttl)))
+
+    def _release(self, user_id, key):
+        table = IdempotencyKey.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.user_id == user_id, table.c.key == key))
+
+    def purge_expired(self):
+        table = IdempotencyKey.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.expires_at <= datetime.utcnow()))
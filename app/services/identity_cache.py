@@ -0,0 +1,150 @@
+"""
+User Identity Cache
+Per-process LRU of the user fields views need, so authenticated requests
+can skip the user lookup query
+
+Staleness: invalidate() only clears the worker process that made the
+change. Every other worker keeps serving its cached fields (name, email,
+system_prompt_version, ...) until the entry expires, so changes, and a
+deleted user's ability to authenticate, take up to IDENTITY_CACHE_TTL
+seconds (default 60) to reach all workers. Set IDENTITY_CACHE_TTL=0 to
+look the user up on every request instead.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from app.services.metrics import record_cache
+
+# Fields copied from User; everything else is loaded on demand
+IDENTITY_FIELDS = ('id', 'username', 'email', 'name', 'one_login_id', 'created_at',
+                   'system_prompt_version')
+
+
+class UserIdentity(UserMixin):
+    """
+    Lightweight stand-in for User used as current_user
+
+    Holds the cached identity fields. Any other attribute (chat_count,
+    chats, ...) loads the full User row for the current request on first use.
+    """
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+        self._model = None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_model(), name)
+
+    def get_model(self):
+        """
+        Get the full User row (one query, at most once per request)
+
+        Returns:
+            User: User object
+        """
+        if self._model is None:
+            from app import db
+            from app.models.user import User
+            self._model = db.session.get(User, self.id)
+            if self._model is None:
+                raise AttributeError(f'User {self.id} no longer exists')
+        return self._model
+
+    def __repr__(self):
+        return f'<UserIdentity {self.username}>'
+
+
+class IdentityCache:
+    """Thread-safe LRU cache of identity fields with a TTL"""
+
+    def __init__(self, maxsize=10000, ttl=60):
+        """
+        Initialize the cache
+
+        Args:
+            maxsize: Maximum number of users kept
+            ttl: Seconds before an entry is re-read from the database
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        Get cached identity fields
+
+        Returns:
+            dict: Identity fields or None on miss/expiry
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                record_cache('identity', False)
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+        record_cache('identity', True)
+        return entry[1]
+
+    def put(self, user):
+        """
+        Cache the identity fields of a User
+
+        Returns:
+            dict: The cached fields
+        """
+        fields = {field: getattr(user, field) for field in IDENTITY_FIELDS}
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, fields)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return fields
+
+    def invalidate(self, user_id):
+        """Drop a user so the next request re-reads it"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache(
+    maxsize=int(os.getenv('IDENTITY_CACHE_SIZE', '10000')),
+    ttl=int(os.getenv('IDENTITY_CACHE_TTL', '60'))
+)
+
+
+def load_identity(user_id):
+    """
+    Flask-Login user loader backed by the identity cache
+
+    Args:
+        user_id: User ID from the session
+
+    Returns:
+        UserIdentity: Identity for this request, or None if the user is gone
+    """
+    from app import db
+    from app.models.user import User
+
+    fields = identity_cache.get(user_id)
+    if fields is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        fields = identity_cache.put(user)
+    return UserIdentity(fields)
@@ -0,0 +1,163 @@
+"""
+Request Instrumentation
+Per-request timing breakdown: SQL query count and time, named spans
+(OpenAI calls, history conversion, commits) with token usage, exposed as a
+Server-Timing header and in slow-request logs.
+
+Enabled with INSTRUMENTATION_ENABLED=true. When disabled no hooks or SQL
+event listeners are installed and span() returns a shared no-op context.
+"""
+
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from flask import g, has_app_context, request
+
+_enabled = False
+_noop = nullcontext()
+
+
+class RequestTimings:
+    """Timing breakdown collected during one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_ms = 0.0
+        self.spans = {}
+        self.attrs = {}
+
+    def add(self, name, elapsed_ms):
+        count, total = self.spans.get(name, (0, 0.0))
+        self.spans[name] = (count + 1, total + elapsed_ms)
+
+    def annotate(self, **attrs):
+        for key, value in attrs.items():
+            if isinstance(value, (int, float)) and isinstance(self.attrs.get(key), (int, float)):
+                self.attrs[key] += value
+            else:
+                self.attrs[key] = value
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """Format as a Server-Timing header value"""
+        parts = [f'db;dur={self.query_ms:.1f};desc="{self.query_count} queries"']
+        for name, (count, total) in self.spans.items():
+            desc = f';desc="{count} calls"' if count > 1 else ''
+            parts.append(f'{name};dur={total:.1f}{desc}')
+        parts.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(parts)
+
+    def summary(self):
+        """Format as a one-line breakdown for logs"""
+        parts = [f'db={self.query_ms:.1f}ms/{self.query_count}q']
+        parts.extend(f'{name}={total:.1f}ms' for name, (_, total) in self.spans.items())
+        parts.extend(f'{key}={value}' for key, value in self.attrs.items())
+        return ' '.join(parts)
+
+
+def is_enabled():
+    return _enabled
+
+
+def current_timings():
+    """
+    Get the timings of the current request
+
+    Returns:
+        RequestTimings: Timings or None when disabled / outside a request
+    """
+    if not _enabled or not has_app_context():
+        return None
+    return g.get('_request_timings')
+
+
+@contextmanager
+def _timed_span(timings, name, attrs):
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings.add(name, (time.perf_counter() - started) * 1000)
+        if attrs:
+            timings.annotate(**attrs)
+
+
+def span(name, **attrs):
+    """
+    Time a block of work under a name in the current request's breakdown
+
+    Usage:
+        with span('openai', model=model) as timings:
+            ...
+            if timings:
+                timings.annotate(tokens_in=10)
+    """
+    timings = current_timings()
+    if timings is None:
+        return _noop
+    return _timed_span(timings, name, attrs)
+
+
+def annotate(**attrs):
+    """Attach values (e.g. token usage) to the current request's breakdown"""
+    timings = current_timings()
+    if timings is not None:
+        timings.annotate(**attrs)
+
+
+def init_instrumentation(app, db):
+    """
+    Install request hooks and SQL event listeners if INSTRUMENTATION_ENABLED
+
+    Returns:
+        bool: True if instrumentation is active
+    """
+    global _enabled
+    if os.getenv('INSTRUMENTATION_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return False
+
+    from sqlalchemy import event
+
+    _enabled = True
+    slow_request_ms = float(os.getenv('SLOW_REQUEST_MS', '1000'))
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started_stack = conn.info.get('_query_started')
+        if not started_stack:
+            return
+        elapsed_ms = (time.perf_counter() - started_stack.pop()) * 1000
+        timings = current_timings()
+        if timings is not None:
+            timings.query_count += 1
+            timings.query_ms += elapsed_ms
+
+    with app.app_context():
+        # Every bind: primary, read replicas and chat shards
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_request_timings():
+        g._request_timings = RequestTimings()
+
+    @app.after_request
+    def finish_request_timings(response):
+        timings = g.get('_request_timings')
+        if timings is None:
+            return response
+        response.headers['Server-Timing'] = timings.server_timing()
+        total_ms = timings.total_ms
+        if total_ms >= slow_request_ms:
+            app.logger.warning('Slow request %s %s %d %.0fms: %s', request.method, request.path,
+                               response.status_code, total_ms, timings.summary())
+        return response
+
+    return True
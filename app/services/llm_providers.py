@@ -0,0 +1,513 @@
+"""
+LLM Providers
+Interchangeable chat backends behind one interface (chat, stream, title):
+
+    openai      OpenAI API (OPENAI_API_KEY, OPENAI_MODEL)
+    compatible  Any OpenAI-compatible server (LLM_COMPATIBLE_BASE_URL,
+                LLM_COMPATIBLE_API_KEY, LLM_COMPATIBLE_MODEL)
+    llama_cpp   Local quantized GGUF model on the CPU (LLAMA_CPP_MODEL_PATH;
+                requires llama-cpp-python)
+    echo        Deterministic echo model for tests and benchmarks
+
+LLM_PROVIDER picks the default (openai) and LLM_TITLE_PROVIDER the one used
+for chat titles (defaults to LLM_PROVIDER).
+"""
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from app.services.instrumentation import span, annotate
+from app.services.metrics import track_upstream, record_tokens
+from app.services.prompt_assembly import assemble, history_messages, prefix_digest
+
+try:
+    from llama_cpp import Llama
+except ImportError:  # optional dependency
+    Llama = None
+
+DEFAULT_SYSTEM_PROMPT = "You are Bart, a helpful and intelligent AI assistant. You are knowledgeable, creative, and always strive to provide accurate and helpful responses."
+TITLE_SYSTEM_PROMPT = "You are a helpful assistant that generates concise, descriptive titles for chat conversations. Return only the title, nothing else."
+
+
+def estimate_tokens(text):
+    """
+    Rough token count (~4 characters per token) for when the API reports none
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+class UnknownProviderError(ValueError):
+    """Raised when a provider name is not registered or not configured"""
+
+
+class LLMProvider(ABC):
+    """
+    Base class for chat backends
+
+    Subclasses implement _complete (and may override _stream); this class
+    adds the system prompt, instrumentation, metrics, usage, latency and the
+    error contract shared by every provider.
+    """
+
+    name = None
+    default_model = None
+    system_prompt = DEFAULT_SYSTEM_PROMPT
+    # Returned by get_models when the backend could never be listed
+    fallback_models = ()
+    _models = None
+    _models_at = 0.0
+    _models_retry_at = 0.0
+
+    @abstractmethod
+    def _complete(self, messages, model, max_tokens, temperature, stop=None):
+        """
+        Run one completion
+
+        Args:
+            stop: List of stop sequences, or None
+
+        Returns:
+            tuple: (text, usage dict or None if the backend does not report it;
+                    'cached_prompt_tokens' counts prompt tokens served from
+                    the backend's prefix cache, where reported)
+        """
+
+    def _stream(self, messages, model, max_tokens, temperature, stop=None):
+        """
+        Yield text deltas of one completion (default: a single delta)
+
+        Closing the generator must release the upstream request.
+        """
+        text, _ = self._complete(messages, model, max_tokens, temperature, stop)
+        yield text
+
+    def get_chat_response(self, messages, model=None, max_tokens=2000, temperature=0.7, stop=None,
+                          system_prompt=None):
+        """
+        Get a response with conversation history
+
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            model: Model to use (default: the provider's default model)
+            max_tokens: Maximum tokens for response (default: 2000)
+            temperature: Response creativity 0.0 to 1.0 (default: 0.7)
+            stop: Up to 4 sequences that end the answer (optional)
+            system_prompt: System prompt for this call (default: the
+                           provider's); see app/services/system_prompts.py
+
+        Returns:
+            dict: Response with 'success', 'response', 'usage', 'model',
+                  'max_tokens', 'latency_ms' and 'error' fields
+        """
+        model = model or self.default_model
+        try:
+            provider_messages = assemble(system_prompt or self.system_prompt, messages)
+
+            with span(self.name, model=model), track_upstream('chat', model):
+                started = time.perf_counter()
+                text, usage = self._complete(provider_messages, model, max_tokens, temperature, stop)
+
+            usage = usage or self._estimate_usage(provider_messages, estimate_tokens(text))
+            annotate(tokens_in=usage['prompt_tokens'], tokens_out=usage['completion_tokens'],
+                     tokens_cached=usage.get('cached_prompt_tokens') or 0,
+                     prompt_prefix=prefix_digest(provider_messages))
+            record_tokens(model, usage)
+
+            return {
+                'success': True,
+                'response': text,
+                'usage': usage,
+                'model': model,
+                'max_tokens': max_tokens,
+                'latency_ms': int((time.perf_counter() - started) * 1000)
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'response': None,
+                'usage': {}
+            }
+
+    def stream_chat_response(self, messages, on_token=None, model=None, max_tokens=2000, temperature=0.7,
+                             stop=None, cancel=None, system_prompt=None):
+        """
+        Stream a response, reporting each token delta as it arrives
+
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            on_token: Callable invoked with each text delta (optional)
+            model: Model to use (default: the provider's default model)
+            max_tokens: Maximum tokens for response (default: 2000)
+            temperature: Response creativity 0.0 to 1.0 (default: 0.7)
+            stop: Up to 4 sequences that end the answer (optional)
+            cancel: threading.Event; once set, the upstream stream is closed
+                    and the partial answer returned with 'stopped': True
+            system_prompt: System prompt for this call (default: the provider's)
+
+        Returns:
+            dict: Same shape as get_chat_response; streams do not report
+                  usage, so 'usage' is estimated and flagged 'estimated'
+        """
+        model = model or self.default_model
+        try:
+            provider_messages = assemble(system_prompt or self.system_prompt, messages)
+            annotate(prompt_prefix=prefix_digest(provider_messages))
+
+            parts = []
+            stopped = False
+            with span(self.name, model=model), track_upstream('stream', model):
+                started = time.perf_counter()
+                stream = self._stream(provider_messages, model, max_tokens, temperature, stop)
+                try:
+                    for delta in stream:
+                        if cancel is not None and cancel.is_set():
+                            stopped = True
+                            break
+                        if not delta:
+                            continue
+                        if not parts:
+                            annotate(ttft_ms=round((time.perf_counter() - started) * 1000, 1))
+                        parts.append(delta)
+                        if on_token:
+                            on_token(delta)
+                finally:
+                    stream.close()
+
+            usage = self._estimate_usage(provider_messages, len(parts))
+            record_tokens(model, usage)
+
+            return {
+                'success': True,
+                'response': ''.join(parts),
+                'usage': usage,
+                'model': model,
+                'max_tokens': max_tokens,
+                'latency_ms': int((time.perf_counter() - started) * 1000),
+                'stopped': stopped
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'response': None,
+                'usage': {}
+            }
+
+    def generate_chat_title(self, first_message, model=None):
+        """
+        Generate a title for a new chat based on the first message
+
+        Args:
+            first_message: The first message in the conversation
+            model: Model to use for title generation
+
+        Returns:
+            str: Generated title or default title
+        """
+        model = model or self.default_model
+        try:
+            title_prompt = f"Generate a short, descriptive title (max 50 characters) for a chat that starts with this message: '{first_message[:200]}...'"
+            messages = [
+                {"role": "system", "content": TITLE_SYSTEM_PROMPT},
+                {"role": "user", "content": title_prompt}
+            ]
+
+            with span(f'{self.name}_title', title_model=model), track_upstream('title', model):
+                title, _ = self._complete(messages, model, 100, 0.3)
+
+            # Clean up the title
+            title = title.strip().replace('"', '').replace("'", "").strip()
+
+            # If title is too long, truncate it
+            if len(title) > 50:
+                title = title[:47] + "..."
+
+            return title if title else "New Chat"
+
+        except Exception as e:
+            print(f"Error generating chat title: {e}")
+            return "New Chat"
+
+    def list_models(self, timeout=None):
+        """
+        Fetch the model IDs the backend serves
+
+        A metadata call that spends no tokens, so it doubles as a health
+        probe. The default suits local backends, which serve one model.
+
+        Args:
+            timeout: Seconds to wait for the backend (default: the client's)
+
+        Returns:
+            list: Model IDs
+
+        Raises:
+            Exception: If the backend cannot be reached
+        """
+        return [self.default_model]
+
+    def refresh_models(self, timeout=None):
+        """
+        Fetch the model IDs and replace the cached catalog
+
+        Returns:
+            list: Model IDs
+        """
+        models = self.list_models(timeout)
+        self._models, self._models_at = models, time.monotonic()
+        return list(models)
+
+    def get_models(self, max_age=None):
+        """
+        Get the model IDs the backend serves, from the cached catalog
+
+        The health monitor (app/services/health.py) refreshes the catalog in
+        the background; without it, a catalog older than max_age is
+        refetched on use, with HEALTH_CHECK_TIMEOUT (default 2 s) and no
+        retries. After a failed fetch the last known list is served for
+        MODEL_CATALOG_RETRY_SECONDS (default 30) before trying again, so a
+        backend outage never stalls every call.
+
+        Args:
+            max_age: Seconds a catalog stays fresh (default: MODEL_CATALOG_TTL or 600)
+
+        Returns:
+            list: Model IDs (the last known list, or fallback_models, if
+                  the backend cannot be reached)
+        """
+        if max_age is None:
+            max_age = float(os.getenv('MODEL_CATALOG_TTL', '600'))
+        now = time.monotonic()
+        if ((self._models is None or now - self._models_at > max_age)
+                and now >= self._models_retry_at):
+            try:
+                return self.refresh_models(timeout=float(os.getenv('HEALTH_CHECK_TIMEOUT', '2')))
+            except Exception as e:
+                print(f"Error getting models: {e}")
+                self._models_retry_at = time.monotonic() + float(os.getenv('MODEL_CATALOG_RETRY_SECONDS', '30'))
+        if self._models is None:
+            return list(self.fallback_models) or [self.default_model]
+        return list(self._models)
+
+    def get_conversation_history(self, chat_history_records):
+        """
+        Convert database chat history to chat message format
+
+        Messages are canonical (see prompt_assembly), so each turn repeats
+        the previous turn's prompt byte for byte.
+
+        Args:
+            chat_history_records: List of ChatHistory objects from database, oldest first
+
+        Returns:
+            list: List of message dictionaries
+        """
+        try:
+            return history_messages(chat_history_records)
+
+        except Exception as e:
+            print(f"Error converting conversation history: {e}")
+            return []
+
+    @staticmethod
+    def _estimate_usage(messages, completion_tokens):
+        prompt_tokens = sum(estimate_tokens(m['content']) for m in messages)
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'estimated': True
+        }
+
+
+class EchoProvider(LLMProvider):
+    """Deterministic provider that answers with the last user message"""
+
+    name = 'echo'
+    default_model = 'echo'
+
+    def _complete(self, messages, model, max_tokens, temperature, stop=None):
+        return self._answer(messages, stop), None
+
+    def _stream(self, messages, model, max_tokens, temperature, stop=None):
+        words = self._answer(messages, stop).split(' ')
+        for index, word in enumerate(words):
+            yield word if index == len(words) - 1 else word + ' '
+
+    def generate_chat_title(self, first_message, model=None):
+        title = ' '.join(first_message.split())
+        if len(title) > 50:
+            title = title[:47] + "..."
+        return title or "New Chat"
+
+    @staticmethod
+    def _answer(messages, stop=None):
+        answer = f"echo: {messages[-1]['content']}"
+        for sequence in stop or ():
+            answer = answer.split(sequence, 1)[0]
+        return answer
+
+
+class LlamaCppProvider(LLMProvider):
+    """
+    Local GGUF model run on the CPU through llama-cpp-python
+
+    The model is loaded on first use. A llama.cpp context is not thread-safe,
+    so calls are serialized; size LLAMA_CPP_THREADS for the host instead.
+    """
+
+    name = 'llama_cpp'
+
+    def __init__(self, model_path, n_ctx=2048, n_threads=None):
+        """
+        Initialize the provider
+
+        Args:
+            model_path: Path to a GGUF model file
+            n_ctx: Context window in tokens
+            n_threads: CPU threads for inference (default: llama.cpp's choice)
+        """
+        if Llama is None:
+            raise UnknownProviderError('llama_cpp provider requires llama-cpp-python')
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.default_model = os.path.basename(model_path)
+        self._llama = None
+        self._lock = threading.Lock()
+
+    def list_models(self, timeout=None):
+        if not os.path.isfile(self.model_path):
+            raise FileNotFoundError(f'Model file not found: {self.model_path}')
+        return [self.default_model]
+
+    def _model(self):
+        if self._llama is None:
+            self._llama = Llama(model_path=self.model_path, n_ctx=self.n_ctx,
+                                n_threads=self.n_threads, verbose=False)
+        return self._llama
+
+    def _complete(self, messages, model, max_tokens, temperature, stop=None):
+        with self._lock:
+            result = self._model().create_chat_completion(
+                messages=messages, max_tokens=max_tokens, temperature=temperature, stop=stop)
+        usage = result.get('usage')
+        return result['choices'][0]['message']['content'], usage and {
+            'prompt_tokens': usage['prompt_tokens'],
+            'completion_tokens': usage['completion_tokens'],
+            'total_tokens': usage['total_tokens']
+        }
+
+    def _stream(self, messages, model, max_tokens, temperature, stop=None):
+        # Generation stops (and the lock is released) when this generator is closed
+        with self._lock:
+            for chunk in self._model().create_chat_completion(
+                    messages=messages, max_tokens=max_tokens, temperature=temperature,
+                    stop=stop, stream=True):
+                yield chunk['choices'][0]['delta'].get('content')
+
+
+def _openai():
+    from app.services.openai_service import OpenAIService
+    return OpenAIService()
+
+
+def _compatible():
+    from app.services.openai_service import OpenAIService
+    base_url = os.getenv('LLM_COMPATIBLE_BASE_URL')
+    if not base_url:
+        raise UnknownProviderError('compatible provider requires LLM_COMPATIBLE_BASE_URL')
+    return OpenAIService(
+        api_key=os.getenv('LLM_COMPATIBLE_API_KEY', 'not-needed'),
+        base_url=base_url,
+        default_model=os.getenv('LLM_COMPATIBLE_MODEL'),
+        name='compatible'
+    )
+
+
+def _llama_cpp():
+    model_path = os.getenv('LLAMA_CPP_MODEL_PATH')
+    if not model_path:
+        raise UnknownProviderError('llama_cpp provider requires LLAMA_CPP_MODEL_PATH')
+    threads = os.getenv('LLAMA_CPP_THREADS')
+    return LlamaCppProvider(model_path, n_ctx=int(os.getenv('LLAMA_CPP_CONTEXT', '2048')),
+                            n_threads=int(threads) if threads else None)
+
+
+PROVIDER_FACTORIES = {
+    'openai': _openai,
+    'compatible': _compatible,
+    'llama_cpp': _llama_cpp,
+    'echo': EchoProvider,
+}
+
+
+class ProviderRegistry:
+    """Named providers, each built on first use and then shared"""
+
+    def __init__(self, default=None, factories=None):
+        """
+        Initialize the registry
+
+        Args:
+            default: Default provider name (default: LLM_PROVIDER or 'openai')
+            factories: Mapping of name to zero-argument factory
+                       (default: PROVIDER_FACTORIES)
+        """
+        self.default = default or os.getenv('LLM_PROVIDER', 'openai')
+        self._factories = dict(factories or PROVIDER_FACTORIES)
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        """
+        Get registered provider names
+
+        Returns:
+            list: Provider names
+        """
+        return sorted(self._factories)
+
+    def register(self, name, provider):
+        """Register (or replace) a provider instance under a name"""
+        with self._lock:
+            self._factories[name] = lambda: provider
+            self._instances[name] = provider
+
+    def get(self, name=None):
+        """
+        Get a provider by name
+
+        Args:
+            name: Provider name (default: the registry default)
+
+        Returns:
+            LLMProvider: Provider instance
+
+        Raises:
+            UnknownProviderError: If the name is unknown or not configured
+        """
+        name = name or self.default
+        provider = self._instances.get(name)
+        if provider is not None:
+            return provider
+
+        factory = self._factories.get(name)
+        if factory is None:
+            raise UnknownProviderError(f'Unknown provider: {name}')
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = factory()
+            return self._instances[name]
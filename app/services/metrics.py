@@ -0,0 +1,231 @@
+"""
+Prometheus Metrics
+Request latency per route, OpenAI latency/tokens/in-flight calls, cache hit
+rates, model routing decisions, write-behind batches, replica reads and DB
+pool usage.
+
+Enabled with METRICS_ENABLED=true (requires prometheus_client). Under
+Gunicorn set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by all
+workers so /metrics aggregates every process. When disabled, the record
+helpers are no-ops.
+"""
+
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import prometheus_client
+except ImportError:  # optional dependency
+    prometheus_client = None
+
+_enabled = False
+_noop = nullcontext()
+
+# Populated by init_metrics
+HTTP_LATENCY = None
+OPENAI_LATENCY = None
+OPENAI_TOKENS = None
+OPENAI_IN_FLIGHT = None
+CACHE_REQUESTS = None
+MODEL_ROUTES = None
+WRITE_BATCH_SIZE = None
+DB_READS = None
+DB_POOL_CHECKED_OUT = None
+DB_POOL_SIZE = None
+
+# Capacity of this process's DB pools, reported on its first checkout
+_pool_capacity = 0
+_pool_size_pid = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def is_enabled():
+    return _enabled
+
+
+@contextmanager
+def _track_upstream(kind, model):
+    OPENAI_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'success'
+    finally:
+        OPENAI_IN_FLIGHT.dec()
+        OPENAI_LATENCY.labels(kind=kind, model=model, outcome=outcome).observe(time.perf_counter() - started)
+
+
+def track_upstream(kind, model):
+    """
+    Time an OpenAI call and count it as in flight
+
+    Args:
+        kind: 'chat', 'stream' or 'title'
+        model: Model name
+    """
+    if not _enabled:
+        return _noop
+    return _track_upstream(kind, model)
+
+
+def record_tokens(model, usage):
+    """Count prompt/completion tokens from an OpenAI usage dict"""
+    if not _enabled or not usage:
+        return
+    OPENAI_TOKENS.labels(model=model, direction='in').inc(usage.get('prompt_tokens', 0))
+    OPENAI_TOKENS.labels(model=model, direction='out').inc(usage.get('completion_tokens', 0))
+    # Part of 'in' that the provider served from its prompt prefix cache
+    OPENAI_TOKENS.labels(model=model, direction='cached').inc(usage.get('cached_prompt_tokens') or 0)
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup as hit or miss"""
+    if _enabled:
+        CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def record_route(tier, reason):
+    """Count a model routing decision ('complexity', 'downgraded' or 'fallback')"""
+    if _enabled:
+        MODEL_ROUTES.labels(tier=tier, reason=reason).inc()
+
+
+def record_write_batch(size):
+    """Observe the number of messages committed by one write-behind transaction"""
+    if _enabled:
+        WRITE_BATCH_SIZE.observe(size)
+
+
+def record_db_read(target, reason):
+    """Count a read on a replica-eligible path by where it went ('primary' or 'replica') and why"""
+    if _enabled:
+        DB_READS.labels(target=target, reason=reason).inc()
+
+
+def report_pool_size():
+    """
+    Report this process's DB pool capacity, once per process
+
+    Gauges are per process and a preloaded master's value never reaches
+    the workers, so each worker reports its own (Gunicorn post_worker_init,
+    or its first checkout).
+    """
+    global _pool_size_pid
+    if _enabled and _pool_size_pid != os.getpid():
+        _pool_size_pid = os.getpid()
+        DB_POOL_SIZE.set(_pool_capacity)
+
+
+def _pool_checkout(*args):
+    report_pool_size()
+    DB_POOL_CHECKED_OUT.inc()
+
+
+def _pool_checkin(*args):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+def release_pool_size():
+    """Stop counting this process's pool capacity (Gunicorn master, before forking workers)"""
+    global _pool_size_pid
+    if _enabled:
+        _pool_size_pid = None
+        DB_POOL_SIZE.set(0)
+
+
+def _define_metrics():
+    global HTTP_LATENCY, OPENAI_LATENCY, OPENAI_TOKENS, OPENAI_IN_FLIGHT
+    global CACHE_REQUESTS, MODEL_ROUTES, WRITE_BATCH_SIZE, DB_READS, DB_POOL_CHECKED_OUT, DB_POOL_SIZE
+
+    Histogram, Counter, Gauge = prometheus_client.Histogram, prometheus_client.Counter, prometheus_client.Gauge
+    HTTP_LATENCY = Histogram('bart_http_request_duration_seconds', 'HTTP request latency',
+                             ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS)
+    OPENAI_LATENCY = Histogram('bart_openai_request_duration_seconds', 'OpenAI call latency',
+                               ['kind', 'model', 'outcome'], buckets=LATENCY_BUCKETS)
+    OPENAI_TOKENS = Counter('bart_openai_tokens_total', 'OpenAI tokens', ['model', 'direction'])
+    OPENAI_IN_FLIGHT = Gauge('bart_openai_in_flight', 'OpenAI calls in flight', multiprocess_mode='livesum')
+    CACHE_REQUESTS = Counter('bart_cache_requests_total', 'Cache lookups', ['cache', 'result'])
+    MODEL_ROUTES = Counter('bart_model_routes_total', 'Model routing decisions', ['tier', 'reason'])
+    WRITE_BATCH_SIZE = Histogram('bart_write_behind_batch_size', 'Messages per write-behind commit',
+                                 buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+    DB_READS = Counter('bart_db_routed_reads_total', 'Reads on replica-eligible paths', ['target', 'reason'])
+    DB_POOL_CHECKED_OUT = Gauge('bart_db_pool_checked_out', 'DB connections in use',
+                                multiprocess_mode='livesum')
+    DB_POOL_SIZE = Gauge('bart_db_pool_size', 'DB pool capacity (size + max overflow)',
+                         multiprocess_mode='livesum')
+
+
+def init_metrics(app, db):
+    """
+    Install metric hooks and the /metrics endpoint if METRICS_ENABLED
+
+    Returns:
+        bool: True if metrics are active
+    """
+    global _enabled, _pool_capacity
+    if os.getenv('METRICS_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return False
+    if prometheus_client is None:
+        app.logger.warning('METRICS_ENABLED is set but prometheus_client is not installed; metrics disabled')
+        return False
+
+    from flask import g, request
+    from sqlalchemy import event
+
+    if HTTP_LATENCY is None:
+        _define_metrics()
+    _enabled = True
+
+    # Every engine: the primary, read replicas and chat shards
+    with app.app_context():
+        for engine in db.engines.values():
+            pool = engine.pool
+            if hasattr(pool, 'size'):
+                _pool_capacity += pool.size() + max(getattr(pool, '_max_overflow', 0), 0)
+            event.listen(engine, 'checkout', _pool_checkout)
+            event.listen(engine, 'checkin', _pool_checkin)
+
+    @app.before_request
+    def start_metrics_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.get('_metrics_started')
+        if started is not None and request.endpoint != 'metrics.metrics':
+            HTTP_LATENCY.labels(
+                endpoint=request.endpoint or 'unmatched',
+                method=request.method,
+                status=response.status_code
+            ).observe(time.perf_counter() - started)
+        return response
+
+    from app.views.metrics import metrics_bp
+    app.register_blueprint(metrics_bp)
+    return True
+
+
+def render_latest():
+    """
+    Render all metrics in the Prometheus text format
+
+    Returns:
+        tuple: (body, content_type)
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Clean up a dead worker's live gauges (Gunicorn child_exit hook)"""
+    if prometheus_client is not None and os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
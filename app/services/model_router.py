@@ -0,0 +1,383 @@
+"""
+Model Router
+Picks a model tier per turn from prompt complexity (length, code,
+conversation depth) against latency and cost targets, and falls back to a
+cheaper tier while a tier's circuit breaker is open.
+
+Enabled with MODEL_ROUTING_ENABLED=true. Tiers are ordered cheapest first
+and configured with MODEL_TIERS (JSON list); each decision and its outcome
+is logged to the 'app.services.model_router' logger for tuning.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from app.services.llm_providers import estimate_tokens
+from app.services.metrics import record_route
+
+logger = logging.getLogger(__name__)
+
+# Prices are USD per 1K tokens
+DEFAULT_TIERS = [
+    {'name': 'small', 'provider': 'openai', 'model': 'gpt-4o-mini', 'max_tokens': 800,
+     'cost_in': 0.00015, 'cost_out': 0.0006},
+    {'name': 'large', 'provider': 'openai', 'model': 'gpt-4o', 'max_tokens': 2000,
+     'cost_in': 0.0025, 'cost_out': 0.01},
+]
+
+CODE_PATTERN = re.compile(r'```|^\s*(def|class|import|from|function|const|let|SELECT|#include)\b|[{};]\s*$',
+                          re.MULTILINE)
+REASONING_PATTERN = re.compile(r'\b(why|explain|prove|step by step|analy[sz]e|compare|design|debug|optimi[sz]e)\b',
+                               re.IGNORECASE)
+
+
+def classify_prompt(messages):
+    """
+    Score how demanding a turn is from its length, code, reasoning keywords
+    and conversation depth
+
+    Args:
+        messages: Conversation, ending with the new user message
+
+    Returns:
+        tuple: (score, features dict)
+    """
+    prompt = messages[-1]['content'] if messages else ''
+    features = {
+        'prompt_tokens': sum(estimate_tokens(m['content']) for m in messages),
+        'message_tokens': estimate_tokens(prompt),
+        'has_code': bool(CODE_PATTERN.search(prompt)),
+        'reasoning': bool(REASONING_PATTERN.search(prompt)),
+        'depth': sum(1 for m in messages if m['role'] == 'user')
+    }
+    score = 0
+    if features['message_tokens'] > 200:
+        score += 1
+    if features['message_tokens'] > 800:
+        score += 1
+    if features['has_code']:
+        score += 2
+    if features['reasoning']:
+        score += 1
+    if features['depth'] >= 6:
+        score += 1
+    return score, features
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker
+
+    Opens after failure_threshold failures in a row, then lets a single
+    probe through every reset_timeout seconds until one succeeds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check whether a call may go through (claims the probe when half-open)
+
+        Returns:
+            bool: True if closed or this caller gets the probe
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class ModelTier:
+    """One routable model with its price and observed behaviour"""
+
+    def __init__(self, name, provider, model, max_tokens=2000, cost_in=0.0, cost_out=0.0, breaker=None):
+        self.name = name
+        self.provider = provider
+        self.model = model
+        self.max_tokens = max_tokens
+        self.cost_in = cost_in
+        self.cost_out = cost_out
+        self.breaker = breaker or CircuitBreaker()
+        # Exponentially weighted averages of successful calls
+        self.latency_ms = None
+        self.completion_tokens = max_tokens / 4
+
+    def estimate_cost(self, prompt_tokens, completion_tokens=None):
+        """
+        Estimate the USD cost of a call
+
+        Args:
+            prompt_tokens: Prompt tokens
+            completion_tokens: Completion tokens (default: observed average)
+
+        Returns:
+            float: Estimated cost
+        """
+        if completion_tokens is None:
+            completion_tokens = self.completion_tokens
+        return (prompt_tokens * self.cost_in + completion_tokens * self.cost_out) / 1000
+
+    def observe(self, latency_ms, completion_tokens, alpha=0.2):
+        """Fold a successful call into the latency and length averages"""
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += alpha * (latency_ms - self.latency_ms)
+        self.completion_tokens += alpha * (completion_tokens - self.completion_tokens)
+
+
+class RouteDecision:
+    """The tier chosen for one turn and why"""
+
+    def __init__(self, tier, score, features, reasons, fallbacks):
+        self.tier = tier
+        self.score = score
+        self.features = features
+        self.reasons = reasons
+        # Cheaper tiers to try, in order, if the chosen one fails
+        self.fallbacks = fallbacks
+
+
+class ModelRouter:
+    """Routes chat turns to model tiers"""
+
+    def __init__(self, tiers, latency_slo_ms=10000, cost_slo=0.05, complex_score=2):
+        """
+        Initialize the router
+
+        Args:
+            tiers: ModelTier list, cheapest first
+            latency_slo_ms: Skip a tier whose average latency exceeds this
+            cost_slo: Skip a tier whose estimated cost per turn (USD) exceeds this
+            complex_score: Complexity points per step up the tier list
+        """
+        if not tiers:
+            raise ValueError('ModelRouter needs at least one tier')
+        self.tiers = tiers
+        self.latency_slo_ms = latency_slo_ms
+        self.cost_slo = cost_slo
+        self.complex_score = complex_score
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a router from MODEL_TIERS and the ROUTER_* settings
+
+        Returns:
+            ModelRouter: Configured router
+        """
+        specs = json.loads(os.getenv('MODEL_TIERS') or 'null') or DEFAULT_TIERS
+        threshold = int(os.getenv('ROUTER_BREAKER_FAILURES', '5'))
+        reset = float(os.getenv('ROUTER_BREAKER_RESET_SECONDS', '30'))
+        tiers = [ModelTier(breaker=CircuitBreaker(threshold, reset), **spec) for spec in specs]
+        return cls(
+            tiers,
+            latency_slo_ms=float(os.getenv('ROUTER_LATENCY_SLO_MS', '10000')),
+            cost_slo=float(os.getenv('ROUTER_COST_SLO', '0.05')),
+            complex_score=int(os.getenv('ROUTER_COMPLEX_SCORE', '2'))
+        )
+
+    def classify(self, messages):
+        """
+        Score how demanding a turn is
+
+        Returns:
+            tuple: (score, features dict)
+        """
+        return classify_prompt(messages)
+
+    def route(self, messages, max_tokens=None):
+        """
+        Choose a tier for a turn
+
+        Complexity picks the target tier, moved up to the first tier that
+        allows a user's max_tokens. The router then steps down to cheaper
+        tiers while the target's breaker is open, or while it misses the
+        latency or cost target and the cheaper tier still allows max_tokens.
+
+        Args:
+            messages: Conversation, ending with the new user message
+            max_tokens: Completion cap the user asked for, if any
+
+        Returns:
+            RouteDecision: Chosen tier, score, features and reasons
+        """
+        score, features = self.classify(messages)
+        index = min(score // self.complex_score, len(self.tiers) - 1)
+        reasons = [f'score={score}']
+
+        def allows(tier):
+            return not max_tokens or tier.max_tokens >= max_tokens
+
+        if not allows(self.tiers[index]):
+            larger = [i for i in range(index + 1, len(self.tiers)) if allows(self.tiers[i])]
+            if larger:
+                index = larger[0]
+                reasons.append(f'max_tokens={max_tokens}')
+
+        while index > 0:
+            tier = self.tiers[index]
+            if tier.breaker.is_open():
+                reasons.append(f'{tier.name}:breaker_open')
+            elif not allows(self.tiers[index - 1]):
+                break
+            elif tier.latency_ms is not None and tier.latency_ms > self.latency_slo_ms:
+                reasons.append(f'{tier.name}:latency_slo')
+            elif tier.estimate_cost(features['prompt_tokens']) > self.cost_slo:
+                reasons.append(f'{tier.name}:cost_slo')
+            else:
+                break
+            index -= 1
+
+        fallbacks = [tier for tier in reversed(self.tiers[:index]) if not tier.breaker.is_open()]
+        return RouteDecision(self.tiers[index], score, features, reasons, fallbacks)
+
+    def title_tier(self):
+        """
+        Get the cheapest available tier, used for chat titles
+
+        Returns:
+            ModelTier: Tier
+        """
+        for tier in self.tiers:
+            if not tier.breaker.is_open():
+                return tier
+        return self.tiers[0]
+
+    def get_chat_response(self, providers, messages, max_tokens=None, suggested_max_tokens=None, **settings):
+        """
+        Route a turn and get the response, falling back to cheaper tiers on failure
+
+        Args:
+            providers: ProviderRegistry used to resolve tier providers
+            messages: Conversation, ending with the new user message
+            max_tokens: Completion cap the user asked for. Routing prefers
+                        tiers that allow it; if the tier used does not, the
+                        cap is lowered and the result flags 'max_tokens_clamped'
+            suggested_max_tokens: Adaptive cap used when the user set none;
+                                  quietly limited to the tier's
+            **settings: Other generation settings (temperature, stop) and system_prompt
+
+        Returns:
+            dict: Provider result plus 'tier'
+        """
+        def call(tier):
+            return providers.get(tier.provider).get_chat_response(
+                messages, model=tier.model, max_tokens=self._max_tokens(tier, max_tokens, suggested_max_tokens),
+                **settings)
+        return self._run(messages, call, retry=lambda result: True, max_tokens=max_tokens)
+
+    def stream_chat_response(self, providers, messages, on_token, max_tokens=None, suggested_max_tokens=None,
+                             **settings):
+        """
+        Route a turn and stream the response
+
+        Falls back to a cheaper tier only if the failed attempt emitted
+        no tokens, so the client never sees two answers spliced together.
+        Settings are as for get_chat_response, plus cancel.
+
+        Returns:
+            dict: Provider result plus 'tier'
+        """
+        emitted = []
+
+        def forward(delta):
+            emitted.append(True)
+            on_token(delta)
+
+        def call(tier):
+            return providers.get(tier.provider).stream_chat_response(
+                messages, on_token=forward, model=tier.model,
+                max_tokens=self._max_tokens(tier, max_tokens, suggested_max_tokens), **settings)
+        return self._run(messages, call, retry=lambda result: not emitted, max_tokens=max_tokens)
+
+    @staticmethod
+    def _max_tokens(tier, requested, suggested=None):
+        return min(requested or suggested or tier.max_tokens, tier.max_tokens)
+
+    def _run(self, messages, call, retry, max_tokens=None):
+        decision = self.route(messages, max_tokens=max_tokens)
+        attempts = [decision.tier] + decision.fallbacks
+        result = used = None
+
+        for tier in attempts:
+            if used is not None and not retry(result):
+                break
+            # The last resort is always tried; others wait out an open breaker
+            if tier is not attempts[-1] and not tier.breaker.allow():
+                continue
+            result = call(tier)
+            used = tier
+            self._record(decision, tier, result)
+            if result['success']:
+                break
+
+        result['tier'] = used.name
+        if max_tokens and used.max_tokens < max_tokens:
+            result['max_tokens_clamped'] = True
+        return result
+
+    def _record(self, decision, tier, result):
+        """Update the tier's breaker and averages, then log the decision and outcome"""
+        usage = result.get('usage') or {}
+        if result['success']:
+            tier.breaker.record_success()
+            tier.observe(result.get('latency_ms', 0), usage.get('completion_tokens', 0))
+        else:
+            tier.breaker.record_failure()
+
+        reason = 'fallback' if tier is not decision.tier else (
+            'downgraded' if len(decision.reasons) > 1 else 'complexity')
+        record_route(tier.name, reason)
+        logger.info(
+            'route tier=%s model=%s reason=%s %s features=%s latency_ms=%s tokens=%s cost=%.5f outcome=%s',
+            tier.name, tier.model, reason, ' '.join(decision.reasons), json.dumps(decision.features),
+            result.get('latency_ms'), usage.get('total_tokens'),
+            tier.estimate_cost(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)),
+            'success' if result['success'] else f"error: {result.get('error')}"
+        )
+
+
+def init_model_router():
+    """
+    Build the router if MODEL_ROUTING_ENABLED
+
+    Returns:
+        ModelRouter: Router, or None when routing is off
+    """
+    if os.getenv('MODEL_ROUTING_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    # Decisions are INFO records; give them a handler even when the app
+    # logger is left at the default WARNING level
+    from flask.logging import default_handler
+    logger.setLevel(os.getenv('ROUTER_LOG_LEVEL', 'INFO').upper())
+    if not logger.handlers:
+        logger.addHandler(default_handler)
+        logger.propagate = False
+    return ModelRouter.from_env()
@@ -0,0 +1,270 @@
+"""
+OneLogin OIDC Service for Bart Chatbot
+Pooled HTTP session, cached discovery metadata and JWKS, and local ID token validation
+"""
+
+import os
+import threading
+import time
+import requests
+import jwt
+
+# OneLogin signs ID tokens with RS256; never accept 'none' or HMAC here
+ID_TOKEN_ALGORITHMS = ['RS256']
+
+
+class OneLoginError(Exception):
+    """Raised when an OneLogin request or token validation fails"""
+
+
+class OneLoginService:
+    def __init__(self, issuer=None, client_id=None, client_secret=None, redirect_uri=None,
+                 metadata_ttl=3600, jwks_ttl=3600, timeout=10, session=None):
+        """
+        Initialize OneLogin Service
+
+        Args:
+            issuer: OIDC issuer URL (default: ONELOGIN_ISSUER or ONELOGIN_URL + 'oidc/2')
+            client_id: OIDC client ID (default: ONELOGIN_CLIENT_ID)
+            client_secret: OIDC client secret (default: ONELOGIN_CLIENT_SECRET)
+            redirect_uri: Callback URL (default: ONELOGIN_REDIRECT_URI)
+            metadata_ttl: Seconds to cache the discovery document
+            jwks_ttl: Seconds to cache the signing keys
+            timeout: HTTP timeout in seconds
+            session: requests.Session to reuse (a pooled one is created if omitted)
+        """
+        base_url = os.getenv('ONELOGIN_URL', 'https://bart.onelogin.com/')
+        self.issuer = (issuer or os.getenv('ONELOGIN_ISSUER') or base_url.rstrip('/') + '/oidc/2').rstrip('/')
+        self.client_id = client_id or os.getenv('ONELOGIN_CLIENT_ID')
+        self.client_secret = client_secret or os.getenv('ONELOGIN_CLIENT_SECRET')
+        self.redirect_uri = redirect_uri or os.getenv('ONELOGIN_REDIRECT_URI', 'http://localhost:5001/auth/callback')
+        self.metadata_ttl = metadata_ttl
+        self.jwks_ttl = jwks_ttl
+        self.timeout = timeout
+
+        # Keep-alive connections are reused across logins
+        self.session = session or requests.Session()
+
+        self._lock = threading.Lock()
+        self._metadata = None
+        self._metadata_expires = 0
+        self._jwks = None
+        self._jwks_expires = 0
+
+    def get_metadata(self, force=False):
+        """
+        Get the OIDC discovery document (cached)
+
+        Returns:
+            dict: Provider metadata
+        """
+        with self._lock:
+            if not force and self._metadata and time.monotonic() < self._metadata_expires:
+                return self._metadata
+
+        metadata = self._get_json(f"{self.issuer}/.well-known/openid-configuration")
+        with self._lock:
+            self._metadata = metadata
+            self._metadata_expires = time.monotonic() + self.metadata_ttl
+        return metadata
+
+    def get_jwks(self, force=False):
+        """
+        Get the provider signing keys (cached)
+
+        Returns:
+            jwt.PyJWKSet: Signing keys
+        """
+        with self._lock:
+            if not force and self._jwks and time.monotonic() < self._jwks_expires:
+                return self._jwks
+
+        jwks = jwt.PyJWKSet.from_dict(self._get_json(self.get_metadata()['jwks_uri']))
+        with self._lock:
+            self._jwks = jwks
+            self._jwks_expires = time.monotonic() + self.jwks_ttl
+        return jwks
+
+    def authorization_url(self, state, nonce=None, scope='openid profile email'):
+        """
+        Build the authorization redirect URL
+
+        Args:
+            state: Anti-CSRF state value
+            nonce: Value echoed back in the ID token (optional)
+            scope: Requested scopes
+
+        Returns:
+            str: Authorization URL
+        """
+        params = {
+            'client_id': self.client_id,
+            'redirect_uri': self.redirect_uri,
+            'response_type': 'code',
+            'scope': scope,
+            'state': state
+        }
+        if nonce:
+            params['nonce'] = nonce
+        request = requests.Request('GET', self.get_metadata()['authorization_endpoint'], params=params)
+        return request.prepare().url
+
+    def exchange_code(self, code):
+        """
+        Exchange an authorization code for tokens
+
+        Args:
+            code: Authorization code from the callback
+
+        Returns:
+            dict: Token response ('access_token', 'id_token', ...)
+        """
+        data = {
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": self.redirect_uri,
+            "scope": "openid profile email groups"
+        }
+
+        try:
+            response = self.session.post(
+                self.get_metadata()['token_endpoint'],
+                data=data,
+                auth=(self.client_id or '', self.client_secret or ''),
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise OneLoginError(f"Request failed: {str(e)}")
+
+        if response.status_code != 200:
+            try:
+                error_detail = response.json().get('error_description', 'Unknown error occurred')
+            except ValueError:
+                error_detail = response.text
+            raise OneLoginError(f"Error obtaining access token: {error_detail}")
+
+        return response.json()
+
+    def validate_id_token(self, id_token, nonce=None):
+        """
+        Validate an ID token locally against the cached JWKS
+
+        Checks signature, issuer, audience, expiry and (if given) nonce.
+        An unknown key ID triggers one JWKS refresh to pick up rotated keys.
+
+        Returns:
+            dict: Verified claims
+        """
+        try:
+            kid = jwt.get_unverified_header(id_token).get('kid')
+            key = self._signing_key(kid)
+            claims = jwt.decode(
+                id_token,
+                key=key.key,
+                algorithms=ID_TOKEN_ALGORITHMS,
+                audience=self.client_id,
+                issuer=self.get_metadata().get('issuer', self.issuer),
+                leeway=30,
+                options={'require': ['exp', 'iat', 'sub']}
+            )
+        except jwt.PyJWTError as e:
+            raise OneLoginError(f"Invalid ID token: {str(e)}")
+
+        if nonce is not None and claims.get('nonce') != nonce:
+            raise OneLoginError("Invalid ID token: nonce mismatch")
+
+        return claims
+
+    def get_userinfo(self, access_token):
+        """
+        Fetch the user profile from the userinfo endpoint
+
+        Returns:
+            dict: Userinfo claims
+        """
+        try:
+            response = self.session.get(
+                self.get_metadata()['userinfo_endpoint'],
+                headers={"Authorization": f"Bearer {access_token}"},
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise OneLoginError(f"Request failed: {str(e)}")
+
+        if response.status_code != 200:
+            raise OneLoginError(f"Failed to fetch user details: {response.text}")
+
+        return response.json()
+
+    def login(self, code, nonce=None):
+        """
+        Complete a login: exchange the code and resolve the user's identity
+
+        The userinfo round trip is skipped when the ID token already carries
+        email and name.
+
+        Args:
+            code: Authorization code from the callback
+            nonce: Nonce sent with the authorization request (optional)
+
+        Returns:
+            dict: User data with 'one_login_id', 'email', 'name'
+        """
+        tokens = self.exchange_code(code)
+
+        claims = {}
+        if tokens.get('id_token'):
+            claims = self.validate_id_token(tokens['id_token'], nonce=nonce)
+
+        if not claims.get('email') or not claims.get('name'):
+            access_token = tokens.get('access_token')
+            if not access_token:
+                raise OneLoginError("Failed to obtain access token")
+            userinfo = self.get_userinfo(access_token)
+            if claims and userinfo.get('sub') != claims.get('sub'):
+                raise OneLoginError("Userinfo subject does not match ID token")
+            claims = dict(claims, **userinfo)
+
+        return {
+            "one_login_id": claims['sub'],
+            "email": claims['email'],
+            "name": claims.get('name') or claims['email'],
+            "faceDescriptor": []
+        }
+
+    def _signing_key(self, kid):
+        jwks = self.get_jwks()
+        for refresh in (False, True):
+            if refresh:
+                jwks = self.get_jwks(force=True)
+            for key in jwks.keys:
+                if kid is None or key.key_id == kid:
+                    return key
+        raise OneLoginError(f"Invalid ID token: unknown signing key {kid}")
+
+    def _get_json(self, url):
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise OneLoginError(f"Failed to fetch {url}: {str(e)}")
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+def get_onelogin_service():
+    """
+    Get the process-wide OneLogin service (shares its connection pool and caches)
+
+    Returns:
+        OneLoginService: Shared instance
+    """
+    global _default_service
+    if _default_service is None:
+        with _default_service_lock:
+            if _default_service is None:
+                _default_service = OneLoginService()
+    return _default_service
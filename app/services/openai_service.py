@@ -4,177 +4,107 @@ Handles all OpenAI API interactions and conversation management
 """
 
 from openai import OpenAI
-from datetime import datetime
+from app.services.llm_providers import LLMProvider
+from app.services.prompt_assembly import cached_prompt_tokens
 import os
 
-class OpenAIService:
-    def __init__(self, api_key=None):
+class OpenAIService(LLMProvider):
+    """Provider for the OpenAI API or any OpenAI-compatible server"""
+    
+    name = 'openai'
+    fallback_models = ('gpt-4o', 'gpt-4', 'gpt-3.5-turbo')
+    
+    def __init__(self, api_key=None, base_url=None, default_model=None, name=None):
         """
         Initialize OpenAI Service
         
         Args:
             api_key: OpenAI API key (optional, will use env var if not provided)
+            base_url: API base URL (optional, OPENAI_BASE_URL or the OpenAI API);
+                      lets the app talk to an OpenAI-compatible server
+            default_model: Model used when a call names none
+                           (default: OPENAI_MODEL or gpt-4o)
+            name: Provider name used in spans (default: 'openai')
         """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
         
-        self.client = OpenAI(api_key=self.api_key)
-        self.system_prompt = "You are Bart, a helpful and intelligent AI assistant. You are knowledgeable, creative, and always strive to provide accurate and helpful responses."
+        self.base_url = base_url or os.getenv('OPENAI_BASE_URL') or None
+        self.default_model = default_model or os.getenv('OPENAI_MODEL', 'gpt-4o')
+        if name:
+            self.name = name
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
     
-    def get_chat_response(self, messages, model="gpt-4o", max_tokens=2000, temperature=0.7):
-        """
-        Get response from OpenAI with conversation history
-        
-        Args:
-            messages: List of message dictionaries with 'role' and 'content'
-            model: OpenAI model to use (default: gpt-4o)
-            max_tokens: Maximum tokens for response (default: 2000)
-            temperature: Response creativity 0.0 to 1.0 (default: 0.7)
-        
-        Returns:
-            dict: Response with 'success', 'response', 'usage', and 'error' fields
-        """
-        try:
-            # Prepare messages for OpenAI
-            openai_messages = [{"role": "system", "content": self.system_prompt}]
-            openai_messages.extend(messages)
-            
-            # Get response from OpenAI
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=openai_messages,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            
-            ai_response = response.choices[0].message.content
-            
-            return {
-                'success': True,
-                'response': ai_response,
-                'usage': {
-                    'prompt_tokens': response.usage.prompt_tokens,
-                    'completion_tokens': response.usage.completion_tokens,
-                    'total_tokens': response.usage.total_tokens
-                }
-            }
-            
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'response': None,
-                'usage': {}
-            }
+    def _complete(self, messages, model, max_tokens, temperature, stop=None):
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **self._stop_argument(stop)
+        )
+        usage = {
+            'prompt_tokens': response.usage.prompt_tokens,
+            'completion_tokens': response.usage.completion_tokens,
+            'total_tokens': response.usage.total_tokens
+        } if response.usage else None
+        cached = cached_prompt_tokens(response.usage)
+        if cached is not None:
+            usage['cached_prompt_tokens'] = cached
+        return response.choices[0].message.content, usage
     
-    def get_conversation_history(self, chat_history_records):
-        """
-        Convert database chat history to OpenAI message format
-        
-        Args:
-            chat_history_records: List of ChatHistory objects from database
-        
-        Returns:
-            list: List of message dictionaries for OpenAI
-        """
+    def _stream(self, messages, model, max_tokens, temperature, stop=None):
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            **self._stop_argument(stop)
+        )
         try:
-            messages = []
-            for msg in chat_history_records:
-                # Add user message
-                messages.append({
-                    "role": "user",
-                    "content": msg.question
-                })
-                # Add assistant response
-                messages.append({
-                    "role": "assistant", 
-                    "content": msg.answer
-                })
-            
-            return messages
-            
-        except Exception as e:
-            print(f"Error converting conversation history: {e}")
-            return []
+            for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing the HTTP response is what cancels generation upstream
+            response = getattr(stream, 'response', None)
+            if response is not None:
+                response.close()
     
-    def generate_chat_title(self, first_message, model="gpt-4o"):
-        """
-        Generate a title for a new chat based on the first message
-        
-        Args:
-            first_message: The first message in the conversation
-            model: OpenAI model to use for title generation
-        
-        Returns:
-            str: Generated title or default title
-        """
-        try:
-            title_prompt = f"Generate a short, descriptive title (max 50 characters) for a chat that starts with this message: '{first_message[:200]}...'"
-            
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that generates concise, descriptive titles for chat conversations. Return only the title, nothing else."},
-                    {"role": "user", "content": title_prompt}
-                ],
-                max_tokens=100,
-                temperature=0.3
-            )
-            
-            title = response.choices[0].message.content.strip()
-            # Clean up the title
-            title = title.replace('"', '').replace("'", "").strip()
-            
-            # If title is too long, truncate it
-            if len(title) > 50:
-                title = title[:47] + "..."
-            
-            return title if title else "New Chat"
-            
-        except Exception as e:
-            print(f"Error generating chat title: {e}")
-            return "New Chat"
+    @staticmethod
+    def _stop_argument(stop):
+        return {'stop': stop} if stop else {}
     
-    def update_system_prompt(self, new_prompt):
+    def list_models(self, timeout=None):
         """
-        Update the system prompt for the AI assistant
+        Fetch the model IDs from the models endpoint (no tokens spent)
         
         Args:
-            new_prompt: New system prompt
-        """
-        self.system_prompt = new_prompt
-    
-    def get_models(self):
-        """
-        Get available OpenAI models
-        
+            timeout: Seconds to wait, without retries (default: the client's)
+            
         Returns:
             list: List of available model names
         """
-        try:
-            models = self.client.models.list()
-            return [model.id for model in models.data]
-        except Exception as e:
-            print(f"Error getting models: {e}")
-            return ["gpt-4o", "gpt-4", "gpt-3.5-turbo"]
+        client = self.client if timeout is None else self.client.with_options(timeout=timeout, max_retries=0)
+        return [model.id for model in client.models.list().data]
     
     def test_connection(self):
         """
-        Test OpenAI API connection
+        Test OpenAI API connection by listing models (no tokens spent)
         
         Returns:
             dict: Test result with 'success' and 'message' fields
         """
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": "Hello"}],
-                max_tokens=5
-            )
+            models = self.refresh_models(timeout=10)
+            message = 'OpenAI API connection successful'
+            if self.default_model not in models:
+                message += f' (model {self.default_model} is not listed)'
             return {
                 'success': True,
-                'message': 'OpenAI API connection successful'
+                'message': message
             }
         except Exception as e:
             return {
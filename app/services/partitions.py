@@ -0,0 +1,224 @@
+"""
+Chat History Partitions
+Monthly range partitions of chat_histories by created_at on PostgreSQL.
+
+    chat_histories_2026_10   one partition per month, created ahead of time
+    chat_histories_legacy    rows from before the conversion, as one partition
+    chat_histories_default   catches rows outside every range (e.g. archived
+                             chats restored into a detached month)
+
+Queries bounded on created_at (ChatHistory.for_chat) only scan the months
+they need, and old months are removed with a quick DETACH instead of a
+large DELETE. Other databases keep a plain table; every function here is
+a no-op there.
+"""
+
+import re
+from datetime import date, datetime
+from sqlalchemy import text
+
+PARENT = 'chat_histories'
+LEGACY = 'chat_histories_legacy'
+DEFAULT = 'chat_histories_default'
+
+_MONTHLY = re.compile(r'^chat_histories_(\d{4})_(\d{2})$')
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(value):
+    """First day of the month of a date or datetime"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    """First day of the month `months` after `month`"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """Name of the partition holding `month`"""
+    return f'{PARENT}_{month:%Y_%m}'
+
+
+def is_partitioned(connection):
+    """
+    Check whether chat_histories is a partitioned table
+
+    Returns:
+        bool: True on PostgreSQL once convert() has run
+    """
+    if connection.dialect.name != 'postgresql':
+        return False
+    return bool(connection.execute(text("""
+        SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+                       WHERE c.relname = :name AND pg_table_is_visible(c.oid))
+    """), {'name': PARENT}).scalar())
+
+
+def list_partitions(connection):
+    """
+    List the partitions of chat_histories
+
+    Returns:
+        list: Dicts with name, bound, month (monthly partitions only),
+              upper (exclusive end, None for DEFAULT), estimated rows and bytes
+    """
+    if not is_partitioned(connection):
+        return []
+    rows = connection.execute(text("""
+        SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound,
+               c.reltuples::bigint AS rows, pg_total_relation_size(c.oid) AS bytes
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :name AND pg_table_is_visible(p.oid)
+        ORDER BY c.relname
+    """), {'name': PARENT}).mappings().all()
+
+    partitions = []
+    for row in rows:
+        match = _MONTHLY.match(row['name'])
+        upper = _UPPER_BOUND.search(row['bound'] or '')
+        partitions.append({
+            'name': row['name'],
+            'bound': row['bound'],
+            'month': date(int(match.group(1)), int(match.group(2)), 1) if match else None,
+            'upper': month_start(datetime.fromisoformat(upper.group(1))) if upper else None,
+            'rows': max(row['rows'], 0),
+            'bytes': row['bytes']
+        })
+    return partitions
+
+
+def ensure_partitions(connection, months_ahead=3, today=None):
+    """
+    Create the monthly partitions from this month to `months_ahead` months ahead
+
+    Months already covered (by a monthly or the legacy partition) are skipped.
+
+    Returns:
+        list: Names of the partitions created
+    """
+    if not is_partitioned(connection):
+        return []
+    partitions = list_partitions(connection)
+    covered = {p['month'] for p in partitions if p['month']}
+    # Nothing can be created below the end of the legacy range
+    first = month_start(today or datetime.utcnow())
+    for p in partitions:
+        if p['name'] == LEGACY and p['upper']:
+            first = max(first, p['upper'])
+
+    created = []
+    month = first
+    last = add_months(month_start(today or datetime.utcnow()), months_ahead)
+    while month <= last:
+        if month not in covered:
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT} "
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"))
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def convert(connection, months_ahead=3, today=None):
+    """
+    Turn a plain chat_histories into a partitioned one
+
+    The existing table becomes the chat_histories_legacy partition (all
+    rows before next month), so no rows are copied; its PRIMARY KEY (id)
+    is rebuilt as (id, created_at), the one index built over them, which
+    ATTACH then adopts as its part of the parent's key. The primary key
+    becomes (id, created_at) as PostgreSQL requires; IDs still come from
+    the same sequence. Run it in a maintenance window.
+
+    Returns:
+        list: Names of the partitions created
+
+    Raises:
+        RuntimeError: If the database is not PostgreSQL or is already partitioned
+    """
+    if connection.dialect.name != 'postgresql':
+        raise RuntimeError('Partitioning needs PostgreSQL')
+    if is_partitioned(connection):
+        raise RuntimeError(f'{PARENT} is already partitioned')
+
+    indexes = connection.execute(text("""
+        SELECT i.indexname, i.indexdef, x.indisunique
+        FROM pg_indexes i JOIN pg_class c ON c.relname = i.indexname AND pg_table_is_visible(c.oid)
+        JOIN pg_index x ON x.indexrelid = c.oid
+        WHERE i.tablename = :name AND i.schemaname = current_schema()
+    """), {'name': PARENT}).fetchall()
+    foreign_keys = connection.execute(text("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'
+    """), {'name': PARENT}).fetchall()
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence(:name, 'id')"), {'name': PARENT}).scalar()
+    has_rows = connection.execute(text(f'SELECT EXISTS (SELECT 1 FROM {PARENT})')).scalar()
+
+    connection.execute(text(f'ALTER TABLE {PARENT} RENAME TO {LEGACY}'))
+    for name, _, _ in indexes:
+        # Index names are per schema; the parent reuses the original ones
+        legacy_name = (name.replace(PARENT, LEGACY, 1) if PARENT in name else f'{name}_legacy')[:63]
+        connection.execute(text(f'ALTER INDEX "{name}" RENAME TO "{legacy_name}"'))
+
+    connection.execute(text(f"""
+        CREATE TABLE {PARENT} (LIKE {LEGACY} INCLUDING DEFAULTS INCLUDING GENERATED
+                               INCLUDING CONSTRAINTS INCLUDING STORAGE)
+        PARTITION BY RANGE (created_at)
+    """))
+    connection.execute(text(f'ALTER TABLE {PARENT} ADD PRIMARY KEY (id, created_at)'))
+    for name, definition in foreign_keys:
+        connection.execute(text(f'ALTER TABLE {PARENT} ADD CONSTRAINT "{name}" {definition}'))
+    for name, definition, unique in indexes:
+        # Unique indexes would have to include created_at; only the primary key is
+        if not unique:
+            connection.execute(text(definition))
+    if sequence:
+        connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {PARENT}.id'))
+
+    if has_rows:
+        # A partition's primary key must match the parent's, or ATTACH fails
+        legacy_pkey = connection.execute(text("""
+            SELECT conname FROM pg_constraint WHERE conrelid = CAST(:name AS regclass) AND contype = 'p'
+        """), {'name': LEGACY}).scalar()
+        if legacy_pkey:
+            connection.execute(text(f'ALTER TABLE {LEGACY} DROP CONSTRAINT "{legacy_pkey}"'))
+        connection.execute(text(f'ALTER TABLE {LEGACY} ADD CONSTRAINT {LEGACY}_pkey PRIMARY KEY (id, created_at)'))
+
+        next_month = add_months(month_start(today or datetime.utcnow()), 1)
+        connection.execute(text(
+            f"ALTER TABLE {PARENT} ATTACH PARTITION {LEGACY} FOR VALUES FROM (MINVALUE) TO ('{next_month}')"))
+    else:
+        connection.execute(text(f'DROP TABLE {LEGACY}'))
+    connection.execute(text(f'CREATE TABLE IF NOT EXISTS {DEFAULT} PARTITION OF {PARENT} DEFAULT'))
+    return ensure_partitions(connection, months_ahead, today)
+
+
+def detach_partitions(connection, before, drop=False, schema='archive'):
+    """
+    Detach every partition whose range ends on or before `before`
+
+    Detached partitions move to `schema` as ordinary tables (still
+    queryable, ready for pg_dump), or are dropped with drop=True.
+
+    Args:
+        before: First month to keep (date)
+        drop: Drop detached partitions instead of keeping them
+
+    Returns:
+        list: Names of the partitions detached
+    """
+    old = [p['name'] for p in list_partitions(connection)
+           if p['upper'] is not None and p['upper'] <= month_start(before)]
+    if old and not drop:
+        connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS {schema}'))
+    for name in old:
+        connection.execute(text(f'ALTER TABLE {PARENT} DETACH PARTITION {name}'))
+        if drop:
+            connection.execute(text(f'DROP TABLE {name}'))
+        else:
+            connection.execute(text(f'ALTER TABLE {name} SET SCHEMA {schema}'))
+    return old
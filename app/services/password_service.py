@@ -0,0 +1,122 @@
+"""
+Password Hashing Service
+Configurable hash method, rehash detection, and a bounded worker pool so
+login bursts cannot take every CPU away from chat traffic
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash operations are already queued"""
+
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _verify(stored_hash, password):
+    return check_password_hash(stored_hash, password)
+
+
+class PasswordHasher:
+    def __init__(self, method=None, salt_length=None, workers=None, max_pending=None, pool=None):
+        """
+        Initialize the hasher
+
+        Args:
+            method: Werkzeug hash method, e.g. 'scrypt:32768:8:1' or
+                    'pbkdf2:sha256:600000' (default: PASSWORD_HASH_METHOD or 'scrypt')
+            salt_length: Salt length (default: PASSWORD_SALT_LENGTH or 16)
+            workers: Pool size (default: PASSWORD_HASH_WORKERS or half the CPUs)
+            max_pending: Queued + running operations before new ones are
+                         rejected (default: PASSWORD_HASH_MAX_PENDING or 64)
+            pool: 'thread' or 'process' (default: PASSWORD_HASH_POOL or 'thread').
+                  hashlib releases the GIL, so threads already run in parallel.
+        """
+        self.method = method or os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+        self.salt_length = salt_length or int(os.getenv('PASSWORD_SALT_LENGTH', '16'))
+        self.workers = workers or int(os.getenv('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+        self.max_pending = max_pending or int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64'))
+        self.pool_kind = pool or os.getenv('PASSWORD_HASH_POOL', 'thread')
+
+        # Full parameter string as Werkzeug writes it, e.g. 'scrypt:32768:8:1'
+        self.method_id = _hash('probe', self.method, 1).split('$', 1)[0]
+
+        self._pending = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _submit(self, fn, *args):
+        if not self._pending.acquire(blocking=False):
+            raise PasswordHasherBusy('Too many login attempts in progress, please try again')
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future.result()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    if self.pool_kind == 'process':
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                            thread_name_prefix='password-hash')
+        return self._executor
+
+    def hash(self, password):
+        """
+        Hash a password with the configured method
+
+        Returns:
+            str: Werkzeug-format hash
+        """
+        return self._submit(_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored_hash, password):
+        """
+        Check a password against a stored hash
+
+        Returns:
+            tuple: (matches, needs_rehash) - needs_rehash is True when the
+                   stored hash was made with different method parameters
+        """
+        if not stored_hash:
+            return False, False
+        matches = self._submit(_verify, stored_hash, password)
+        return matches, matches and self.needs_rehash(stored_hash)
+
+    def needs_rehash(self, stored_hash):
+        """Check whether a stored hash uses out-of-date parameters"""
+        return stored_hash.split('$', 1)[0] != self.method_id
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+_default_hasher = None
+_default_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """
+    Get the process-wide password hasher
+
+    Returns:
+        PasswordHasher: Shared instance
+    """
+    global _default_hasher
+    if _default_hasher is None:
+        with _default_hasher_lock:
+            if _default_hasher is None:
+                _default_hasher = PasswordHasher()
+    return _default_hasher
@@ -0,0 +1,95 @@
+"""
+Prompt Assembly
+Lays out the messages sent to a provider so that consecutive turns of a
+chat share a byte-identical prefix, which providers cache: OpenAI bills
+cached prompt tokens at a discount and starts answering sooner.
+
+    system prompt       fixed per provider, first
+    earlier turns       question/answer pairs, oldest first
+    new user message    the only part that changes between turns
+
+Every message goes through canonical_message, so the message sent as this
+turn's question serializes exactly as it does next turn, when it comes
+back from the database as history. Per-request details (times, names)
+must not be added to the system prompt or earlier turns; put them in the
+new message.
+"""
+
+import hashlib
+import json
+
+
+def canonical_content(content):
+    """Message text as sent: a string with \\n line endings"""
+    if content is None:
+        return ''
+    return str(content).replace('\r\n', '\n').replace('\r', '\n')
+
+
+def canonical_message(role, content):
+    """A message dict with a fixed key order and canonical content"""
+    return {'role': role, 'content': canonical_content(content)}
+
+
+def history_messages(records):
+    """
+    Convert stored exchanges (oldest first) to user/assistant messages
+
+    Args:
+        records: ChatHistory rows, or anything with question and answer
+
+    Returns:
+        list: Message dictionaries
+    """
+    messages = []
+    for record in records:
+        messages.append(canonical_message('user', record.question))
+        messages.append(canonical_message('assistant', record.answer))
+    return messages
+
+
+def assemble(system_prompt, messages):
+    """
+    Build the provider messages: the system prompt, then the conversation
+
+    Args:
+        system_prompt: System prompt text
+        messages: Conversation, ending with the new user message
+
+    Returns:
+        list: Message dictionaries in canonical form
+    """
+    assembled = [canonical_message('system', system_prompt)]
+    assembled.extend(canonical_message(m['role'], m['content']) for m in messages)
+    return assembled
+
+
+def serialize(messages):
+    """Canonical bytes of a message list, for comparing prefixes"""
+    return json.dumps(messages, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def prefix_digest(messages):
+    """
+    Short digest of everything before the last message
+
+    Turns of one chat whose digest matches the previous turn's full prompt
+    can be served from the provider's prefix cache.
+    """
+    return hashlib.sha256(serialize(messages[:-1])).hexdigest()[:16]
+
+
+def cached_prompt_tokens(usage):
+    """
+    Prompt tokens served from the provider's cache, from an OpenAI usage object
+
+    Older SDKs (openai 1.3) keep prompt_tokens_details as a plain dict;
+    newer ones parse it into an object.
+
+    Returns:
+        int: Cached tokens, or None if the server does not report them
+    """
+    details = getattr(usage, 'prompt_tokens_details', None)
+    if isinstance(details, dict):
+        return details.get('cached_tokens')
+    return getattr(details, 'cached_tokens', None)
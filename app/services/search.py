@@ -0,0 +1,357 @@
+"""
+Full-Text Search
+Ranked search over a user's messages and chat titles with highlighted
+snippets. Uses the tsvector/GIN index on Postgres and FTS5 on SQLite (see
+app/models/search.py); databases without either fall back to LIKE.
+
+Messages of archived chats are no longer in chat_histories; they match
+through a per-chat index written by index_archived_chat and come back as
+'archived_chats'. Opening such a chat restores its messages, which are
+then searchable one by one again.
+"""
+
+import html
+import re
+from sqlalchemy import inspect, text
+from app import db
+from app.models.archive import ChatArchive
+from app.models.chat import ChatHistory
+
+# Highlight markers used inside SQL; swapped for <mark> after escaping
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_WORDS = 16
+
+_backends = {}
+_archive_backends = {}
+
+PG_MESSAGES = text("""
+    SELECT hits.*, ts_headline('english', hits.question || ' … ' || hits.answer, hits.q,
+                               'StartSel=' || chr(2) || ', StopSel=' || chr(3) ||
+                               ', MaxFragments=2, MaxWords=16, MinWords=6') AS snippet
+    FROM (
+        SELECT h.id AS message_id, h.chat_id, c.title AS chat_title, h.created_at,
+               h.question, h.answer, q, ts_rank_cd(h.search_vector, q) AS score
+        FROM chat_histories h
+        JOIN chat c ON c.id = h.chat_id,
+             websearch_to_tsquery('english', :query) q
+        WHERE c.user_id = :user_id AND c.deleted_at IS NULL AND h.search_vector @@ q
+              AND (CAST(:chat_id AS BIGINT) IS NULL OR h.chat_id = :chat_id)
+        ORDER BY score DESC, h.created_at DESC
+        LIMIT :limit OFFSET :offset
+    ) hits
+    ORDER BY hits.score DESC, hits.created_at DESC
+""")
+
+PG_TITLES = text("""
+    SELECT c.id AS chat_id, c.title, c.updated_at,
+           ts_headline('english', c.title, q, 'StartSel=' || chr(2) || ', StopSel=' || chr(3) ||
+                       ', HighlightAll=true') AS snippet
+    FROM chat c, websearch_to_tsquery('english', :query) q
+    WHERE c.user_id = :user_id AND c.deleted_at IS NULL AND to_tsvector('english', c.title) @@ q
+    ORDER BY ts_rank_cd(to_tsvector('english', c.title), q) DESC, c.updated_at DESC
+    LIMIT :limit
+""")
+
+SQLITE_MESSAGES = text(f"""
+    SELECT chat_search.rowid AS message_id, chat_search.chat_id, c.title AS chat_title, h.created_at,
+           snippet(chat_search, -1, char(2), char(3), '…', {SNIPPET_WORDS}) AS snippet,
+           bm25(chat_search, 2.0, 1.0, 0.0) AS score
+    FROM chat_search
+    JOIN chat_histories h ON h.id = chat_search.rowid
+    JOIN chat c ON c.id = chat_search.chat_id
+    WHERE chat_search MATCH :query AND c.deleted_at IS NULL
+          AND (CAST(:chat_id AS BIGINT) IS NULL OR chat_search.chat_id = :chat_id)
+    ORDER BY score, h.created_at DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+# Prefix matches, newest first: ranking a prefix would make bm25 walk the
+# doclist of every term the prefix expands to, across all users
+SQLITE_PREFIX_MESSAGES = text(f"""
+    SELECT chat_search.rowid AS message_id, chat_search.chat_id, c.title AS chat_title, h.created_at,
+           snippet(chat_search, -1, char(2), char(3), '…', {SNIPPET_WORDS}) AS snippet
+    FROM chat_search
+    JOIN chat_histories h ON h.id = chat_search.rowid
+    JOIN chat c ON c.id = chat_search.chat_id
+    WHERE chat_search MATCH :query AND c.deleted_at IS NULL
+          AND (CAST(:chat_id AS BIGINT) IS NULL OR chat_search.chat_id = :chat_id)
+    ORDER BY chat_search.rowid DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+SQLITE_MESSAGES_EXIST = text("""
+    SELECT 1 FROM chat_search
+    WHERE chat_search MATCH :query
+          AND (CAST(:chat_id AS BIGINT) IS NULL OR chat_search.chat_id = :chat_id)
+    LIMIT 1
+""")
+
+SQLITE_TITLES = text("""
+    SELECT chat_title_search.rowid AS chat_id, c.title, c.updated_at,
+           highlight(chat_title_search, 0, char(2), char(3)) AS snippet
+    FROM chat_title_search
+    JOIN chat c ON c.id = chat_title_search.rowid
+    WHERE chat_title_search MATCH :query AND c.deleted_at IS NULL
+    ORDER BY bm25(chat_title_search, 1.0, 0.0), c.updated_at DESC
+    LIMIT :limit
+""")
+
+PG_ARCHIVES = text("""
+    SELECT c.id AS chat_id, c.title, a.archived_at, c.title AS snippet
+    FROM chat_archives a
+    JOIN chat c ON c.id = a.chat_id,
+         websearch_to_tsquery('english', :query) q
+    WHERE c.user_id = :user_id AND c.deleted_at IS NULL AND a.search_vector @@ q
+    ORDER BY ts_rank(a.search_vector, q) DESC, a.archived_at DESC
+    LIMIT :limit
+""")
+
+SQLITE_ARCHIVES = text(f"""
+    SELECT chat_archive_search.rowid AS chat_id, c.title, a.archived_at,
+           snippet(chat_archive_search, 0, char(2), char(3), '…', {SNIPPET_WORDS}) AS snippet
+    FROM chat_archive_search
+    JOIN chat_archives a ON a.chat_id = chat_archive_search.rowid
+    JOIN chat c ON c.id = chat_archive_search.rowid
+    WHERE chat_archive_search MATCH :query AND c.deleted_at IS NULL
+    ORDER BY bm25(chat_archive_search, 1.0, 0.0), a.archived_at DESC
+    LIMIT :limit
+""")
+
+PG_INDEX_ARCHIVE = text("""
+    UPDATE chat_archives SET search_vector = strip(to_tsvector('english', :body))
+    WHERE chat_id = :chat_id
+""")
+
+SQLITE_INDEX_ARCHIVE = text("""
+    INSERT OR REPLACE INTO chat_archive_search (rowid, body, owner) VALUES (:chat_id, :body, :owner)
+""")
+
+LIKE_MESSAGES = text("""
+    SELECT h.id AS message_id, h.chat_id, c.title AS chat_title, h.created_at,
+           h.question, h.answer, 0 AS score
+    FROM chat_histories h JOIN chat c ON c.id = h.chat_id
+    WHERE c.user_id = :user_id AND c.deleted_at IS NULL AND (lower(h.question) LIKE :pattern ESCAPE '\\' OR lower(h.answer) LIKE :pattern ESCAPE '\\')
+          AND (CAST(:chat_id AS BIGINT) IS NULL OR h.chat_id = :chat_id)
+    ORDER BY h.created_at DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+LIKE_TITLES = text("""
+    SELECT c.id AS chat_id, c.title, c.updated_at, c.title AS snippet
+    FROM chat c
+    WHERE c.user_id = :user_id AND c.deleted_at IS NULL AND lower(c.title) LIKE :pattern ESCAPE '\\'
+    ORDER BY c.updated_at DESC
+    LIMIT :limit
+""")
+
+
+def search_backend(engine=None):
+    """
+    Get the search implementation available on a database
+
+    Args:
+        engine: Engine holding chat_histories (default: the primary)
+
+    Returns:
+        str: 'postgresql', 'sqlite' or 'like'
+    """
+    engine = engine or db.engine
+    key = str(engine.url)
+    backend = _backends.get(key)
+    if backend is None:
+        dialect = engine.dialect.name
+        inspector = inspect(engine)
+        if dialect == 'postgresql' and any(
+                column['name'] == 'search_vector' for column in inspector.get_columns('chat_histories')):
+            backend = 'postgresql'
+        elif dialect == 'sqlite' and inspector.has_table('chat_search'):
+            backend = 'sqlite'
+        else:
+            backend = 'like'
+        _backends[key] = backend
+    return backend
+
+
+def archive_search_backend(engine):
+    """
+    Get the archived chat index available on a database
+
+    Returns:
+        str: 'postgresql', 'sqlite', or None (archived chats match by title only)
+    """
+    key = str(engine.url)
+    if key not in _archive_backends:
+        inspector = inspect(engine)
+        backend = None
+        if engine.dialect.name == 'postgresql' and any(
+                column['name'] == 'search_vector' for column in inspector.get_columns('chat_archives')):
+            backend = 'postgresql'
+        elif engine.dialect.name == 'sqlite' and inspector.has_table('chat_archive_search'):
+            backend = 'sqlite'
+        _archive_backends[key] = backend
+    return _archive_backends[key]
+
+
+def index_archived_chat(chat, records):
+    """
+    Index an archived chat's messages (in the caller's transaction)
+
+    Args:
+        chat: Chat whose chat_archives row is already flushed
+        records: Its messages, as ChatHistory rows or decoded archive records
+
+    Returns:
+        bool: True if the database has an archived chat index
+    """
+    engine = db.session.get_bind(mapper=ChatArchive, clause=ChatArchive.__table__.update())
+    statement = {'postgresql': PG_INDEX_ARCHIVE, 'sqlite': SQLITE_INDEX_ARCHIVE}.get(archive_search_backend(engine))
+    if statement is None:
+        return False
+    body = '\n'.join(f"{_get(record, 'question') or ''}\n{_get(record, 'answer') or ''}" for record in records)
+    db.session.execute(statement, {'chat_id': chat.id, 'body': body, 'owner': f'u{int(chat.user_id)}'},
+                       bind_arguments={'bind': engine})
+    return True
+
+
+def fts5_query(query, user_id, prefix=False):
+    """
+    Turn free text into an FTS5 query scoped to one owner: every word must match
+
+    Args:
+        query: Free-text query
+        user_id: Owner whose rows may match
+        prefix: Also match the last word as a prefix (search as you type)
+
+    Returns:
+        str: FTS5 MATCH expression, or '' if the query has no words
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    if prefix:
+        terms[-1] += '*'
+    # The owner term narrows the match to one user's rows inside the index;
+    # the words never match the owner column itself
+    return f'owner:u{int(user_id)} AND - owner: ({" ".join(terms)})'
+
+
+def highlight(snippet):
+    """
+    Escape a snippet for HTML and turn the match markers into <mark> tags
+
+    Returns:
+        str: Safe HTML fragment
+    """
+    escaped = html.escape(snippet or '')
+    return escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def _like_snippet(row, needle):
+    for field in (row.question, row.answer):
+        position = field.lower().find(needle)
+        if position >= 0:
+            start = max(position - 60, 0)
+            end = position + len(needle)
+            return ('…' if start else '') + field[start:position] + MARK_START + field[position:end] + \
+                MARK_END + field[end:end + 60] + ('…' if end + 60 < len(field) else '')
+    return ''
+
+
+def search(user_id, query, limit=20, offset=0, chat_id=None):
+    """
+    Search a user's messages and chat titles
+
+    Args:
+        user_id: Owner whose chats are searched
+        query: Free-text query
+        limit: Maximum messages returned
+        offset: Messages to skip (pagination)
+        chat_id: Restrict messages to one chat (optional)
+
+    Returns:
+        dict: 'messages' (best match first), 'chats' whose titles match and
+              'archived_chats' whose archived messages match; snippets are
+              HTML with matches wrapped in <mark>
+    """
+    # One routing decision (replica or shard) for all of the queries below
+    engine = db.session.get_bind(mapper=ChatHistory)
+    backend = search_backend(engine)
+
+    def run(statement, values):
+        return db.session.execute(statement, values, bind_arguments={'bind': engine})
+
+    params = {'user_id': user_id, 'limit': limit, 'offset': offset, 'chat_id': chat_id}
+    first_page = not offset and chat_id is None
+    archives = []
+
+    if backend == 'postgresql':
+        params['query'] = query
+        messages = run(PG_MESSAGES, params).fetchall()
+        titles = run(PG_TITLES, params).fetchall() if first_page else []
+        if first_page and archive_search_backend(engine) == 'postgresql':
+            archives = run(PG_ARCHIVES, params).fetchall()
+    elif backend == 'sqlite':
+        params['query'] = fts5_query(query, user_id)
+        if not params['query']:
+            return {'messages': [], 'chats': [], 'archived_chats': []}
+        messages = run(SQLITE_MESSAGES, params).fetchall()
+        # Whole words rank by bm25; only when they match nothing is the last
+        # word completed as a prefix (a partially typed word)
+        if not messages and not (offset and run(SQLITE_MESSAGES_EXIST, params).first()):
+            messages = run(
+                SQLITE_PREFIX_MESSAGES, dict(params, query=fts5_query(query, user_id, prefix=True))).fetchall()
+        params['query'] = fts5_query(query, user_id, prefix=True)
+        titles = run(SQLITE_TITLES, params).fetchall() if first_page else []
+        if first_page and archive_search_backend(engine) == 'sqlite':
+            archives = run(SQLITE_ARCHIVES, params).fetchall()
+    else:
+        needle = query.strip().lower()
+        # Match the query literally: %, _ and the escape character are escaped
+        params['pattern'] = '%' + re.sub(r'([\\%_])', r'\\\1', needle) + '%'
+        rows = run(LIKE_MESSAGES, params).fetchall()
+        messages = [dict(row._mapping, snippet=_like_snippet(row, needle)) for row in rows]
+        titles = run(LIKE_TITLES, params).fetchall() if first_page else []
+
+    return {
+        'messages': [
+            {
+                'message_id': _get(row, 'message_id'),
+                'chat_id': _get(row, 'chat_id'),
+                'chat_title': _get(row, 'chat_title'),
+                'timestamp': _timestamp(_get(row, 'created_at')),
+                'snippet': highlight(_get(row, 'snippet'))
+            }
+            for row in messages
+        ],
+        'chats': [
+            {
+                'chat_id': row.chat_id,
+                'title': row.title,
+                'snippet': highlight(row.snippet),
+                'updated_at': _timestamp(row.updated_at)
+            }
+            for row in titles
+        ],
+        'archived_chats': [
+            {
+                'chat_id': row.chat_id,
+                'title': row.title,
+                'snippet': highlight(row.snippet),
+                'archived_at': _timestamp(row.archived_at)
+            }
+            for row in archives
+        ]
+    }
+
+
+def _get(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _timestamp(value):
+    # SQLite returns text from raw queries; Postgres returns datetimes
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value.replace(' ', 'T', 1) if value else value
@@ -0,0 +1,358 @@
+"""
+Server-Side Session Store
+Keeps session data out of the cookie: the browser only holds an opaque
+random session ID, and the payload lives in memory, on local disk or in
+the database. Sessions are loaded lazily, so requests that never touch
+the session never read the store.
+
+Backends (SESSION_BACKEND):
+    cookie   - Flask's default signed cookie (no server-side storage)
+    memory   - per-process LRU, for development and single-process runs
+    file     - one file per session under SESSION_FILE_DIR
+    database - the 'sessions' table (ServerSession model)
+"""
+
+import os
+import random
+import re
+import secrets
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from flask_login import user_logged_in
+
+# Payloads above this size are zlib-compressed
+COMPRESS_THRESHOLD = 512
+
+# Fraction of saves that also purge expired sessions (file/database)
+PURGE_PROBABILITY = 0.01
+
+# Temp files from interrupted saves older than this are purged; younger
+# ones may still be being written by another worker
+TEMP_FILE_GRACE_SECONDS = 300
+
+# Session IDs are secrets.token_urlsafe(32); anything else is ignored
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{32,64}$')
+
+_serializer = TaggedJSONSerializer()
+
+
+def serialize_session(data):
+    """
+    Encode session data compactly
+
+    Returns:
+        bytes: b'j' + JSON, or b'z' + zlib(JSON) for larger payloads
+    """
+    raw = _serializer.dumps(dict(data)).encode('utf-8')
+    if len(raw) > COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(raw)
+    return b'j' + raw
+
+
+def deserialize_session(payload):
+    """
+    Decode data written by serialize_session
+
+    Returns:
+        dict: Session data
+    """
+    if payload[:1] == b'z':
+        return _serializer.loads(zlib.decompress(payload[1:]).decode('utf-8'))
+    return _serializer.loads(payload[1:].decode('utf-8'))
+
+
+class MemorySessionStore:
+    """Per-process LRU session store"""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return entry[1]
+
+    def save(self, sid, payload, ttl):
+        with self._lock:
+            self._entries[sid] = (time.time() + ttl, payload)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for sid in [sid for sid, entry in self._entries.items() if entry[0] <= now]:
+                del self._entries[sid]
+
+
+class FileSessionStore:
+    """One file per session; expiry is tracked through the file's mtime"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        path = self._path(sid)
+        try:
+            if os.path.getmtime(path) <= time.time():
+                self.delete(sid)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save(self, sid, payload, ttl):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            expires_at = time.time() + ttl
+            os.utime(tmp_path, (expires_at, expires_at))
+            os.replace(tmp_path, self._path(sid))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if random.random() < PURGE_PROBABILITY:
+            self.purge_expired()
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except OSError:
+            pass
+
+    def purge_expired(self):
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            # A temp file's mtime is its creation time until save() renames it
+            cutoff = now - TEMP_FILE_GRACE_SECONDS if name.startswith('.tmp-') else now
+            try:
+                if os.path.getmtime(path) <= cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class DatabaseSessionStore:
+    """
+    Sessions table store
+
+    Uses its own short transactions on the engine so saving a session never
+    commits work a view left pending on db.session.
+    """
+
+    def load(self, sid):
+        from app import db
+        from app.models.session import ServerSession
+        table = ServerSession.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                db.select(table.c.data).where(table.c.id == sid, table.c.expires_at > datetime.utcnow())
+            ).first()
+        return bytes(row[0]) if row else None
+
+    def save(self, sid, payload, ttl):
+        from app import db
+        from app.models.session import ServerSession
+        table = ServerSession.__table__
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                table.update().where(table.c.id == sid).values(data=payload, expires_at=expires_at)
+            ).rowcount
+            if not updated:
+                conn.execute(table.insert().values(id=sid, data=payload, expires_at=expires_at))
+        if random.random() < PURGE_PROBABILITY:
+            self.purge_expired()
+
+    def delete(self, sid):
+        from app import db
+        from app.models.session import ServerSession
+        table = ServerSession.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.id == sid))
+
+    def purge_expired(self):
+        from app import db
+        from app.models.session import ServerSession
+        table = ServerSession.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.expires_at <= datetime.utcnow()))
+
+
+class LazySession(SessionMixin):
+    """Session whose payload is only fetched from the store on first access"""
+
+    def __init__(self, store, sid=None, new=False):
+        self.store = store
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        self._data = {} if new else None
+
+    def _load(self):
+        self.accessed = True
+        if self._data is None:
+            payload = self.store.load(self.sid)
+            self._data = deserialize_session(payload) if payload else {}
+            # A stale or unknown ID behaves like a fresh session
+            self.new = payload is None
+        return self._data
+
+    def regenerate(self):
+        """Move the data to a fresh session ID (on login, against fixation)"""
+        self._load()
+        if self.sid and not self.new:
+            self.store.delete(self.sid)
+        self.sid = None
+        self.new = True
+        self.modified = True
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def get(self, key, default=None):
+        return self._load().get(key, default)
+
+    def setdefault(self, key, default=None):
+        data = self._load()
+        if key not in data:
+            data[key] = default
+            self.modified = True
+        return data[key]
+
+    def pop(self, key, *args):
+        data = self._load()
+        if key in data:
+            self.modified = True
+        return data.pop(key, *args)
+
+    def clear(self):
+        if self._load():
+            self.modified = True
+        self._data.clear()
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface backed by a session store"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or not SESSION_ID_PATTERN.match(sid):
+            return LazySession(self.store, new=True)
+        return LazySession(self.store, sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session.loaded or not session.modified:
+            # Untouched or read-only: nothing to write, cookie is unchanged
+            return
+
+        if not session:
+            if session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        if session.sid is None or session.new:
+            session.sid = secrets.token_urlsafe(32)
+
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        self.store.save(session.sid, serialize_session(session), lifetime)
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def init_session_store(app):
+    """
+    Install the server-side session backend selected by SESSION_BACKEND
+
+    Returns:
+        str: Name of the active backend
+    """
+    backend = os.getenv('SESSION_BACKEND', 'cookie').lower()
+    if backend == 'memory':
+        store = MemorySessionStore(maxsize=int(os.getenv('SESSION_MEMORY_MAXSIZE', '10000')))
+    elif backend == 'file':
+        store = FileSessionStore(os.getenv('SESSION_FILE_DIR', os.path.join(app.instance_path, 'sessions')))
+    elif backend == 'database':
+        store = DatabaseSessionStore()
+    else:
+        return 'cookie'
+    app.session_interface = ServerSideSessionInterface(store)
+
+    def rotate_session_id(sender, user, **extra):
+        from flask import session
+        if isinstance(session._get_current_object(), LazySession):
+            session.regenerate()
+
+    user_logged_in.connect(rotate_session_id, app, weak=False)
+    return backend
@@ -0,0 +1,368 @@
+"""
+Chat Data Sharding
+Places each user's chat data (chats, messages, archives and usage rollups)
+on one of the CHAT_SHARD_URLS databases, chosen by a jump consistent hash
+of user_id. Users, sessions and migrations stay on DATABASE_URL.
+
+Every per-user query therefore touches exactly one shard. Requests use the
+shard of current_user; code working outside a request, or for another
+user, selects one explicitly with chat_shard(user_id) or use_shard(index).
+While sharding is on, chats and messages get time-ordered 53-bit IDs so
+rows keep their IDs when reshard.py moves a user between shards.
+"""
+
+import atexit
+import os
+import secrets
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app, g, has_app_context, has_request_context
+from flask_login import current_user
+from sqlalchemy import MetaData, event, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.util import find_tables
+
+# Tables holding per-user chat data, in parent-before-child order
+SHARDED_TABLES = ('chat', 'chat_histories', 'chat_archives', 'usage_rollups')
+
+# Foreign keys from sharded tables to tables that only exist on the primary
+PRIMARY_ONLY_REFERENCES = ('user',)
+
+_NO_SHARD = object()
+
+
+def jump_hash(key, buckets):
+    """
+    Jump consistent hash (Lamping & Veach): growing from N to N+1 buckets
+    moves only ~1/(N+1) of the keys
+
+    Args:
+        key: Non-negative integer key
+        buckets: Number of buckets
+
+    Returns:
+        int: Bucket in [0, buckets)
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_key(index):
+    """Bind key of shard `index`"""
+    return f'shard_{index}'
+
+
+def shard_binds(urls):
+    """
+    Build SQLALCHEMY_BINDS entries for CHAT_SHARD_URLS
+
+    Returns:
+        dict: Bind key -> URL
+    """
+    return {shard_key(index): url for index, url in enumerate(urls)}
+
+
+class ShardMap:
+    """Maps users to shards"""
+
+    def __init__(self, count):
+        self.count = count
+
+    def shard_for_user(self, user_id):
+        """
+        Get the shard holding a user's chat data
+
+        Returns:
+            int: Shard index
+        """
+        return jump_hash(int(user_id), self.count)
+
+
+class IdGenerator:
+    """
+    Time-ordered 53-bit IDs (exact as JSON numbers in browsers): 41 bits of
+    milliseconds since 2024-01-01, 7 bits of node and a 5-bit sequence.
+
+    Each process leases its own node from the primary's node_leases table,
+    so no two live processes on any host share one; at most 128 processes
+    can issue IDs at a time. A lease lasts lease_seconds and is renewed by
+    the first ID issued after half of it; a process that idled past its
+    lease leases a node again. Leases record the last millisecond used, and
+    the next holder of a node starts after it.
+    """
+
+    EPOCH_MS = 1704067200000
+    NODE_BITS = 7
+    SEQUENCE_BITS = 5
+
+    def __init__(self, lease_seconds=600):
+        self.lease_seconds = lease_seconds
+        self.node = None
+        self.owner = None
+        self.pid = None
+        self.renew_at = 0.0
+        self.last_ms = -1
+        self.sequence = 0
+        self._engine = None
+        self._lock = threading.Lock()
+        atexit.register(self.release)
+
+    def next_id(self):
+        """
+        Get a new ID (needs an app context to lease a node)
+
+        Returns:
+            int: ID, unique across processes and increasing within this one
+        """
+        sequence_mask = (1 << self.SEQUENCE_BITS) - 1
+        with self._lock:
+            if self.pid != os.getpid() or time.monotonic() >= self.renew_at:
+                self._lease()
+            now = int(time.time() * 1000) - self.EPOCH_MS
+            if now > self.last_ms:
+                self.last_ms = now
+                self.sequence = 0
+            elif self.sequence < sequence_mask:
+                self.sequence += 1
+            else:
+                # Sequence exhausted within one millisecond; continue in the next
+                self.last_ms += 1
+                self.sequence = 0
+            return ((self.last_ms << (self.NODE_BITS + self.SEQUENCE_BITS))
+                    | (self.node << self.SEQUENCE_BITS) | self.sequence)
+
+    def release(self):
+        """Give up this process's lease, e.g. at exit"""
+        with self._lock:
+            if self.pid != os.getpid() or self.node is None:
+                return
+            from app.models.node_lease import NodeLease
+            table = NodeLease.__table__
+            try:
+                with self._engine.begin() as connection:
+                    connection.execute(
+                        update(table)
+                        .where(table.c.node == self.node, table.c.owner == self.owner)
+                        .values(owner=None, expires_at=datetime.utcnow(), issued_until=self.last_ms)
+                    )
+            except Exception:
+                pass  # the lease expires on its own
+            self.node = None
+
+    def _lease(self):
+        from app import db
+        from app.models.node_lease import NodeLease
+        table = NodeLease.__table__
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+
+        if self.pid != os.getpid():
+            # Forked workers must not keep their parent's node or sequence
+            self.pid = os.getpid()
+            self.node = None
+            self.last_ms = -1
+            self.owner = f'{socket.gethostname()}:{self.pid}:{secrets.token_hex(4)}'
+            self._engine = db.engine
+            self._add_nodes(table)
+
+        with self._engine.begin() as connection:
+            if self.node is not None:
+                renewed = connection.execute(
+                    update(table)
+                    .where(table.c.node == self.node, table.c.owner == self.owner)
+                    .values(expires_at=expires_at, issued_until=self.last_ms)
+                ).rowcount
+                if renewed:
+                    self.renew_at = time.monotonic() + self.lease_seconds / 2
+                    return
+                self.node = None
+
+            free = connection.execute(
+                select(table.c.node).where(table.c.expires_at <= now).order_by(table.c.expires_at)
+            ).scalars().all()
+            for node in free:
+                # Another process may claim the same node first
+                claimed = connection.execute(
+                    update(table)
+                    .where(table.c.node == node, table.c.expires_at <= now)
+                    .values(owner=self.owner, expires_at=expires_at)
+                ).rowcount
+                if claimed:
+                    issued_until = connection.execute(
+                        select(table.c.issued_until).where(table.c.node == node)
+                    ).scalar_one()
+                    self.node = node
+                    self.renew_at = time.monotonic() + self.lease_seconds / 2
+                    if issued_until >= self.last_ms:
+                        # Treat the previous holder's last millisecond as used up
+                        self.last_ms = issued_until
+                        self.sequence = (1 << self.SEQUENCE_BITS) - 1
+                    return
+        raise RuntimeError(f'All {1 << self.NODE_BITS} ID nodes are leased; '
+                           'too many processes are writing chat data')
+
+    def _add_nodes(self, table):
+        """Create the node rows on first use"""
+        with self._engine.begin() as connection:
+            count = connection.execute(select(func.count()).select_from(table)).scalar_one()
+        if count >= 1 << self.NODE_BITS:
+            return
+        try:
+            with self._engine.begin() as connection:
+                existing = set(connection.execute(select(table.c.node)).scalars())
+                connection.execute(insert(table), [
+                    {'node': node, 'owner': None, 'expires_at': datetime(1970, 1, 1), 'issued_until': 0}
+                    for node in range(1 << self.NODE_BITS) if node not in existing
+                ])
+        except IntegrityError:
+            pass  # another process added them
+
+
+id_generator = IdGenerator(float(os.getenv('SHARD_NODE_LEASE_SECONDS', '600')))
+
+
+def is_enabled():
+    return has_app_context() and 'shards' in current_app.extensions
+
+
+@contextmanager
+def use_shard(index):
+    """Route chat data in this block to shard `index` (None: no shard selected)"""
+    previous = g.get('_chat_shard', _NO_SHARD)
+    g._chat_shard = index
+    try:
+        yield
+    finally:
+        if previous is _NO_SHARD:
+            g.pop('_chat_shard', None)
+        else:
+            g._chat_shard = previous
+
+
+def user_shard(user_id):
+    """
+    Get the shard holding a user's chat data
+
+    Returns:
+        int: Shard index, or None when unsharded
+    """
+    shards = current_app.extensions.get('shards') if has_app_context() else None
+    return shards.shard_for_user(user_id) if shards else None
+
+
+@contextmanager
+def chat_shard(user_id):
+    """Route chat data in this block to the shard of `user_id` (no-op when unsharded)"""
+    index = user_shard(user_id)
+    if index is None:
+        yield None
+        return
+    with use_shard(index):
+        yield index
+
+
+def shard_indexes():
+    """
+    Get every shard index, for jobs that sweep all chat data
+
+    Returns:
+        list: Shard indexes, or [None] when unsharded
+    """
+    shards = current_app.extensions.get('shards') if has_app_context() else None
+    return list(range(shards.count)) if shards else [None]
+
+
+def current_shard():
+    """
+    Get the shard for chat data in the current context
+
+    Returns:
+        int: Shard index
+
+    Raises:
+        RuntimeError: If no shard was selected and there is no logged-in user
+    """
+    index = g.get('_chat_shard', _NO_SHARD)
+    if index is not _NO_SHARD and index is not None:
+        return index
+    if has_request_context() and current_user.is_authenticated:
+        return current_app.extensions['shards'].shard_for_user(current_user.id)
+    raise RuntimeError('No shard selected for chat data; wrap the code in chat_shard(user_id)')
+
+
+def shard_engine(engines, mapper=None, clause=None):
+    """
+    Get the shard engine for a statement that touches chat data
+
+    Returns:
+        Engine: Shard engine, or None when unsharded or the statement only
+                touches primary tables
+    """
+    if not is_enabled():
+        return None
+    if mapper is not None:
+        tables = [inspect(mapper).local_table]
+    elif clause is not None:
+        tables = find_tables(clause, include_crud=True)
+    else:
+        return None
+    if not any(getattr(table, 'name', None) in SHARDED_TABLES for table in tables):
+        return None
+    return engines[shard_key(current_shard())]
+
+
+def _assign_id(mapper, connection, target):
+    if target.id is None and is_enabled():
+        target.id = id_generator.next_id()
+
+
+def init_sharding(app, db):
+    """
+    Enable sharding if CHAT_SHARD_URLS configured shard binds, and create
+    the chat tables on every shard
+
+    Returns:
+        ShardMap: Shard map (also in app.extensions['shards']), or None
+    """
+    keys = [key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith('shard_')]
+    if not keys:
+        return None
+    shards = ShardMap(len(keys))
+    app.extensions['shards'] = shards
+
+    from app import models
+    for model in (models.Chat, models.ChatHistory):
+        if not event.contains(model, 'before_insert', _assign_id):
+            event.listen(model, 'before_insert', _assign_id)
+
+    with app.app_context():
+        for key in keys:
+            with db.engines[key].begin() as connection:
+                create_shard_tables(db, connection)
+    return shards
+
+
+def create_shard_tables(db, connection):
+    """Create the sharded tables on a shard, without their foreign keys to the primary"""
+    metadata = MetaData()
+    for name in SHARDED_TABLES:
+        original = db.metadata.tables[name]
+        table = original.to_metadata(metadata)
+        # Also install what the original's DDL events add (the search index)
+        for listener in original.dispatch.after_create:
+            event.listen(table, 'after_create', listener)
+        for constraint in list(table.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split('.')[0] in PRIMARY_ONLY_REFERENCES:
+                table.constraints.discard(constraint)
+                for key in constraint.elements:
+                    key.parent.foreign_keys.discard(key)
+                    table.foreign_keys.discard(key)
+    metadata.create_all(bind=connection)
@@ -0,0 +1,59 @@
+"""
+Single-flight request coalescing
+Concurrent callers with the same key wait for one execution and share its result
+"""
+
+import threading
+
+
+class _Call:
+    """One in-flight execution"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Per-process single-flight group"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run fn once for all concurrent callers with the same key
+
+        Args:
+            key: Hashable coalescing key
+            fn: Zero-argument callable to execute
+
+        Returns:
+            tuple: (result, shared) where shared is True if another caller ran fn
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result, False
@@ -0,0 +1,182 @@
+"""
+System Prompts
+Per-chat and per-user system prompt templates, resolved for each request:
+
+    chat.system_prompt  >  user.system_prompt  >  DEFAULT_SYSTEM_PROMPT
+
+Templates use string.Template placeholders, filled from the request:
+
+    $username $name $chat_title    the user and chat
+    $default_prompt                the built-in Bart prompt, to extend it
+
+Each owner's template carries a version that changes with it. Compiled
+templates are cached per (owner, version) in a per-process LRU
+(SYSTEM_PROMPT_CACHE_SIZE, default 10000), so a send only loads a user's
+template when its version is not cached; the version itself travels in
+the identity cache. Compiled templates are never modified and rendering
+builds a new string, so threads share nothing mutable.
+
+The rendered prompt heads every turn, so keep per-request details (dates,
+counters) out of it or the provider's prefix cache stops hitting.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from string import Template
+from app.services.llm_providers import DEFAULT_SYSTEM_PROMPT
+from app.services.metrics import record_cache
+
+TEMPLATE_FIELDS = ('username', 'name', 'chat_title', 'default_prompt')
+
+
+class PromptTemplate:
+    """A compiled system prompt template; never modified after creation"""
+
+    __slots__ = ('text', '_template')
+
+    def __init__(self, text):
+        self.text = text
+        self._template = Template(text)
+
+    def render(self, **values):
+        """
+        Fill in the placeholders; unknown ones are left as written
+
+        Returns:
+            str: System prompt
+        """
+        return self._template.safe_substitute(values)
+
+
+def compile_template(text, max_length=None):
+    """
+    Validate and compile a system prompt template
+
+    Args:
+        text: Template text
+        max_length: Longest allowed template (default: SYSTEM_PROMPT_MAX_LENGTH or 4000)
+
+    Returns:
+        PromptTemplate: Compiled template
+
+    Raises:
+        ValueError: If the template is empty, too long, malformed or uses
+                    an unknown placeholder
+    """
+    if max_length is None:
+        max_length = int(os.getenv('SYSTEM_PROMPT_MAX_LENGTH', '4000'))
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError('system_prompt must be a non-empty string')
+    if len(text) > max_length:
+        raise ValueError(f'system_prompt must be at most {max_length} characters')
+
+    template = Template(text)
+    if not template.is_valid():
+        raise ValueError('system_prompt has a malformed placeholder (write $$ for a literal $)')
+    unknown = sorted(set(template.get_identifiers()) - set(TEMPLATE_FIELDS))
+    if unknown:
+        allowed = ', '.join(f'${field}' for field in TEMPLATE_FIELDS)
+        raise ValueError(f"Unknown placeholder ${unknown[0]}; use {allowed}")
+    return PromptTemplate(text)
+
+
+def next_version(current):
+    """
+    Version for a changed template: increasing, and (being a millisecond
+    timestamp) not reused if a deleted owner's ID is
+    """
+    return max((current or 0) + 1, int(time.time() * 1000))
+
+
+class TemplateCache:
+    """Thread-safe LRU of compiled templates keyed by (kind, owner ID, version)"""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """
+        Get a compiled template, loading and compiling it on a miss
+
+        Args:
+            key: (kind, owner ID, version)
+            load: Callable returning the template text (None: no template)
+
+        Returns:
+            PromptTemplate: Compiled template, or None
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                record_cache('system_prompt', True)
+                return self._entries[key]
+        record_cache('system_prompt', False)
+
+        # Compiled outside the lock; racing threads build equal templates
+        text = load()
+        template = PromptTemplate(text) if text else None
+        with self._lock:
+            self._entries[key] = template
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+template_cache = TemplateCache(maxsize=int(os.getenv('SYSTEM_PROMPT_CACHE_SIZE', '10000')))
+
+
+def describe_system_prompt(owner):
+    """
+    API view of a chat's or user's template
+
+    Returns:
+        dict: 'system_prompt' (None: inherited), 'version' and 'placeholders'
+    """
+    return {
+        'system_prompt': owner.system_prompt,
+        'version': owner.system_prompt_version,
+        'placeholders': list(TEMPLATE_FIELDS)
+    }
+
+
+def resolve_system_prompt(user, chat=None):
+    """
+    Render the system prompt for a request
+
+    Args:
+        user: Current user (User or UserIdentity)
+        chat: Chat being answered (optional, e.g. before it exists)
+
+    Returns:
+        str: System prompt, or None for the provider default
+    """
+    template = None
+    if chat is not None and chat.system_prompt:
+        if chat.id is None:
+            # A chat being created has no cache key yet
+            template = PromptTemplate(chat.system_prompt)
+        else:
+            template = template_cache.get(('chat', chat.id, chat.system_prompt_version),
+                                          lambda: chat.system_prompt)
+    if template is None and user.system_prompt_version:
+        # The text is read from the user row only when this version is not cached
+        template = template_cache.get(('user', user.id, user.system_prompt_version),
+                                      lambda: user.system_prompt)
+    if template is None:
+        return None
+
+    return template.render(
+        username=user.username,
+        name=user.name or user.username,
+        chat_title=chat.title if chat is not None else '',
+        default_prompt=DEFAULT_SYSTEM_PROMPT
+    )
@@ -0,0 +1,226 @@
+"""
+Write-Behind Message Buffer
+Group commit for chat messages: requests hand their ChatHistory row to a
+background writer, which inserts everything that arrived within
+WRITE_BEHIND_INTERVAL_MS in one transaction together with the Chat
+updated_at/total_tokens bumps and usage rollups. Each request waits until
+the transaction holding its row has committed, so a response is never
+acknowledged for a message that is not durable. A request whose row
+is still queued after WRITE_BEHIND_TIMEOUT_SECONDS commits it itself.
+
+Enabled with WRITE_BEHIND_ENABLED=true.
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import insert, update
+from app import db
+from app.models.chat import Chat, ChatHistory
+from app.models.usage import UsageRollup
+from app.services.metrics import record_write_batch
+from app.services.sharding import id_generator, is_enabled, use_shard, user_shard
+
+USAGE_FIELDS = ('prompt_tokens', 'completion_tokens', 'total_tokens')
+
+
+class _PendingWrite:
+    """One message waiting for its group commit"""
+
+    def __init__(self, values, user_id):
+        self.values = values
+        self.user_id = user_id
+        self.id = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class WriteBehindBuffer:
+    """Per-process group-commit writer for ChatHistory rows"""
+
+    def __init__(self, app, interval_ms=5, max_batch=256, timeout=30):
+        """
+        Initialize the buffer
+
+        Args:
+            app: Flask app whose database the writer uses
+            interval_ms: How long the first message of a batch waits for company
+            max_batch: Most messages per transaction
+            timeout: Seconds a request waits for the writer before
+                     committing its row synchronously
+        """
+        self.app = app
+        self.interval = interval_ms / 1000
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def submit(self, values, user_id):
+        """
+        Queue a ChatHistory row and wait until it is committed
+
+        Args:
+            values: ChatHistory column values (chat_id, question, answer,
+                    created_at, usage columns, ...)
+            user_id: Owner, for the usage rollup
+
+        Returns:
+            int: The new ChatHistory ID
+
+        Raises:
+            Exception: Whatever made the row's transaction fail
+            TimeoutError: The row's transaction started but did not finish
+                          within the timeout
+        """
+        pending = _PendingWrite(values, user_id)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Write-behind buffer is closed')
+            self._ensure_writer()
+            self._queue.append(pending)
+            self._cond.notify()
+        if not pending.done.wait(self.timeout):
+            with self._cond:
+                queued = pending in self._queue
+                if queued:
+                    self._queue.remove(pending)
+            if not queued:
+                # Its transaction is running; committing here too could duplicate the row
+                raise TimeoutError('Write-behind commit did not finish in time')
+            # The writer is stuck; commit this row ourselves
+            self._flush([pending])
+        if pending.error is not None:
+            raise pending.error
+        return pending.id
+
+    def close(self):
+        """Flush queued messages and stop the writer"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=5)
+
+    def _ensure_writer(self):
+        # Threads do not survive fork; start one per worker process on first
+        # use, and a new one if it died
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # Give concurrent requests a moment to join the batch
+                deadline = time.monotonic() + self.interval
+                while len(self._queue) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            self._flush(batch)
+
+    def _flush(self, batch):
+        with self.app.app_context():
+            try:
+                # One transaction per shard; unsharded that is the whole batch
+                shards = defaultdict(list)
+                for pending in batch:
+                    shards[user_shard(pending.user_id)].append(pending)
+                for shard, group in shards.items():
+                    with use_shard(shard):
+                        self._commit(group)
+            except Exception as e:
+                # Keep the writer alive; fail whatever did not get through
+                for pending in batch:
+                    if pending.id is None and pending.error is None:
+                        pending.error = e
+            finally:
+                db.session.remove()
+                for pending in batch:
+                    pending.done.set()
+
+    def _commit(self, batch):
+        try:
+            self._write(batch)
+            db.session.commit()
+            record_write_batch(len(batch))
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                batch[0].error = e
+            else:
+                # Retry one by one so a bad row (e.g. its chat was just
+                # deleted) only fails its own request
+                for pending in batch:
+                    try:
+                        self._write([pending])
+                        db.session.commit()
+                    except Exception as row_error:
+                        db.session.rollback()
+                        pending.error = row_error
+
+    def _write(self, batch):
+        """Insert the rows and apply the chat and rollup bumps (no commit)"""
+        if is_enabled():
+            # Sharded rows get global IDs (see app/services/sharding.py)
+            for pending in batch:
+                pending.values.setdefault('id', id_generator.next_id())
+        ids = db.session.execute(
+            insert(ChatHistory).returning(ChatHistory.id, sort_by_parameter_order=True),
+            [pending.values for pending in batch]
+        ).scalars().all()
+        for pending, row_id in zip(batch, ids):
+            pending.id = row_id
+
+        chats = defaultdict(lambda: {'updated_at': None, 'total_tokens': 0})
+        rollups = defaultdict(lambda: dict.fromkeys(USAGE_FIELDS + ('messages',), 0))
+        for pending in batch:
+            values = pending.values
+            chat = chats[values['chat_id']]
+            chat['updated_at'] = max(filter(None, (chat['updated_at'], values['created_at'])))
+            chat['total_tokens'] += values.get('total_tokens') or 0
+            rollup = rollups[(pending.user_id, values['created_at'].date())]
+            for field in USAGE_FIELDS:
+                rollup[field] += values.get(field) or 0
+            rollup['messages'] += 1
+
+        # Key order, so concurrent writers lock rows in the same order
+        for chat_id, bump in sorted(chats.items()):
+            db.session.execute(update(Chat).where(Chat.id == chat_id).values(
+                updated_at=bump['updated_at'], total_tokens=Chat.total_tokens + bump['total_tokens']))
+        for (user_id, day), usage in sorted(rollups.items()):
+            UsageRollup.record(user_id, usage, day=day, messages=usage['messages'])
+
+
+def init_write_behind(app):
+    """
+    Create the buffer if WRITE_BEHIND_ENABLED
+
+    Returns:
+        WriteBehindBuffer: Buffer (also in app.extensions['write_behind']), or None
+    """
+    if os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    buffer = WriteBehindBuffer(
+        app,
+        interval_ms=float(os.getenv('WRITE_BEHIND_INTERVAL_MS', '5')),
+        max_batch=int(os.getenv('WRITE_BEHIND_MAX_BATCH', '256')),
+        timeout=float(os.getenv('WRITE_BEHIND_TIMEOUT_SECONDS', '30'))
+    )
+    app.extensions['write_behind'] = buffer
+    atexit.register(buffer.close)
+    return buffer
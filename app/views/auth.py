@@ -3,11 +3,10 @@ Authentication Views
 """
 import os
 import pdb
-import requests
-import base64
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, logout_user, current_user
 from app.controllers.auth_controller import AuthController
+from app.services.onelogin_service import OneLoginError, get_onelogin_service
 from flask import request, session, flash
 
 
@@ -68,19 +67,21 @@ def login():
 @auth_bp.route('/onelogin')
 def onelogin():
     """OneLogin authentication"""
-    # Get OneLogin configuration from environment variables
-    client_id = os.getenv('ONELOGIN_CLIENT_ID')
-    redirect_uri = os.getenv('ONELOGIN_REDIRECT_URI', 'http://localhost:5001/auth/callback')
-    
     # Generate a random state parameter for security
     state = "ucj1dkt98h" #secrets.token_urlsafe(32)
+    nonce = secrets.token_urlsafe(16)
     
-    # Store state in session for verification
+    # Store state and nonce in session for verification
     from flask import session
     session['onelogin_state'] = state
+    session['onelogin_nonce'] = nonce
     
-    # Build the OneLogin authorization URL
-    auth_url = f"https://bart.onelogin.com/oidc/2/auth?client_id={client_id}&redirect_uri={redirect_uri}&response_type=code&scope=openid+profile+email&state={state}"
+    # Build the OneLogin authorization URL (endpoint comes from cached discovery metadata)
+    try:
+        auth_url = get_onelogin_service().authorization_url(state, nonce=nonce)
+    except OneLoginError as e:
+        flash(f'OneLogin authentication error: {str(e)}')
+        return redirect(url_for('auth.login'))
     
     return redirect(auth_url)
 
@@ -105,10 +106,11 @@ def onelogin_callback():
     
     # Clear the state from session
     session.pop('onelogin_state', None)
+    nonce = session.pop('onelogin_nonce', None)
     
     try:
         # Exchange code for token and get user info
-        user_data = bart_login(code)
+        user_data = bart_login(code, nonce=nonce)
         
         if user_data:
             # Create user session
@@ -142,79 +144,18 @@ def onelogin_callback():
         flash(f'OneLogin authentication error: {str(e)}')
         return redirect(url_for('auth.login'))
 
-def bart_login(code: str):
-    """Get access token using the authorization code and fetch user info"""
-    # Get access token using the authorization code
-    access_token = exchange_code_for_token(code)
-    if not access_token:
-        raise Exception("Failed to obtain access token")
-    
-    user_info_url = f"https://bart.onelogin.com/oidc/2/me"
-    
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.get(user_info_url, headers=headers)
-    
-    if response.status_code != 200:
-        print(f"Response Code: {response.status_code}")
-        print(f"Response Text: {response.text}")
-        raise Exception(f"Failed to fetch user details: {response.text}")
-
-    result = response.json()
-    
-    # Return user data in the expected format
-    user_data = {
-        "one_login_id": result['sub'],
-        "email": result['email'],
-        "name": result['name'],
-        "faceDescriptor": []
-    }
-    
-    return user_data
+def bart_login(code: str, nonce=None):
+    """
+    Get tokens using the authorization code and resolve the user's identity
+    
+    The ID token is validated locally against cached JWKS; the userinfo
+    endpoint is only called when the token lacks email or name.
+    """
+    return get_onelogin_service().login(code, nonce=nonce)
 
 def exchange_code_for_token(code):
-    
     """Exchange authorization code for access token"""
-    import os
-    
-    # URL to request the access token
-    url = "https://bart.onelogin.com/oidc/2/token"
-    client_id = os.getenv('ONELOGIN_CLIENT_ID')
-    client_secret = os.getenv('ONELOGIN_CLIENT_SECRET')
-    redirect_uri = os.getenv('ONELOGIN_REDIRECT_URI', 'http://localhost:5001/auth/callback')
-    
-    # Encode the client credentials
-    auth_string = f"{client_id}:{client_secret}"
-    auth_value = base64.b64encode(auth_string.encode()).decode('utf-8')
-    
-    # Request payload and headers
-    data = {
-        "grant_type": "authorization_code",
-        "code": code,
-        "redirect_uri": redirect_uri,
-        "scope": "openid profile email groups"
-    }
-    
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Authorization": f"Basic {auth_value}"
-    }
-    
-    try:
-        # Make the POST request
-        
-        response = requests.post(url, data=data, headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            return response.json().get('access_token')
-        else:
-            error_detail = response.json().get('error_description', 'Unknown error occurred')
-            raise Exception(f"Error obtaining access token: {error_detail}")
-    except requests.RequestException as e:
-        raise Exception(f"Request failed: {str(e)}")
+    return get_onelogin_service().exchange_code(code).get('access_token')
 
 @auth_bp.route('/logout')
 @login_required
@@ -5,6 +5,10 @@ Chat Views
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from app.controllers.chat_controller import ChatController
+from app.controllers.usage_controller import UsageController
+from app.controllers.user_controller import UserController
+from app.services.generation import parse_generation_settings
+from app.views.ws import notify_chats_changed
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/chat')
 
@@ -39,11 +43,18 @@ def new_chat():
         data = request.get_json()
         title = data.get('title', 'New Chat')
         first_message = data.get('first_message', '')
+        provider = data.get('provider')
+        system_prompt = data.get('system_prompt')
     else:
         title = request.form.get('title', 'New Chat')
         first_message = request.form.get('first_message', '')
+        provider = request.form.get('provider')
+        system_prompt = request.form.get('system_prompt')
     
-    success, message, chat = chat_controller.create_chat(title, first_message)
+    success, message, chat = chat_controller.create_chat(title, first_message, provider=provider,
+                                                         system_prompt=system_prompt)
+    if success:
+        notify_chats_changed(current_user.id)
     
     # Always return JSON for AJAX requests
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json:
@@ -83,9 +94,17 @@ def send_message():
         data = request.get_json()
         chat_id = data.get('chat_id')
         message = data.get('message')
+        provider = data.get('provider')
+        settings_data = data
     else:
         chat_id = request.form.get('chat_id')
         message = request.form.get('message')
+        provider = request.form.get('provider')
+        settings_data = {
+            'max_tokens': request.form.get('max_tokens') or None,
+            'temperature': request.form.get('temperature') or None,
+            'stop': request.form.getlist('stop') or None
+        }
     
     # Validate required data
     if not chat_id or not message:
@@ -97,14 +116,29 @@ def send_message():
     except (ValueError, TypeError):
         return jsonify({'success': False, 'error': 'Invalid chat_id format'}), 400
     
-    success, message_text, response_data = chat_controller.send_message(chat_id, message)
+    if provider and provider not in chat_controller.providers.names():
+        return jsonify({'success': False, 'error': f'Unknown provider: {provider}'}), 400
+    
+    try:
+        settings = parse_generation_settings(settings_data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    idempotency_key = request.headers.get('Idempotency-Key') or (data.get('idempotency_key') if request.is_json else None)
+    success, message_text, response_data = chat_controller.send_message(
+        chat_id, message, idempotency_key=idempotency_key, provider=provider, settings=settings)
     
     if success:
+        notify_chats_changed(current_user.id)
         return jsonify({
             'success': True,
             'response': response_data['response'],
             'timestamp': response_data['timestamp'],
-            'usage': response_data.get('usage', {})
+            'usage': response_data.get('usage', {}),
+            'model': response_data.get('model'),
+            'coalesced': response_data.get('coalesced', False),
+            'max_tokens': response_data.get('max_tokens'),
+            'max_tokens_clamped': response_data.get('max_tokens_clamped', False)
         })
     else:
         return jsonify({'success': False, 'error': message_text}), 500
@@ -114,6 +148,8 @@ def send_message():
 def delete_chat(chat_id):
     """Delete chat"""
     success, message = chat_controller.delete_chat(chat_id)
+    if success:
+        notify_chats_changed(current_user.id)
     
     if request.method == 'DELETE':
         if success:
@@ -147,6 +183,20 @@ def api_chats():
     
     return jsonify({'chats': chat_list})
 
+@chat_bp.route('/api/chats', methods=['DELETE'])
+@login_required
+def api_delete_chats():
+    """API endpoint to delete all of the user's chats (?older_than_days=N: only those idle that long)"""
+    older_than_days = request.args.get('older_than_days', type=int)
+    if older_than_days is not None and older_than_days < 0:
+        return jsonify({'success': False, 'message': 'older_than_days must not be negative'}), 400
+    success, message, count = chat_controller.delete_chats(older_than_days=older_than_days)
+    if not success:
+        return jsonify({'success': False, 'message': message}), 500
+    if count:
+        notify_chats_changed(current_user.id)
+    return jsonify({'success': True, 'message': message, 'deleted': count})
+
 @chat_bp.route('/api/chat/<int:chat_id>')
 @login_required
 def api_chat(chat_id):
@@ -168,3 +218,94 @@ def api_chat_summary(chat_id):
         return jsonify({'error': 'Chat not found or access denied'}), 404
     
     return jsonify(summary)
+
+@chat_bp.route('/api/chat/<int:chat_id>/settings', methods=['GET', 'PUT'])
+@login_required
+def api_chat_settings(chat_id):
+    """API endpoint to get or replace a chat's default generation settings"""
+    if request.method == 'PUT':
+        success, message, settings = chat_controller.update_generation_settings(chat_id, request.get_json(silent=True))
+    else:
+        success, message, settings = chat_controller.get_generation_settings(chat_id)
+    
+    if not success:
+        return jsonify({'success': False, 'error': message}), 403 if message == 'Access denied' else 400
+    
+    return jsonify({'success': True, 'settings': settings})
+
+@chat_bp.route('/api/chat/<int:chat_id>/system_prompt', methods=['GET', 'PUT'])
+@login_required
+def api_chat_system_prompt(chat_id):
+    """API endpoint to get or replace a chat's system prompt template"""
+    if request.method == 'PUT':
+        data = request.get_json(silent=True) or {}
+        success, message, prompt = chat_controller.update_system_prompt(chat_id, data.get('system_prompt'))
+    else:
+        success, message, prompt = chat_controller.get_system_prompt(chat_id)
+    
+    if not success:
+        return jsonify({'success': False, 'error': message}), 403 if message == 'Access denied' else 400
+    
+    return jsonify(dict(prompt, success=True))
+
+@chat_bp.route('/api/system_prompt', methods=['GET', 'PUT'])
+@login_required
+def api_system_prompt():
+    """API endpoint to get or replace the user's default system prompt template"""
+    if request.method == 'PUT':
+        data = request.get_json(silent=True) or {}
+        success, message, prompt = UserController.update_system_prompt(data.get('system_prompt'))
+        if not success:
+            return jsonify({'success': False, 'error': message}), 400
+    else:
+        prompt = UserController.get_system_prompt()
+    
+    return jsonify(dict(prompt, success=True))
+
+@chat_bp.route('/api/models')
+@login_required
+def api_models():
+    """API endpoint for a provider's cached model list (?provider=name)"""
+    provider = request.args.get('provider') or chat_controller.providers.default
+    success, message, models = chat_controller.get_models(provider)
+    if not success:
+        return jsonify({'success': False, 'error': message}), 400
+    return jsonify({'success': True, 'provider': provider, 'models': models})
+
+@chat_bp.route('/api/search')
+@login_required
+def api_search():
+    """API endpoint to search the user's messages and chat titles (?q=...&limit=20&offset=0&chat_id=)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'Missing query'}), 400
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    success, message, results = chat_controller.search(
+        query[:500], limit=limit, offset=offset, chat_id=request.args.get('chat_id', type=int))
+    
+    if not success:
+        return jsonify({'success': False, 'error': message}), 500
+    
+    return jsonify(dict(results, success=True, query=query))
+
+@chat_bp.route('/api/usage')
+@login_required
+def api_usage():
+    """API endpoint for the user's daily token usage (?days=30)"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    usage = UsageController.get_usage(days=days)
+    if chat_controller.daily_token_budget:
+        usage['budget'] = {
+            'daily_tokens': chat_controller.daily_token_budget,
+            'exceeded': chat_controller.over_budget(current_user.id)
+        }
+    return jsonify(usage)
+
+@chat_bp.route('/api/usage/chats')
+@login_required
+def api_usage_chats():
+    """API endpoint for the user's most expensive chats (?limit=10)"""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    return jsonify({'chats': UsageController.get_top_chats(limit=limit)})
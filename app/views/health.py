@@ -0,0 +1,19 @@
+"""
+Health Views
+Load balancer probes; both answer from memory (app/services/health.py)
+"""
+
+from flask import Blueprint, current_app, jsonify
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/healthz')
+def healthz():
+    """Liveness: the process is serving requests"""
+    return jsonify({'status': 'ok'})
+
+@health_bp.route('/readyz')
+def readyz():
+    """Readiness: the last background checks passed (503 otherwise)"""
+    ready, body = current_app.extensions['health'].readiness()
+    return jsonify(body), 200 if ready else 503
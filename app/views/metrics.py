@@ -0,0 +1,22 @@
+"""
+Metrics Views
+"""
+
+import hmac
+import os
+from flask import Blueprint, Response, abort, request
+from app.services.metrics import render_latest
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (optionally protected by METRICS_TOKEN)"""
+    token = os.getenv('METRICS_TOKEN')
+    if token:
+        scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+        if scheme != 'Bearer' or not hmac.compare_digest(supplied, token):
+            abort(401)
+
+    body, content_type = render_latest()
+    return Response(body, content_type=content_type)
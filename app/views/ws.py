@@ -0,0 +1,270 @@
+"""
+WebSocket Views
+Optional multiplexed chat channel: one connection per browser carries
+message sends, streamed tokens, title updates and sidebar invalidations
+for all of the user's chats.
+
+Enabled with ENABLE_WEBSOCKET=true (requires flask-sock).
+
+Client -> server frames (JSON):
+    {"id": "r1", "type": "send", "chat_id": 12, "message": "...", "idempotency_key": "optional", "provider": "optional",
+     "max_tokens": 500, "temperature": 0.2, "stop": ["optional"]}
+    {"id": "r2", "type": "create", "title": "New Chat", "first_message": "...", "provider": "optional",
+     "system_prompt": "optional template"}
+    {"id": "r3", "type": "ping"}
+    {"id": "r4", "type": "stop", "request": "r1"}    # stop generating r1; its partial answer is saved
+
+Server -> client frames (JSON), tagged with the request id where relevant:
+    {"type": "ready", "max_inflight": 4}
+    {"id": "r1", "type": "token", "chat_id": 12, "delta": "..."}
+    {"id": "r1", "type": "done", "chat_id": 12, "response": "...", "timestamp": "...", "usage": {}, "stopped": false,
+     "max_tokens": 500, "max_tokens_clamped": false}
+    {"id": "r1", "type": "error", "chat_id": 12, "error": "..."}
+    {"id": "r1", "type": "error", "code": "busy", "error": "..."}    # max_inflight reached; retry later
+    {"type": "title", "chat_id": 13, "title": "..."}
+    {"type": "chats_invalidated"}
+    {"id": "r3", "type": "pong"}
+"""
+
+import json
+import os
+import queue
+import threading
+from collections import defaultdict
+from flask import Blueprint, copy_current_request_context
+from flask_login import login_required, current_user
+from app.services.generation import parse_generation_settings
+
+try:
+    from flask_sock import Sock
+except ImportError:  # optional dependency
+    Sock = None
+
+ws_bp = Blueprint('ws', __name__, url_prefix='/chat')
+sock = Sock() if Sock else None
+
+# Open connections per user id, used for sidebar invalidation (per process)
+_connections = defaultdict(set)
+_connections_lock = threading.Lock()
+
+
+def notify_chats_changed(user_id):
+    """Tell every open socket of a user that their chat list changed"""
+    with _connections_lock:
+        targets = list(_connections.get(user_id, ()))
+    for connection in targets:
+        connection.emit({'type': 'chats_invalidated'})
+
+
+class ChatSocket:
+    """
+    One multiplexed WebSocket connection.
+
+    A single writer thread owns the socket; producers push events onto a
+    bounded queue. When the client reads slowly the queue fills and token
+    producers block, which in turn slows reading from the upstream stream.
+    The reader never blocks, so stop and ping frames are always handled;
+    sends beyond max_inflight are rejected with a "busy" error.
+    """
+
+    def __init__(self, ws, user_id, chat_controller, max_inflight=4, queue_size=256, send_timeout=30):
+        self.ws = ws
+        self.user_id = user_id
+        self.chat_controller = chat_controller
+        self.max_inflight = max_inflight
+        self.send_timeout = send_timeout
+        self.outbound = queue.Queue(maxsize=queue_size)
+        self.slots = threading.BoundedSemaphore(max_inflight)
+        self.closed = threading.Event()
+        # Cancel events of running sends, by request id
+        self.cancels = {}
+
+    def emit(self, event):
+        """Queue an event for the client, blocking while the queue is full"""
+        if self.closed.is_set():
+            return
+        try:
+            self.outbound.put(event, timeout=self.send_timeout)
+        except queue.Full:
+            # Client stopped reading; give up on it
+            self.close()
+
+    def close(self):
+        self.closed.set()
+        try:
+            self.outbound.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def serve(self):
+        """Run the connection until the client disconnects"""
+        with _connections_lock:
+            _connections[self.user_id].add(self)
+        writer = threading.Thread(target=self._write_loop, daemon=True)
+        writer.start()
+        try:
+            self.emit({'type': 'ready', 'max_inflight': self.max_inflight})
+            while not self.closed.is_set():
+                raw = self.ws.receive()
+                if raw is None:
+                    break
+                self._dispatch(raw)
+        except Exception:
+            # ConnectionClosed and transport errors end the session
+            pass
+        finally:
+            with _connections_lock:
+                user_connections = _connections.get(self.user_id)
+                if user_connections is not None:
+                    user_connections.discard(self)
+                    if not user_connections:
+                        _connections.pop(self.user_id, None)
+            self.close()
+            writer.join(timeout=self.send_timeout)
+
+    def _write_loop(self):
+        while True:
+            event = self.outbound.get()
+            if event is None:
+                return
+            try:
+                self.ws.send(json.dumps(event))
+            except Exception:
+                self.closed.set()
+                return
+
+    def _dispatch(self, raw):
+        try:
+            frame = json.loads(raw)
+        except (TypeError, ValueError):
+            self.emit({'type': 'error', 'error': 'Invalid JSON frame'})
+            return
+
+        request_id = frame.get('id')
+        frame_type = frame.get('type')
+
+        if frame_type == 'ping':
+            self.emit({'id': request_id, 'type': 'pong'})
+            return
+        if frame_type == 'stop':
+            cancel = self.cancels.get(frame.get('request'))
+            if cancel is None:
+                self.emit({'id': request_id, 'type': 'error', 'error': 'No running request to stop'})
+            else:
+                cancel.set()
+            return
+        if frame_type not in ('send', 'create'):
+            self.emit({'id': request_id, 'type': 'error', 'error': f'Unknown frame type: {frame_type}'})
+            return
+
+        # Keep reading so stop and ping frames are never held up behind work
+        if not self.slots.acquire(blocking=False):
+            self.emit({'id': request_id, 'type': 'error', 'code': 'busy', 'chat_id': frame.get('chat_id'),
+                       'error': f'Too many requests in flight (max {self.max_inflight})'})
+            return
+        handler = self._handle_send if frame_type == 'send' else self._handle_create
+        # Registered before the thread starts, so a stop sent right away finds it
+        if frame_type == 'send':
+            self.cancels[request_id] = threading.Event()
+
+        @copy_current_request_context
+        def run():
+            try:
+                handler(request_id, frame)
+            finally:
+                self.cancels.pop(request_id, None)
+                self.slots.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _handle_send(self, request_id, frame):
+        try:
+            chat_id = int(frame.get('chat_id'))
+        except (ValueError, TypeError):
+            self.emit({'id': request_id, 'type': 'error', 'error': 'Invalid chat_id format'})
+            return
+        message = frame.get('message')
+        if not message:
+            self.emit({'id': request_id, 'type': 'error', 'chat_id': chat_id, 'error': 'Missing message'})
+            return
+        try:
+            settings = parse_generation_settings(frame)
+        except ValueError as e:
+            self.emit({'id': request_id, 'type': 'error', 'chat_id': chat_id, 'error': str(e)})
+            return
+
+        def on_token(delta):
+            self.emit({'id': request_id, 'type': 'token', 'chat_id': chat_id, 'delta': delta})
+
+        success, message_text, response_data = self.chat_controller.stream_message(
+            chat_id, message, on_token, idempotency_key=frame.get('idempotency_key'),
+            provider=frame.get('provider'), settings=settings, cancel=self.cancels.get(request_id))
+        if not success:
+            self.emit({'id': request_id, 'type': 'error', 'chat_id': chat_id, 'error': message_text})
+            return
+
+        self.emit({
+            'id': request_id,
+            'type': 'done',
+            'chat_id': chat_id,
+            'response': response_data['response'],
+            'timestamp': response_data['timestamp'],
+            'usage': response_data.get('usage', {}),
+            'stopped': response_data.get('stopped', False),
+            'max_tokens': response_data.get('max_tokens'),
+            'max_tokens_clamped': response_data.get('max_tokens_clamped', False)
+        })
+        notify_chats_changed(self.user_id)
+
+    def _handle_create(self, request_id, frame):
+        title = frame.get('title') or 'New Chat'
+        first_message = frame.get('first_message', '')
+
+        success, message_text, chat = self.chat_controller.create_chat(
+            title, first_message, provider=frame.get('provider'), system_prompt=frame.get('system_prompt'))
+        if not success:
+            self.emit({'id': request_id, 'type': 'error', 'error': message_text})
+            return
+
+        latest_message = chat.chat_history[-1] if chat.chat_history else None
+        self.emit({'type': 'title', 'chat_id': chat.id, 'title': chat.title})
+        self.emit({
+            'id': request_id,
+            'type': 'done',
+            'chat_id': chat.id,
+            'response': latest_message.answer if latest_message else None,
+            'timestamp': latest_message.created_at.isoformat() if latest_message else chat.created_at.isoformat(),
+            'usage': {}
+        })
+        notify_chats_changed(self.user_id)
+
+
+if sock:
+    @sock.route('/ws', bp=ws_bp)
+    @login_required
+    def chat_socket(ws):
+        """Multiplexed chat WebSocket"""
+        from app.views.chat import chat_controller
+        connection = ChatSocket(
+            ws,
+            current_user.id,
+            chat_controller,
+            max_inflight=int(os.getenv('WEBSOCKET_MAX_INFLIGHT', '4')),
+            queue_size=int(os.getenv('WEBSOCKET_QUEUE_SIZE', '256'))
+        )
+        connection.serve()
+
+
+def init_websocket(app):
+    """
+    Register the WebSocket channel on the app
+
+    Returns:
+        bool: True if the channel was enabled
+    """
+    if sock is None:
+        app.logger.warning('ENABLE_WEBSOCKET is set but flask-sock is not installed; WebSocket channel disabled')
+        return False
+    sock.init_app(app)
+    app.register_blueprint(ws_bp)
+    return True
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Archive cold chats for Bart Chatbot
+
+Packs the messages of chats untouched for ARCHIVE_AFTER_DAYS (default 90)
+into one compressed blob per chat and removes their chat_histories rows.
+Archived chats are restored automatically when opened. Run it from cron:
+
+    python archive_chats.py                    # archive chats idle for ARCHIVE_AFTER_DAYS
+    python archive_chats.py --days 30 --limit 1000
+    python archive_chats.py status             # show hot vs archived totals
+    python archive_chats.py index              # rebuild the archived chat search index
+
+With CHAT_SHARD_URLS set, every command covers every shard.
+"""
+
+import argparse
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Chat, ChatHistory, ChatArchive
+from app.services.archive import archive_cold_chats, index_archives
+from app.services.sharding import shard_indexes, use_shard
+from sqlalchemy import func
+
+
+def archive(days, limit):
+    """Archive cold chats"""
+    app = create_app()
+
+    with app.app_context():
+        print(f"=== Archiving chats idle for {days} days ===")
+        try:
+            stats = archive_cold_chats(days, limit=limit)
+        except Exception as e:
+            print(f"❌ Archiving failed: {e}")
+            return False
+
+        ratio = stats['raw_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 0
+        print(f"✅ Archived {stats['chats']} chats ({stats['messages']} messages), "
+              f"{stats['raw_bytes']} -> {stats['stored_bytes']} bytes ({ratio:.1f}x)")
+        return True
+
+
+def status():
+    """Print hot and archived message totals"""
+    app = create_app()
+
+    with app.app_context():
+        hot = chats = messages = raw = stored = total_chats = 0
+        for shard in shard_indexes():
+            with use_shard(shard):
+                hot += db.session.query(func.count(ChatHistory.id)).scalar()
+                totals = db.session.query(
+                    func.count(ChatArchive.chat_id), func.coalesce(func.sum(ChatArchive.message_count), 0),
+                    func.coalesce(func.sum(ChatArchive.raw_bytes), 0), func.coalesce(func.sum(ChatArchive.stored_bytes), 0)
+                ).one()
+                chats, messages, raw, stored = (a + b for a, b in zip((chats, messages, raw, stored), totals))
+                total_chats += db.session.query(func.count(Chat.id)).scalar()
+        print(f"Hot messages:      {hot}")
+        print(f"Archived chats:    {chats} of {total_chats}")
+        print(f"Archived messages: {messages} ({raw} -> {stored} bytes)")
+        return True
+
+
+def index():
+    """Index the messages of every archived chat for search"""
+    app = create_app()
+
+    with app.app_context():
+        print("=== Indexing archived chats ===")
+        try:
+            indexed = index_archives()
+        except Exception as e:
+            print(f"❌ Indexing failed: {e}")
+            return False
+        print(f"✅ Indexed {indexed} archived chats")
+        return True
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Archive cold chats')
+    parser.add_argument('command', nargs='?', choices=['archive', 'status', 'index'], default='archive')
+    parser.add_argument('--days', type=int, default=int(os.getenv('ARCHIVE_AFTER_DAYS', '90')),
+                        help='Idle days before a chat is archived')
+    parser.add_argument('--limit', type=int, default=None, help='Maximum chats to archive in this run')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        success = status()
+    elif args.command == 'index':
+        success = index()
+    else:
+        success = archive(args.days, args.limit)
+
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
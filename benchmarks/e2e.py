@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for Bart Chatbot
+
+Starts a fake OpenAI server and the app in-process, then drives scripted
+user sessions: register, login, create a chat, N message turns and
+dashboard reloads. Reports p50/p95/p99 latency per operation, throughput,
+DB queries per request and peak memory, and can save or compare against
+a baseline:
+
+    python benchmarks/e2e.py --users 20 --turns 5
+    python benchmarks/e2e.py --save-baseline benchmarks/baselines/local.json
+    python benchmarks/e2e.py --compare benchmarks/baselines/local.json
+
+Use --target to drive an already-running deployment instead (DB query
+counts are then unavailable; point that server's OPENAI_BASE_URL at
+benchmarks/fake_openai.py).
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+sys.path.append(BENCH_DIR)
+
+from fake_openai import FakeOpenAIServer
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+
+class Recorder:
+    """Thread-safe latency and error collection per operation"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def timed(self, op, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = fn(*args, **kwargs)
+            ok = response.status_code < 400
+            if ok and response.headers.get('Content-Type', '').startswith('application/json'):
+                ok = response.json().get('success', True) is not False
+        except requests.RequestException:
+            response, ok = None, False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples[op].append(elapsed)
+            if not ok:
+                self.errors[op] += 1
+        return response if ok else None
+
+
+class QueryCounter:
+    """Counts SQL statements per endpoint for an in-process app"""
+
+    def __init__(self, app, db):
+        from flask import g, has_app_context, request
+        from sqlalchemy import event
+
+        self.per_endpoint = defaultdict(list)
+        self._lock = threading.Lock()
+
+        def before_cursor_execute(*args):
+            if has_app_context():
+                g.bench_queries = g.get('bench_queries', 0) + 1
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        @app.after_request
+        def record(response):
+            with self._lock:
+                self.per_endpoint[request.endpoint or request.path].append(g.get('bench_queries', 0))
+            return response
+
+    def summary(self):
+        with self._lock:
+            return {endpoint: round(sum(counts) / len(counts), 2)
+                    for endpoint, counts in sorted(self.per_endpoint.items())}
+
+
+def start_app(database_url):
+    """Create the app and serve it on an ephemeral port"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app, db
+
+    app = create_app()
+    queries = QueryCounter(app, db)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server, queries
+
+
+def user_session(base_url, recorder, turns, reloads, run_id, index):
+    """One scripted user: register, login, create chat, send turns, reload dashboard"""
+    http = requests.Session()
+    username = f"bench_{run_id}_{index}"
+    password = secrets.token_urlsafe(12)
+    ajax = {'X-Requested-With': 'XMLHttpRequest'}
+
+    recorder.timed('register', http.post, f"{base_url}/auth/register", allow_redirects=False,
+                   data={'username': username, 'email': f"{username}@bench.local", 'password': password})
+    if not recorder.timed('login', http.post, f"{base_url}/auth/login", allow_redirects=False,
+                          data={'username': username, 'password': password}):
+        return
+
+    created = recorder.timed('create_chat', http.post, f"{base_url}/chat/new", headers=ajax,
+                             json={'first_message': f"Hello from {username}, what can you do?"})
+    if not created:
+        return
+    chat_id = created.json()['chat_id']
+
+    for turn in range(turns):
+        recorder.timed('send_message', http.post, f"{base_url}/chat/send_message",
+                       json={'chat_id': chat_id, 'message': f"Turn {turn}: tell me more about point {turn}."})
+
+    for _ in range(reloads):
+        recorder.timed('dashboard', http.get, f"{base_url}/chat/dashboard")
+        recorder.timed('api_chats', http.get, f"{base_url}/chat/api/chats")
+        recorder.timed('api_chat', http.get, f"{base_url}/chat/api/chat/{chat_id}")
+
+
+def compare(results, baseline, threshold):
+    """Print deltas against a baseline; return False on regression"""
+    ok = True
+    print(f"\n=== Comparison with baseline ({baseline.get('label', 'baseline')}) ===")
+    for op, stats in results['operations'].items():
+        base = baseline['operations'].get(op)
+        if not base or not base['p95_ms']:
+            continue
+        delta = (stats['p95_ms'] - base['p95_ms']) / base['p95_ms']
+        flag = '  ❌ regression' if delta > threshold else ''
+        ok = ok and not flag
+        print(f"{op:>14} p95 {base['p95_ms']:>8.1f} -> {stats['p95_ms']:>8.1f} ms ({delta:+.0%}){flag}")
+    base_rps = baseline.get('throughput_rps') or 0
+    if base_rps:
+        delta = (results['throughput_rps'] - base_rps) / base_rps
+        flag = '  ❌ regression' if delta < -threshold else ''
+        ok = ok and not flag
+        print(f"{'throughput':>14} {base_rps:>12.1f} -> {results['throughput_rps']:>8.1f} req/s ({delta:+.0%}){flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark with a fake OpenAI server')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent scripted users')
+    parser.add_argument('--turns', type=int, default=5, help='Messages per user')
+    parser.add_argument('--reloads', type=int, default=3, help='Dashboard reloads per user')
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake OpenAI time to first token (s)')
+    parser.add_argument('--token-rate', type=float, default=200.0, help='Fake OpenAI tokens per second')
+    parser.add_argument('--completion-tokens', type=int, default=60)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--database-url', default=None, help='Defaults to a throwaway SQLite file')
+    parser.add_argument('--target', default=None, help='Benchmark a running server instead of an in-process app')
+    parser.add_argument('--label', default='local')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed regression (fraction)')
+    args = parser.parse_args()
+
+    fake = FakeOpenAIServer(latency=args.latency, token_rate=args.token_rate,
+                            completion_tokens=args.completion_tokens, error_rate=args.error_rate,
+                            rate_limit_rate=args.rate_limit_rate, seed=1).start()
+    os.environ['OPENAI_BASE_URL'] = fake.base_url
+    os.environ['OPENAI_API_KEY'] = 'bench'
+
+    queries = None
+    if args.target:
+        base_url = args.target.rstrip('/')
+    else:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+        base_url, _, queries = start_app(database_url)
+
+    recorder = Recorder()
+    run_id = secrets.token_hex(3)
+    print(f"=== E2E Benchmark: {args.users} users x {args.turns} turns against {base_url} ===")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        futures = [pool.submit(user_session, base_url, recorder, args.turns, args.reloads, run_id, i)
+                   for i in range(args.users)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    total_requests = sum(len(samples) for samples in recorder.samples.values())
+    results = {
+        'label': args.label,
+        'config': {k: v for k, v in vars(args).items() if k not in ('save_baseline', 'compare', 'label')},
+        'elapsed_s': round(elapsed, 3),
+        'requests': total_requests,
+        'throughput_rps': round(total_requests / elapsed, 2) if elapsed else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'upstream': dict(fake.stats),
+        'operations': {},
+        'db_queries_per_request': queries.summary() if queries else None
+    }
+
+    print(f"\n{'operation':>14} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for op, samples in recorder.samples.items():
+        stats = {
+            'count': len(samples),
+            'errors': recorder.errors[op],
+            'p50_ms': round(percentile(samples, 50) * 1000, 1),
+            'p95_ms': round(percentile(samples, 95) * 1000, 1),
+            'p99_ms': round(percentile(samples, 99) * 1000, 1)
+        }
+        results['operations'][op] = stats
+        print(f"{op:>14} {stats['count']:>6} {stats['errors']:>6} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+    print(f"\nThroughput: {results['throughput_rps']:.1f} req/s over {elapsed:.2f} s")
+    print(f"Peak RSS (benchmark + app): {results['peak_rss_mb']:.1f} MB")
+    print(f"Upstream: {results['upstream']}")
+    if queries:
+        print("DB queries per request:")
+        for endpoint, count in results['db_queries_per_request'].items():
+            print(f"  {endpoint:<24} {count}")
+
+    fake.stop()
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in server for benchmarks
+
+Implements /v1/chat/completions (including streaming) and /v1/models with
+configurable latency, token rate and error injection, so the app can be
+load-tested without spending tokens:
+
+    python benchmarks/fake_openai.py --port 5056 --latency 0.3 --token-rate 80
+    export OPENAI_BASE_URL=http://127.0.0.1:5056/v1 OPENAI_API_KEY=bench
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER = ("Bart considers the question carefully and explains the answer step by step "
+          "with a short example and a summary of the key points ").split()
+
+
+class FakeOpenAIServer:
+    """In-process OpenAI-compatible server running on a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, token_rate=0.0,
+                 completion_tokens=60, error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        """
+        Initialize the server
+
+        Args:
+            host: Bind address
+            port: Bind port (0 picks a free port)
+            latency: Seconds before the first token (time to first token)
+            token_rate: Generated tokens per second (0 = instant)
+            completion_tokens: Tokens per completion (capped by max_tokens)
+            error_rate: Fraction of completions answered with HTTP 500
+            rate_limit_rate: Fraction of completions answered with HTTP 429
+            seed: Random seed for reproducible error injection
+        """
+        self.latency = latency
+        self.token_rate = token_rate
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}/v1"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _roll(self):
+        with self._lock:
+            return self._random.random()
+
+    def _completion_words(self, messages, max_tokens):
+        last = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+        words = ['Echo:'] + last.split()[:10]
+        count = max(1, min(self.completion_tokens, max_tokens or self.completion_tokens))
+        while len(words) < count:
+            words.append(FILLER[len(words) % len(FILLER)])
+        return words[:count]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/v1/models':
+                    server.count('models')
+                    self._send_json(200, {'object': 'list', 'data': [
+                        {'id': name, 'object': 'model', 'created': 0, 'owned_by': 'fake'}
+                        for name in ('gpt-4o', 'gpt-4o-mini', 'gpt-3.5-turbo')
+                    ]})
+                else:
+                    self._send_json(404, {'error': {'message': 'Not found'}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if self.path.rstrip('/') != '/v1/chat/completions':
+                    self._send_json(404, {'error': {'message': 'Not found'}})
+                    return
+
+                server.count('requests')
+                roll = server._roll()
+                if roll < server.error_rate:
+                    server.count('errors')
+                    self._send_json(500, {'error': {'message': 'Injected server error', 'type': 'server_error'}})
+                    return
+                if roll < server.error_rate + server.rate_limit_rate:
+                    server.count('rate_limited')
+                    self._send_json(429, {'error': {'message': 'Injected rate limit', 'type': 'rate_limit_error'}})
+                    return
+
+                messages = body.get('messages', [])
+                model = body.get('model', 'gpt-4o')
+                words = server._completion_words(messages, body.get('max_tokens'))
+                prompt_tokens = sum(len(m.get('content') or '') for m in messages) // 4 + 1
+                server.count('prompt_tokens', prompt_tokens)
+                server.count('completion_tokens', len(words))
+
+                if server.latency:
+                    time.sleep(server.latency)
+                delay = 1.0 / server.token_rate if server.token_rate else 0.0
+
+                if body.get('stream'):
+                    self._stream(model, words, delay)
+                    return
+
+                if delay:
+                    time.sleep(delay * len(words))
+                self._send_json(200, {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': ' '.join(words)},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': len(words),
+                        'total_tokens': prompt_tokens + len(words)
+                    }
+                })
+
+            def _stream(self, model, words, delay):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                for index, word in enumerate(words):
+                    if delay:
+                        time.sleep(delay)
+                    chunk = {
+                        'id': 'chatcmpl-fake',
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': model,
+                        'choices': [{'index': 0, 'delta': {'content': word if index == 0 else ' ' + word},
+                                     'finish_reason': None}]
+                    }
+                    try:
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        server.count('cancelled_streams')
+                        return
+                done = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                        'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+                self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible stand-in server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--latency', type=float, default=0.3, help='Seconds to first token')
+    parser.add_argument('--token-rate', type=float, default=80.0, help='Tokens per second (0 = instant)')
+    parser.add_argument('--completion-tokens', type=int, default=60)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.latency, args.token_rate,
+                              args.completion_tokens, args.error_rate, args.rate_limit_rate)
+    print(f"Fake OpenAI running at {server.base_url}")
+    print(f"export OPENAI_BASE_URL={server.base_url} OPENAI_API_KEY=bench")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
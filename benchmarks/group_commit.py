@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Message commit throughput benchmark
+
+Saves chat messages from concurrent request threads, first with one commit
+per message (the default path) and then through the write-behind buffer
+(WRITE_BEHIND_ENABLED), and reports messages committed per second. Uses
+DATABASE_URL, or a throwaway SQLite file when it is not set.
+
+    python benchmarks/group_commit.py
+    python benchmarks/group_commit.py --threads 64 --seconds 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/group_commit.db'
+
+from app import create_app, db
+from app.controllers.chat_controller import ChatController
+from app.models import Chat, User
+from app.services.write_behind import WriteBehindBuffer
+
+AI_RESULT = {
+    'response': 'Benchmark answer ' * 20,
+    'usage': {'prompt_tokens': 100, 'completion_tokens': 40, 'total_tokens': 140},
+    'model': 'benchmark',
+    'latency_ms': 0
+}
+
+
+def run(app, chat_ids, user_id, threads, seconds, buffer=None):
+    controller = ChatController()
+    deadline = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def worker(index):
+        chat_id = chat_ids[index % len(chat_ids)]
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                if buffer:
+                    buffer.submit(controller._exchange_values(chat_id, 'question', AI_RESULT), user_id)
+                else:
+                    controller._save_exchange(db.session.get(Chat, chat_id), 'question', AI_RESULT)
+                    db.session.commit()
+                counts[index] += 1
+            db.session.remove()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Message commit throughput benchmark')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--interval-ms', type=float, default=float(os.getenv('WRITE_BEHIND_INTERVAL_MS', '5')))
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        user = User.query.filter_by(username='group_commit_bench').first()
+        if user is None:
+            user = User(username='group_commit_bench', email='group_commit_bench@example.com')
+            db.session.add(user)
+            db.session.commit()
+        chats = [Chat(title=f'Benchmark {i}', user_id=user.id) for i in range(args.threads)]
+        db.session.add_all(chats)
+        db.session.commit()
+        chat_ids, user_id = [chat.id for chat in chats], user.id
+        backend = db.engine.url.get_backend_name()
+
+    print(f"=== Message Commit Benchmark ({backend}, {args.threads} threads) ===")
+    direct = run(app, chat_ids, user_id, args.threads, args.seconds)
+    print(f"{'commit per message':>20}: {direct:>9.1f} messages/s")
+    buffer = WriteBehindBuffer(app, interval_ms=args.interval_ms)
+    grouped = run(app, chat_ids, user_id, args.threads, args.seconds, buffer=buffer)
+    buffer.close()
+    print(f"{'write-behind':>20}: {grouped:>9.1f} messages/s ({grouped / direct:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
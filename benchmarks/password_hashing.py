@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Password hashing benchmark
+
+Measures login verifications per second through PasswordHasher for a range
+of pool sizes and reports the rate per core.
+
+    python benchmarks/password_hashing.py
+    python benchmarks/password_hashing.py --method pbkdf2:sha256:600000 --seconds 5
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.password_service import PasswordHasher
+
+
+def run(method, workers, seconds, pool):
+    hasher = PasswordHasher(method=method, workers=workers, max_pending=workers * 4, pool=pool)
+    stored_hash = hasher.hash('correct horse battery staple')
+    deadline = time.perf_counter() + seconds
+    count = 0
+
+    # Enough client threads to keep the pool saturated without tripping max_pending
+    with ThreadPoolExecutor(max_workers=workers * 2) as clients:
+        def login_loop():
+            done = 0
+            while time.perf_counter() < deadline:
+                matches, _ = hasher.verify(stored_hash, 'correct horse battery staple')
+                assert matches
+                done += 1
+            return done
+
+        started = time.perf_counter()
+        futures = [clients.submit(login_loop) for _ in range(workers * 2)]
+        count = sum(f.result() for f in futures)
+        elapsed = time.perf_counter() - started
+
+    hasher.shutdown()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Password hashing benchmark')
+    parser.add_argument('--method', default=os.getenv('PASSWORD_HASH_METHOD', 'scrypt'))
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"=== Password Hashing Benchmark ({args.method}, {args.pool} pool) ===")
+    print(f"{'workers':>8} {'logins/s':>10} {'logins/s/core':>14}")
+    workers = 1
+    while workers <= args.max_workers:
+        rate = run(args.method, workers, args.seconds, args.pool)
+        print(f"{workers:>8} {rate:>10.1f} {rate / workers:>14.1f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Local stand-in OneLogin OIDC server for tests and development
+
+Serves discovery metadata, JWKS, authorize, token and userinfo endpoints,
+signing ID tokens with a throwaway RSA key. Point the app at it with:
+
+    python fake_onelogin.py --port 5055
+    export ONELOGIN_ISSUER=http://127.0.0.1:5055/oidc/2
+
+Run a login round trip against it with:
+
+    python fake_onelogin.py --selftest
+"""
+
+import argparse
+import base64
+import json
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+class FakeOneLoginServer:
+    """In-process OIDC provider running on a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, client_id='test-client', client_secret='test-secret',
+                 user=None, profile_in_id_token=True, latency=0.0):
+        """
+        Initialize the server
+
+        Args:
+            host: Bind address
+            port: Bind port (0 picks a free port)
+            client_id: Accepted client ID
+            client_secret: Accepted client secret
+            user: Claims for the signed-in user (sub, email, name)
+            profile_in_id_token: Include email/name in the ID token
+            latency: Seconds to sleep before each response
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.user = user or {'sub': '1001', 'email': 'test.user@example.com', 'name': 'Test User'}
+        self.profile_in_id_token = profile_in_id_token
+        self.latency = latency
+        self.hits = Counter()
+
+        self._key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._kid = secrets.token_hex(4)
+        self._codes = {}
+        self._tokens = {}
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.issuer = f"{self.base_url}/oidc/2"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def rotate_key(self):
+        """Switch to a new signing key (exercises JWKS refresh)"""
+        self._key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._kid = secrets.token_hex(4)
+
+    def issue_code(self, nonce=None):
+        """Issue an authorization code without going through /auth"""
+        code = secrets.token_urlsafe(16)
+        self._codes[code] = nonce
+        return code
+
+    def metadata(self):
+        return {
+            'issuer': self.issuer,
+            'authorization_endpoint': f"{self.issuer}/auth",
+            'token_endpoint': f"{self.issuer}/token",
+            'userinfo_endpoint': f"{self.issuer}/me",
+            'jwks_uri': f"{self.issuer}/certs",
+            'id_token_signing_alg_values_supported': ['RS256']
+        }
+
+    def jwks(self):
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self._key.public_key()))
+        jwk.update({'kid': self._kid, 'use': 'sig', 'alg': 'RS256'})
+        return {'keys': [jwk]}
+
+    def _id_token(self, nonce):
+        now = int(time.time())
+        claims = {'iss': self.issuer, 'aud': self.client_id, 'sub': self.user['sub'],
+                  'iat': now, 'exp': now + 300}
+        if nonce:
+            claims['nonce'] = nonce
+        if self.profile_in_id_token:
+            claims.update(email=self.user['email'], name=self.user['name'])
+        return jwt.encode(claims, self._key, algorithm='RS256', headers={'kid': self._kid})
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _route(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlparse(self.path)
+                path = url.path[len('/oidc/2'):] if url.path.startswith('/oidc/2') else url.path
+                server.hits[path] += 1
+                return path, parse_qs(url.query)
+
+            def do_GET(self):
+                path, query = self._route()
+                if path == '/.well-known/openid-configuration':
+                    self._send_json(200, server.metadata())
+                elif path == '/certs':
+                    self._send_json(200, server.jwks())
+                elif path == '/auth':
+                    code = server.issue_code(query.get('nonce', [None])[0])
+                    params = {'code': code, 'state': query.get('state', [''])[0]}
+                    self.send_response(302)
+                    self.send_header('Location', f"{query['redirect_uri'][0]}?{urlencode(params)}")
+                    self.end_headers()
+                elif path == '/me':
+                    token = self.headers.get('Authorization', '').replace('Bearer ', '')
+                    if token not in server._tokens:
+                        self._send_json(401, {'error': 'invalid_token'})
+                    else:
+                        self._send_json(200, dict(server.user))
+                else:
+                    self._send_json(404, {'error': 'not_found'})
+
+            def do_POST(self):
+                path, _ = self._route()
+                if path != '/token':
+                    self._send_json(404, {'error': 'not_found'})
+                    return
+                expected = base64.b64encode(f"{server.client_id}:{server.client_secret}".encode()).decode()
+                if self.headers.get('Authorization') != f"Basic {expected}":
+                    self._send_json(401, {'error': 'invalid_client', 'error_description': 'Bad client credentials'})
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                code = form.get('code', [None])[0]
+                if code not in server._codes:
+                    self._send_json(400, {'error': 'invalid_grant', 'error_description': 'Unknown or used code'})
+                    return
+                nonce = server._codes.pop(code)
+                access_token = secrets.token_urlsafe(24)
+                server._tokens[access_token] = True
+                self._send_json(200, {
+                    'access_token': access_token,
+                    'id_token': server._id_token(nonce),
+                    'token_type': 'Bearer',
+                    'expires_in': 3600
+                })
+
+        return Handler
+
+
+def selftest():
+    """Log in twice through OneLoginService and report request counts"""
+    from app.services.onelogin_service import OneLoginService
+
+    server = FakeOneLoginServer().start()
+    try:
+        service = OneLoginService(issuer=server.issuer, client_id=server.client_id,
+                                  client_secret=server.client_secret)
+        for attempt in range(2):
+            started = time.perf_counter()
+            nonce = secrets.token_urlsafe(8)
+            user = service.login(server.issue_code(nonce), nonce=nonce)
+            print(f"Login {attempt + 1}: {user['email']} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        server.rotate_key()
+        nonce = secrets.token_urlsafe(8)
+        service.login(server.issue_code(nonce), nonce=nonce)
+        print("Login after key rotation: ok")
+
+        print(f"Requests per endpoint: {dict(server.hits)}")
+        assert server.hits['/me'] == 0, "userinfo should be skipped when the ID token has a profile"
+        assert server.hits['/.well-known/openid-configuration'] == 1
+        assert server.hits['/certs'] == 2
+        print("✅ Self-test passed")
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in OneLogin OIDC server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--client-id', default='test-client')
+    parser.add_argument('--client-secret', default='test-secret')
+    parser.add_argument('--no-profile-in-id-token', action='store_true',
+                        help='Leave email/name out of the ID token to force the userinfo call')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per request')
+    parser.add_argument('--selftest', action='store_true', help='Run a login round trip and exit')
+    args = parser.parse_args()
+
+    if args.selftest:
+        selftest()
+        return
+
+    server = FakeOneLoginServer(args.host, args.port, args.client_id, args.client_secret,
+                                profile_in_id_token=not args.no_profile_in_id_token,
+                                latency=args.latency)
+    print(f"Fake OneLogin running at {server.issuer}")
+    print(f"export ONELOGIN_ISSUER={server.issuer} ONELOGIN_CLIENT_ID={args.client_id} "
+          f"ONELOGIN_CLIENT_SECRET={args.client_secret}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
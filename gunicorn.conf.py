@@ -0,0 +1,123 @@
+"""
+Gunicorn configuration for Bart Chatbot
+
+Every setting can be overridden through environment variables so the same
+file works for staging and production:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Chat requests spend most of their time waiting on the OpenAI API, so the
+default model is a small number of processes with many threads each.
+Send SIGHUP to the master for a graceful reload (new workers are started
+before old ones finish their in-flight requests).
+"""
+
+import multiprocessing
+import os
+import time
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# Binding
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5001')}")
+
+# Worker model: threaded workers sized for I/O-bound LLM waits
+worker_class = 'gthread'
+workers = _env_int('WEB_CONCURRENCY', min(multiprocessing.cpu_count() + 1, 8))
+threads = _env_int('GUNICORN_THREADS', 16)
+
+# Load the app once in the master so workers fork with warm imports
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+
+# Recycle workers after N requests (with jitter) to cap memory growth
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max(max_requests // 10, 1))
+
+# Upstream completions can take a while; leave headroom over the client timeout
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 60)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# Prometheus multiprocess metrics need a directory shared by all workers
+if os.getenv('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes'):
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/bart-prometheus')
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+# Logging
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+# Server hooks
+
+def on_starting(server):
+    """Clear metric files left over from a previous run"""
+    metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.endswith('.db'):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def when_ready(server):
+    """Report master boot time and worker layout"""
+    if server.cfg.preload_app:
+        from wsgi import BOOT_SECONDS, current_rss_mb
+        from app.services.metrics import release_pool_size
+        server.log.info("Bart Chatbot app loaded in %.0f ms (pid=%d, rss=%.1f MB)",
+                        BOOT_SECONDS * 1000, os.getpid(), current_rss_mb())
+        # Workers report their own pools; the master serves no requests
+        release_pool_size()
+    server.log.info(
+        "Master ready: %d workers x %d threads, preload=%s, max_requests=%d (+%d jitter)",
+        server.cfg.workers, server.cfg.threads, server.cfg.preload_app,
+        server.cfg.max_requests, server.cfg.max_requests_jitter
+    )
+
+
+def pre_fork(server, worker):
+    worker.fork_started = time.perf_counter()
+
+
+def post_fork(server, worker):
+    """Give each worker its own database connections"""
+    if server.cfg.preload_app:
+        from wsgi import dispose_db_connections
+        dispose_db_connections()
+
+
+def post_worker_init(worker):
+    """Report per-worker startup time, memory and DB pool capacity"""
+    from wsgi import BOOT_SECONDS, current_rss_mb
+    from app.services.metrics import report_pool_size
+    report_pool_size()
+    started = getattr(worker, 'fork_started', None)
+    startup_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+    worker.log.info(
+        "Worker %s booted in %.0f ms, rss=%.1f MB",
+        worker.pid, startup_ms, current_rss_mb()
+    )
+    if not worker.cfg.preload_app:
+        worker.log.info("Bart Chatbot app loaded in %.0f ms", BOOT_SECONDS * 1000)
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared metrics directory"""
+    from app.services.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    server.log.info("Worker %s exiting after %s requests", worker.pid, getattr(worker, 'nr', '?'))
@@ -12,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app, db
 from app.models import ChatHistory
+from app.services.partitions import is_partitioned
 from sqlalchemy import text
 
 def migrate_chat_history():
@@ -21,6 +22,13 @@ def migrate_chat_history():
     with app.app_context():
         print("=== Chat History Migration ===")
         
+        # The old chat_history table predates partitioning, so a partitioned
+        # chat_histories has been migrated already; recreating it would drop
+        # the partitions
+        if is_partitioned(db.session.connection()):
+            print("chat_histories is partitioned; nothing to migrate.")
+            return True
+        
         # Check if we need to migrate
         try:
             # Try to access the old columns
@@ -95,6 +103,10 @@ def rollback_migration():
     with app.app_context():
         print("=== Rollback Migration ===")
         
+        if is_partitioned(db.session.connection()):
+            print("❌ chat_histories is partitioned; detach its partitions first (partition_chat_history.py)")
+            return False
+        
         try:
             # Check if new table exists
             new_records = db.session.execute(text("SELECT question, answer, chat_id, created_at FROM chat_histories LIMIT 1")).fetchall()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Incremental schema migrations for Bart Chatbot
+
+db.create_all() only creates missing tables; it never alters existing ones.
+This script applies the column/index changes made since a database was
+created. Each migration runs once and is recorded in schema_migrations.
+The statements also work on a partitioned chat_histories (PostgreSQL
+applies them to every partition), and each run creates the upcoming
+monthly partitions (see partition_chat_history.py).
+
+    python migrate_schema.py          # apply pending migrations
+    python migrate_schema.py status   # list applied/pending migrations
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models.search import ARCHIVE_SEARCH_DDL, SEARCH_DDL, SEARCH_BACKFILL
+from app.services.partitions import ensure_partitions, list_partitions
+from app.services.sharding import shard_indexes, shard_key
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+# (name, {dialect: [statements]}); dialects without an entry have nothing to do
+MIGRATIONS = [
+    ('widen_user_password_hash', {
+        # scrypt hashes are ~160 characters
+        'postgresql': ['ALTER TABLE "user" ALTER COLUMN password_hash TYPE VARCHAR(255)'],
+    }),
+    ('user_email_lower_index', {
+        # Fails if existing emails differ only by case; resolve those first
+        'postgresql': ['CREATE UNIQUE INDEX IF NOT EXISTS ix_user_email_lower ON "user" (lower(email))'],
+        'sqlite': ['CREATE UNIQUE INDEX IF NOT EXISTS ix_user_email_lower ON "user" (lower(email))'],
+    }),
+    ('chat_history_usage_columns', {
+        # Existing rows keep NULL usage; usage_rollups is created by create_all
+        'postgresql': [
+            'ALTER TABLE chat_histories ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER',
+            'ALTER TABLE chat_histories ADD COLUMN IF NOT EXISTS completion_tokens INTEGER',
+            'ALTER TABLE chat_histories ADD COLUMN IF NOT EXISTS total_tokens INTEGER',
+            'ALTER TABLE chat_histories ADD COLUMN IF NOT EXISTS model VARCHAR(100)',
+            'ALTER TABLE chat_histories ADD COLUMN IF NOT EXISTS latency_ms INTEGER',
+            'ALTER TABLE chat ADD COLUMN IF NOT EXISTS total_tokens INTEGER NOT NULL DEFAULT 0',
+            'CREATE INDEX IF NOT EXISTS ix_chat_user_total_tokens ON chat (user_id, total_tokens)',
+        ],
+        'sqlite': [
+            'ALTER TABLE chat_histories ADD COLUMN prompt_tokens INTEGER',
+            'ALTER TABLE chat_histories ADD COLUMN completion_tokens INTEGER',
+            'ALTER TABLE chat_histories ADD COLUMN total_tokens INTEGER',
+            'ALTER TABLE chat_histories ADD COLUMN model VARCHAR(100)',
+            'ALTER TABLE chat_histories ADD COLUMN latency_ms INTEGER',
+            'ALTER TABLE chat ADD COLUMN total_tokens INTEGER NOT NULL DEFAULT 0',
+            'CREATE INDEX IF NOT EXISTS ix_chat_user_total_tokens ON chat (user_id, total_tokens)',
+        ],
+    }),
+    ('generation_settings_columns', {
+        'postgresql': [
+            'ALTER TABLE chat ADD COLUMN IF NOT EXISTS generation_settings JSON',
+            'ALTER TABLE chat_histories ADD COLUMN IF NOT EXISTS stopped BOOLEAN NOT NULL DEFAULT false',
+        ],
+        'sqlite': [
+            'ALTER TABLE chat ADD COLUMN generation_settings JSON',
+            'ALTER TABLE chat_histories ADD COLUMN stopped BOOLEAN NOT NULL DEFAULT 0',
+        ],
+    }),
+    ('full_text_search', {
+        # Postgres computes search_vector for existing rows while adding it
+        'postgresql': SEARCH_DDL['postgresql'],
+        'sqlite': SEARCH_DDL['sqlite'] + SEARCH_BACKFILL['sqlite'],
+    }),
+    ('chat_archive_columns', {
+        # chat_archives itself is created by create_all
+        'postgresql': [
+            'ALTER TABLE chat ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP',
+            'ALTER TABLE chat ADD COLUMN IF NOT EXISTS rehydrated_at TIMESTAMP',
+        ],
+        'sqlite': [
+            'ALTER TABLE chat ADD COLUMN archived_at DATETIME',
+            'ALTER TABLE chat ADD COLUMN rehydrated_at DATETIME',
+        ],
+    }),
+    ('bigint_chat_ids', {
+        # Room for the 53-bit IDs used when chat data is sharded; SQLite
+        # INTEGER keys are already 64-bit
+        'postgresql': [
+            'ALTER TABLE chat ALTER COLUMN id TYPE BIGINT',
+            'ALTER TABLE chat_histories ALTER COLUMN id TYPE BIGINT',
+            'ALTER TABLE chat_histories ALTER COLUMN chat_id TYPE BIGINT',
+            'ALTER TABLE chat_archives ALTER COLUMN chat_id TYPE BIGINT',
+            'ALTER SEQUENCE IF EXISTS chat_id_seq AS BIGINT',
+            'ALTER SEQUENCE IF EXISTS chat_histories_id_seq AS BIGINT',
+        ],
+    }),
+    ('chat_histories_chat_created_index', {
+        # Lets recent-history queries use created_at; on a partitioned
+        # table the index is created on every partition
+        'postgresql': ['CREATE INDEX IF NOT EXISTS ix_chat_histories_chat_created ON chat_histories (chat_id, created_at)'],
+        'sqlite': ['CREATE INDEX IF NOT EXISTS ix_chat_histories_chat_created ON chat_histories (chat_id, created_at)'],
+    }),
+    ('chat_soft_delete', {
+        'postgresql': [
+            'ALTER TABLE chat ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP',
+            'CREATE INDEX IF NOT EXISTS ix_chat_deleted_at ON chat (deleted_at) WHERE deleted_at IS NOT NULL',
+        ],
+        'sqlite': [
+            'ALTER TABLE chat ADD COLUMN deleted_at DATETIME',
+            'CREATE INDEX IF NOT EXISTS ix_chat_deleted_at ON chat (deleted_at) WHERE deleted_at IS NOT NULL',
+        ],
+    }),
+    ('chat_cascade_deletes', {
+        # SQLite cannot alter foreign keys; existing SQLite databases keep
+        # theirs, which is fine because the purge deletes messages itself
+        'postgresql': [
+            'ALTER TABLE chat_histories DROP CONSTRAINT IF EXISTS chat_histories_chat_id_fkey',
+            'ALTER TABLE chat_histories ADD CONSTRAINT chat_histories_chat_id_fkey '
+            'FOREIGN KEY (chat_id) REFERENCES chat (id) ON DELETE CASCADE',
+            'ALTER TABLE chat_archives DROP CONSTRAINT IF EXISTS chat_archives_chat_id_fkey',
+            'ALTER TABLE chat_archives ADD CONSTRAINT chat_archives_chat_id_fkey '
+            'FOREIGN KEY (chat_id) REFERENCES chat (id) ON DELETE CASCADE',
+        ],
+    }),
+    ('chat_system_prompt', {
+        'postgresql': [
+            'ALTER TABLE chat ADD COLUMN IF NOT EXISTS system_prompt TEXT',
+            'ALTER TABLE chat ADD COLUMN IF NOT EXISTS system_prompt_version BIGINT NOT NULL DEFAULT 0',
+        ],
+        'sqlite': [
+            'ALTER TABLE chat ADD COLUMN system_prompt TEXT',
+            'ALTER TABLE chat ADD COLUMN system_prompt_version BIGINT NOT NULL DEFAULT 0',
+        ],
+    }),
+    ('user_system_prompt', {
+        'postgresql': [
+            'ALTER TABLE "user" ADD COLUMN IF NOT EXISTS system_prompt TEXT',
+            'ALTER TABLE "user" ADD COLUMN IF NOT EXISTS system_prompt_version BIGINT NOT NULL DEFAULT 0',
+        ],
+        'sqlite': [
+            'ALTER TABLE "user" ADD COLUMN system_prompt TEXT',
+            'ALTER TABLE "user" ADD COLUMN system_prompt_version BIGINT NOT NULL DEFAULT 0',
+        ],
+    }),
+    ('archived_chat_search', {
+        # Existing archives are indexed by `python archive_chats.py index`
+        'postgresql': ARCHIVE_SEARCH_DDL['postgresql'],
+        'sqlite': ARCHIVE_SEARCH_DDL['sqlite'],
+    }),
+]
+
+# Migrations that only touch chat tables also run on each CHAT_SHARD_URLS
+# database, which records them in its own schema_migrations
+SHARD_MIGRATIONS = {
+    'bigint_chat_ids',
+    'chat_histories_chat_created_index',
+    'chat_soft_delete',
+    'chat_cascade_deletes',
+    'chat_system_prompt',
+    'archived_chat_search',
+}
+
+
+def ensure_migrations_table(session=None):
+    session = session or db.session
+    session.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name VARCHAR(255) PRIMARY KEY,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    session.commit()
+
+
+def applied_migrations(session=None):
+    rows = (session or db.session).execute(text("SELECT name FROM schema_migrations")).fetchall()
+    return {row[0] for row in rows}
+
+
+def execute(statement, session=None):
+    """Run one statement; SQLite has no ADD COLUMN IF NOT EXISTS, so columns
+    that create_all() already made are skipped"""
+    try:
+        (session or db.session).execute(text(statement))
+    except OperationalError as e:
+        if 'duplicate column name' not in str(e):
+            raise
+        print(f"   skipped (already applied): {statement}")
+
+
+def migrate():
+    """Apply pending migrations"""
+    app = create_app()
+
+    with app.app_context():
+        print("=== Schema Migration ===")
+        if not apply_migrations(db.session, db.engine.dialect.name):
+            return False
+
+        for index in shard_indexes():
+            if index is None:
+                continue
+            engine = db.engines[shard_key(index)]
+            print(f"--- {shard_key(index)} ---")
+            with Session(engine) as session:
+                if not apply_migrations(session, engine.dialect.name, SHARD_MIGRATIONS):
+                    return False
+
+        print("✅ Schema is up to date")
+        return True
+
+
+def apply_migrations(session, dialect, names=None):
+    """Apply the pending migrations (only `names`, if given) on the session's database"""
+    ensure_migrations_table(session)
+    applied = applied_migrations(session)
+
+    for name, statements in MIGRATIONS:
+        if name in applied or (names is not None and name not in names):
+            continue
+        print(f"Applying {name}...")
+        try:
+            for statement in statements.get(dialect, []):
+                execute(statement, session)
+            session.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {'name': name})
+            session.commit()
+        except Exception as e:
+            print(f"❌ {name} failed: {e}")
+            session.rollback()
+            return False
+
+    # Deploys also keep the monthly chat_histories partitions ahead
+    created = ensure_partitions(session.connection(), int(os.getenv('PARTITION_MONTHS_AHEAD', '3')))
+    session.commit()
+    if created:
+        print(f"   created partitions: {', '.join(created)}")
+    return True
+
+
+def status():
+    """Print applied and pending migrations"""
+    app = create_app()
+
+    with app.app_context():
+        ensure_migrations_table()
+        applied = applied_migrations()
+        for name, _ in MIGRATIONS:
+            print(f"{'✓' if name in applied else '·'} {name}")
+        partitions = list_partitions(db.session.connection())
+        if partitions:
+            print(f"chat_histories: partitioned by month ({len(partitions)} partitions)")
+        return True
+
+
+def main():
+    """Main function"""
+    if len(sys.argv) > 1 and sys.argv[1] == 'status':
+        success = status()
+    else:
+        success = migrate()
+
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Manage monthly chat_histories partitions for Bart Chatbot (PostgreSQL)
+
+    python partition_chat_history.py convert             # one-time: partition the existing table
+    python partition_chat_history.py create              # create the next PARTITION_MONTHS_AHEAD months
+    python partition_chat_history.py detach --keep 24    # detach months older than 24, into schema "archive"
+    python partition_chat_history.py detach --keep 24 --drop
+    python partition_chat_history.py status              # list partitions with row estimates
+
+Run `create` from cron (e.g. daily) so next month's partition always
+exists before the month starts; rows outside every range land in
+chat_histories_default. Detaching a month is quick and takes no row
+locks, unlike deleting its rows. Archive cold chats with archive_chats.py
+first if their messages should stay available. With CHAT_SHARD_URLS set,
+every command runs on the primary and on each shard.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.services.partitions import add_months, convert, detach_partitions, ensure_partitions, \
+    is_partitioned, list_partitions, month_start
+from app.services.sharding import shard_indexes, shard_key
+
+
+def databases():
+    """Yield (label, engine) for each database holding chat_histories"""
+    yield 'primary', db.engine
+    for index in shard_indexes():
+        if index is not None:
+            yield shard_key(index), db.engines[shard_key(index)]
+
+
+def run(label, engine, action):
+    """Run `action(connection, label)` in one transaction and report failures"""
+    if engine.dialect.name != 'postgresql':
+        print(f"{label}: {engine.dialect.name} does not support partitioning; skipped")
+        return True
+    try:
+        with engine.begin() as connection:
+            action(connection, label)
+        return True
+    except Exception as e:
+        print(f"❌ {label}: {e}")
+        return False
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Manage chat_histories partitions')
+    parser.add_argument('command', choices=['convert', 'create', 'detach', 'status'])
+    parser.add_argument('--ahead', type=int, default=int(os.getenv('PARTITION_MONTHS_AHEAD', '3')),
+                        help='Months of partitions to create ahead of the current one')
+    parser.add_argument('--keep', type=int, default=None,
+                        help='detach: months to keep, including the current one')
+    parser.add_argument('--drop', action='store_true', help='detach: drop instead of moving to --schema')
+    parser.add_argument('--schema', default=os.getenv('PARTITION_ARCHIVE_SCHEMA', 'archive'),
+                        help='detach: schema that receives detached partitions')
+    args = parser.parse_args()
+    if args.command == 'detach' and not args.keep:
+        parser.error('detach needs --keep MONTHS')
+
+    def do_convert(connection, label):
+        created = convert(connection, args.ahead)
+        print(f"✅ {label}: chat_histories partitioned; created {', '.join(created) or 'no new partitions'}")
+
+    def do_create(connection, label):
+        if not is_partitioned(connection):
+            print(f"{label}: chat_histories is not partitioned (run convert first)")
+            return
+        created = ensure_partitions(connection, args.ahead)
+        print(f"✅ {label}: created {', '.join(created) or 'nothing, partitions are up to date'}")
+
+    def do_detach(connection, label):
+        before = add_months(month_start(datetime.utcnow()), 1 - args.keep)
+        detached = detach_partitions(connection, before, drop=args.drop, schema=args.schema)
+        where = 'dropped' if args.drop else f'moved to schema {args.schema}'
+        print(f"✅ {label}: detached {', '.join(detached) or 'nothing'} (before {before}; {where})")
+
+    def do_status(connection, label):
+        partitions = list_partitions(connection)
+        if not partitions:
+            print(f"{label}: chat_histories is not partitioned")
+            return
+        print(f"{label}:")
+        for p in partitions:
+            print(f"  {p['name']:<28} {p['rows']:>12} rows {p['bytes'] / 1048576:>10.1f} MB  {p['bound']}")
+
+    actions = {'convert': do_convert, 'create': do_create, 'detach': do_detach, 'status': do_status}
+    app = create_app()
+
+    with app.app_context():
+        print(f"=== chat_histories partitions: {args.command} ===")
+        success = True
+        for label, engine in databases():
+            success = run(label, engine, actions[args.command]) and success
+
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Delete and purge chats for Bart Chatbot
+
+Deleted chats are only marked until their rows are purged in batches of
+CHAT_PURGE_BATCH_SIZE (default 1000). The app purges in the background;
+this script finishes purges a restart interrupted and deletes in bulk:
+
+    python purge_chats.py                                # purge every deleted chat
+    python purge_chats.py delete --older-than-days 365   # delete chats idle for a year, then purge
+    python purge_chats.py delete --user 42               # delete all chats of user 42, then purge
+    python purge_chats.py status                         # chats waiting to be purged
+
+With CHAT_SHARD_URLS set, every shard is covered.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Chat
+from app.services.chat_purge import configured_batch_size, purge_deleted_chats, soft_delete_chats
+from app.services.sharding import chat_shard, shard_indexes, use_shard
+from sqlalchemy import func
+
+
+def purge(batch_size, limit=None):
+    """Purge chats marked deleted on every shard"""
+    app = create_app()
+
+    with app.app_context():
+        return purge_all(batch_size, limit)
+
+
+def purge_all(batch_size, limit=None):
+    """Purge chats marked deleted on every shard (inside an app context)"""
+    print("=== Purging deleted chats ===")
+    totals = {'chats': 0, 'messages': 0}
+    try:
+        for shard in shard_indexes():
+            with use_shard(shard):
+                stats = purge_deleted_chats(batch_size, limit=limit)
+            totals = {key: totals[key] + stats[key] for key in totals}
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Purge failed: {e}")
+        return False
+
+    print(f"✅ Purged {totals['chats']} chats ({totals['messages']} messages)")
+    return True
+
+
+def delete(batch_size, older_than_days=None, user_id=None):
+    """Mark matching chats deleted in batches, then purge them"""
+    app = create_app()
+
+    with app.app_context():
+        before = datetime.utcnow() - timedelta(days=older_than_days) if older_than_days is not None else None
+        scope = f"user {user_id}" if user_id is not None else "all users"
+        age = f" idle for {older_than_days} days" if before else ""
+        print(f"=== Deleting chats of {scope}{age} ===")
+        marked = 0
+        try:
+            if user_id is not None:
+                with chat_shard(user_id):
+                    marked = soft_delete_chats(user_id=user_id, before=before, batch_size=batch_size)
+            else:
+                for shard in shard_indexes():
+                    with use_shard(shard):
+                        marked += soft_delete_chats(before=before, batch_size=batch_size)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Delete failed: {e}")
+            return False
+        print(f"✅ Marked {marked} chats deleted")
+        return purge_all(batch_size)
+
+
+def status():
+    """Print the number of chats waiting to be purged"""
+    app = create_app()
+
+    with app.app_context():
+        pending = 0
+        for shard in shard_indexes():
+            with use_shard(shard):
+                pending += db.session.query(func.count(Chat.id)).filter(Chat.deleted_at.is_not(None)).scalar()
+        print(f"Deleted chats waiting to be purged: {pending}")
+        return True
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Delete and purge chats')
+    parser.add_argument('command', nargs='?', choices=['purge', 'delete', 'status'], default='purge')
+    parser.add_argument('--older-than-days', type=int, default=None,
+                        help='delete: only chats not updated for this many days')
+    parser.add_argument('--user', type=int, default=None, help="delete: only this user's chats")
+    parser.add_argument('--batch-size', type=int, default=configured_batch_size(), help='Rows per transaction')
+    parser.add_argument('--limit', type=int, default=None, help='purge: maximum chats per shard')
+    args = parser.parse_args()
+
+    if args.command == 'delete':
+        if args.older_than_days is None and args.user is None:
+            parser.error('delete needs --older-than-days and/or --user')
+        success = delete(args.batch_size, args.older_than_days, args.user)
+    elif args.command == 'status':
+        success = status()
+    else:
+        success = purge(args.batch_size, args.limit)
+
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
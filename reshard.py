@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Reshard chat data for Bart Chatbot
+
+Moves users' chat data (chats, messages, archives, usage rollups) when the
+shard list changes. Users are placed by a jump consistent hash, so
+appending shards to CHAT_SHARD_URLS only moves about 1/N of them; a user
+whose shard URL is the same before and after is never touched.
+
+    python reshard.py plan --to URL0,URL1,URL2           # users that would move
+    python reshard.py copy --to URL0,URL1,URL2           # copy them (repeatable)
+    python reshard.py copy --from OLD_URLS --to NEW_URLS # catch up after the switch
+    python reshard.py cleanup --from OLD_URLS --to NEW_URLS --execute
+
+--from defaults to the current CHAT_SHARD_URLS, or to DATABASE_URL while
+chat data is not sharded yet. Procedure:
+
+    1. copy --to NEW while the app still runs on the old shard list
+    2. deploy with CHAT_SHARD_URLS=NEW
+    3. copy --from OLD --to NEW to pick up messages written in between
+    4. cleanup --from OLD --to NEW (dry run), then again with --execute
+
+copy is idempotent: it inserts chats it has not copied yet and replaces
+chats that changed on the old shard since the last run. Chats deleted on
+the old shard between steps 1 and 2 survive on the new one, and usage
+rollups written to both sides keep the larger counts, so pick a quiet
+time for step 2 and do not run archive_chats.py until step 4 is done.
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter
+from datetime import datetime
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db, _driver_url
+from app.services.sharding import SHARDED_TABLES, ShardMap, create_shard_tables
+from sqlalchemy import create_engine, delete, insert, select, text, update
+
+BATCH_SIZE = 500
+
+_engines = {}
+
+
+def parse_urls(value):
+    return [url.strip() for url in (value or '').split(',') if url.strip()]
+
+
+def engine_for(url):
+    if url not in _engines:
+        _engines[url] = create_engine(_driver_url(url))
+    return _engines[url]
+
+
+def placements(args):
+    """
+    Yield (user_id, old URL, new URL) for every user
+
+    The old list is --from, else CHAT_SHARD_URLS, else the primary
+    """
+    old_urls = parse_urls(args.source) or parse_urls(os.getenv('CHAT_SHARD_URLS')) or \
+        [os.getenv('DATABASE_URL', 'postgresql://postgres@localhost/chatbot_db')]
+    new_urls = parse_urls(args.target)
+    old_map, new_map = ShardMap(len(old_urls)), ShardMap(len(new_urls))
+    user_ids = db.session.execute(text('SELECT id FROM "user" ORDER BY id')).scalars().all()
+    for user_id in user_ids:
+        yield user_id, old_urls[old_map.shard_for_user(user_id)], new_urls[new_map.shard_for_user(user_id)]
+
+
+def _changed_at(row):
+    return max(filter(None, (row['updated_at'], row['archived_at'], row['rehydrated_at'])), default=datetime.min)
+
+
+def _chunks(values):
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+
+def copy_user(source, target, user_id):
+    """
+    Copy one user's chat data from the source to the target shard
+
+    Returns:
+        Counter: Rows written per table
+    """
+    tables = db.metadata.tables
+    chat, history, archive, rollup = (tables[name] for name in SHARDED_TABLES)
+    written = Counter()
+
+    with source.connect() as src, target.begin() as dst:
+        chats = src.execute(select(chat).where(chat.c.user_id == user_id)).mappings().all()
+        existing = {row['id']: row for row in
+                    dst.execute(select(chat).where(chat.c.user_id == user_id)).mappings()}
+
+        # New chats are inserted; chats that changed since the last copy are
+        # replaced together with their messages and archive
+        stale = [row for row in chats if row['id'] not in existing or
+                 _changed_at(row) > _changed_at(existing[row['id']])]
+        for row in stale:
+            if row['id'] in existing:
+                dst.execute(update(chat).where(chat.c.id == row['id']).values(dict(row)))
+            else:
+                dst.execute(insert(chat), [dict(row)])
+        written['chat'] += len(stale)
+
+        for chat_ids in _chunks([row['id'] for row in stale]):
+            for table in (history, archive):
+                dst.execute(delete(table).where(table.c.chat_id.in_(chat_ids)))
+                rows = [dict(row) for row in
+                        src.execute(select(table).where(table.c.chat_id.in_(chat_ids))).mappings()]
+                if rows:
+                    dst.execute(insert(table), rows)
+                written[table.name] += len(rows)
+
+        # Rollup counters only grow; keep the larger value of each
+        current = {row['day']: row for row in
+                   dst.execute(select(rollup).where(rollup.c.user_id == user_id)).mappings()}
+        counters = [column.name for column in rollup.columns if not column.primary_key]
+        for row in src.execute(select(rollup).where(rollup.c.user_id == user_id)).mappings():
+            mine = current.get(row['day'])
+            if mine is None:
+                dst.execute(insert(rollup), [dict(row)])
+            elif any(row[name] > mine[name] for name in counters):
+                dst.execute(update(rollup)
+                            .where(rollup.c.user_id == user_id, rollup.c.day == row['day'])
+                            .values({name: max(row[name], mine[name]) for name in counters}))
+            else:
+                continue
+            written[rollup.name] += 1
+    return written
+
+
+def delete_user(engine, user_id, execute):
+    """
+    Delete (or with execute=False, count) one user's chat data on a shard
+
+    Returns:
+        Counter: Rows per table
+    """
+    tables = db.metadata.tables
+    chat, history, archive, rollup = (tables[name] for name in SHARDED_TABLES)
+    counts = Counter()
+
+    with engine.begin() as connection:
+        chat_ids = connection.execute(select(chat.c.id).where(chat.c.user_id == user_id)).scalars().all()
+        for ids in _chunks(chat_ids):
+            for table in (history, archive):
+                if execute:
+                    counts[table.name] += connection.execute(delete(table).where(table.c.chat_id.in_(ids))).rowcount
+                else:
+                    counts[table.name] += connection.execute(
+                        select(db.func.count()).select_from(table).where(table.c.chat_id.in_(ids))).scalar()
+        for table in (chat, rollup):
+            if execute:
+                counts[table.name] += connection.execute(delete(table).where(table.c.user_id == user_id)).rowcount
+            else:
+                counts[table.name] += connection.execute(
+                    select(db.func.count()).select_from(table).where(table.c.user_id == user_id)).scalar()
+    return counts
+
+
+def plan(args):
+    """Print how many users each shard change moves"""
+    app = create_app()
+
+    with app.app_context():
+        moves = Counter()
+        total = 0
+        for _, old_url, new_url in placements(args):
+            total += 1
+            if old_url != new_url:
+                moves[(old_url, new_url)] += 1
+        print(f"=== Reshard plan: {sum(moves.values())} of {total} users move ===")
+        for (old_url, new_url), count in sorted(moves.items()):
+            print(f"{count:>8}  {old_url} -> {new_url}")
+        return True
+
+
+def copy(args):
+    """Copy the chat data of every moving user to its new shard"""
+    app = create_app()
+
+    with app.app_context():
+        print("=== Copying chat data to the new shards ===")
+        prepared = set()
+        written, users = Counter(), 0
+        try:
+            for user_id, old_url, new_url in placements(args):
+                if old_url == new_url:
+                    continue
+                if new_url not in prepared:
+                    with engine_for(new_url).begin() as connection:
+                        create_shard_tables(db, connection)
+                    prepared.add(new_url)
+                written.update(copy_user(engine_for(old_url), engine_for(new_url), user_id))
+                users += 1
+        except Exception as e:
+            print(f"❌ Copy failed: {e}")
+            return False
+
+        print(f"✅ Copied {users} users: " + ', '.join(f"{written[name]} {name}" for name in SHARDED_TABLES))
+        return True
+
+
+def cleanup(args):
+    """Delete chat data from the shards that no longer own it"""
+    app = create_app()
+
+    with app.app_context():
+        action = 'Deleting' if args.execute else 'Would delete (dry run, add --execute)'
+        print(f"=== {action} chat data of moved users from their old shards ===")
+        counts, users = Counter(), 0
+        try:
+            for user_id, old_url, new_url in placements(args):
+                if old_url != new_url:
+                    counts.update(delete_user(engine_for(old_url), user_id, args.execute))
+                    users += 1
+        except Exception as e:
+            print(f"❌ Cleanup failed: {e}")
+            return False
+
+        print(f"✅ {users} users: " + ', '.join(f"{counts[name]} {name}" for name in SHARDED_TABLES))
+        return True
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Move chat data between shards')
+    parser.add_argument('command', choices=['plan', 'copy', 'cleanup'])
+    parser.add_argument('--from', dest='source', help='Old shard URLs, comma-separated (default: current)')
+    parser.add_argument('--to', dest='target', required=True, help='New shard URLs, comma-separated')
+    parser.add_argument('--execute', action='store_true', help='cleanup: actually delete')
+    args = parser.parse_args()
+
+    commands = {'plan': plan, 'copy': copy, 'cleanup': cleanup}
+    if not commands[args.command](args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
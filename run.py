@@ -1,25 +1,18 @@
 """
 Bart Chatbot - Main Application Entry Point
 MVC Structure with Flask Application Factory
+
+Development server only. Production traffic is served through wsgi.py
+(see gunicorn.conf.py).
 """
 
+import os
 from app import create_app, db
 from app.models import User, Chat, ChatHistory
-from flask_login import LoginManager
 
 # Create the application
 app = create_app()
 
-# Configure login manager
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
-
-@login_manager.user_loader
-def load_user(user_id):
-    """Load user for Flask-Login"""
-    from app import db
-    return db.session.get(User, int(user_id))
-
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    debug = os.getenv('FLASK_DEBUG', '1').lower() in ('1', 'true', 'yes')
+    app.run(debug=debug, port=int(os.getenv('PORT', '5001')))
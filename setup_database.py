@@ -110,8 +110,8 @@ def create_tables(database_url):
         app = create_app()
         
         with app.app_context():
-            # Create all tables
-            db.create_all()
+            # Create all tables (on the primary)
+            db.create_all(bind_key=None)
             print("Database tables created successfully!")
             
             # Verify tables were created
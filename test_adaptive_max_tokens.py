@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Test max_tokens handling: a user's own cap is honoured by routing and never
+taught to the adaptive estimator, and any clamp is reported to the client
+"""
+
+import os
+import sys
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask_login import login_user
+from app import create_app, db
+from app.controllers.chat_controller import ChatController
+from app.models import Chat, User
+from app.services.generation import AnswerLengthEstimator
+from app.services.llm_providers import EchoProvider, ProviderRegistry
+from app.services.model_router import ModelRouter, ModelTier
+
+MESSAGES = [{'role': 'user', 'content': 'Hi there'}]
+
+
+class RecordingProvider(EchoProvider):
+    """Echo provider that keeps the model and max_tokens of every call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def _complete(self, messages, model, max_tokens, temperature, stop=None):
+        self.calls.append((model, max_tokens))
+        return super()._complete(messages, model, max_tokens, temperature, stop)
+
+
+class RecordingEstimator(AnswerLengthEstimator):
+    """Estimator that keeps every observed cap"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.observed = []
+
+    def observe(self, features, completion_tokens, max_tokens):
+        self.observed.append(max_tokens)
+        super().observe(features, completion_tokens, max_tokens)
+
+
+def make_router():
+    provider = RecordingProvider()
+    providers = ProviderRegistry(default='echo')
+    providers.register('echo', provider)
+    router = ModelRouter([ModelTier('small', 'echo', 'small-model', max_tokens=800),
+                          ModelTier('large', 'echo', 'large-model', max_tokens=2000)])
+    return router, providers, provider
+
+
+def test_router_honours_user_cap():
+    """A cap larger than the cheap tier's moves the turn up instead of being cut"""
+    print("Testing routing with a user max_tokens...")
+    router, providers, provider = make_router()
+
+    result = router.get_chat_response(providers, MESSAGES, max_tokens=1500)
+    assert provider.calls[-1] == ('large-model', 1500), provider.calls
+    assert result['tier'] == 'large' and not result.get('max_tokens_clamped'), result
+
+    result = router.get_chat_response(providers, MESSAGES, max_tokens=500)
+    assert provider.calls[-1] == ('small-model', 500)
+    assert not result.get('max_tokens_clamped')
+
+    # The adaptive size never changes the tier and is quietly capped
+    result = router.get_chat_response(providers, MESSAGES, suggested_max_tokens=1500)
+    assert provider.calls[-1] == ('small-model', 800)
+    assert not result.get('max_tokens_clamped')
+    print("✓ large caps route to the large tier; suggestions stay on the small one")
+
+    router.tiers[1].latency_ms = router.latency_slo_ms * 2
+    router.get_chat_response(providers, MESSAGES, max_tokens=1500)
+    assert provider.calls[-1] == ('large-model', 1500), provider.calls
+    print("✓ the latency target does not push a user cap onto a smaller tier")
+
+
+def test_clamp_is_reported():
+    """With the large tier's breaker open, the cap is lowered and flagged"""
+    print("Testing clamp reporting...")
+    router, providers, provider = make_router()
+    router.tiers[1].breaker.opened_at = float('inf')
+
+    result = router.get_chat_response(providers, MESSAGES, max_tokens=1500)
+    assert provider.calls[-1] == ('small-model', 800), provider.calls
+    assert result['success'] and result['max_tokens_clamped'], result
+    assert result['max_tokens'] == 800
+    print("✓ result flags max_tokens_clamped with the cap used")
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory`, plus one user and chat"""
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', 'CHAT_SHARD_URLS')}
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/app.db'
+    os.environ['CHAT_SHARD_URLS'] = ''
+    try:
+        app = create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    with app.app_context():
+        user = User(username='capper', email='capper@example.com')
+        db.session.add(user)
+        db.session.flush()
+        chat = Chat(title='Caps', user_id=user.id)
+        db.session.add(chat)
+        db.session.commit()
+        app.config['TEST_USER_ID'], app.config['TEST_CHAT_ID'] = user.id, chat.id
+    return app
+
+
+def test_user_cap_not_observed():
+    """Only answers generated under the adaptive size teach the estimator"""
+    print("Testing adaptive observations...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        controller = ChatController()
+        controller.router = None
+        controller.providers = ProviderRegistry(default='echo')
+        controller.providers.register('echo', RecordingProvider())
+        controller.answer_lengths = RecordingEstimator()
+
+        with app.test_request_context():
+            login_user(db.session.get(User, app.config['TEST_USER_ID']))
+            chat_id = app.config['TEST_CHAT_ID']
+            success, _, data = controller.send_message(chat_id, 'capped', settings={'max_tokens': 50})
+            assert success and data['max_tokens'] == 50 and not data['max_tokens_clamped'], data
+            assert controller.answer_lengths.observed == []
+
+            success, _, data = controller.send_message(chat_id, 'uncapped')
+            assert success, data
+            assert len(controller.answer_lengths.observed) == 1
+    print("✓ the user-capped answer was not observed")
+
+
+def main():
+    """Main test function."""
+    print("=== Adaptive max_tokens Test ===\n")
+
+    tests = [
+        test_router_honours_user_cap,
+        test_clamp_is_reported,
+        test_user_cap_not_observed
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
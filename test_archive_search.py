@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test that archived chats stay searchable: archive -> search -> rehydrate
+"""
+
+import os
+import sys
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Chat, ChatArchive, ChatHistory, User
+from app.services.archive import ArchiveStore, archive_chat, index_archives, rehydrate_chat
+from app.services.search import search
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory`"""
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', 'CHAT_SHARD_URLS')}
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/app.db'
+    os.environ['CHAT_SHARD_URLS'] = ''
+    try:
+        return create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def add_chat(username, title, exchanges):
+    """Create a user with one chat holding (question, answer) exchanges"""
+    user = User(username=username, email=f'{username}@example.com')
+    db.session.add(user)
+    db.session.flush()
+    chat = Chat(title=title, user_id=user.id)
+    db.session.add(chat)
+    db.session.flush()
+    for question, answer in exchanges:
+        db.session.add(ChatHistory(chat_id=chat.id, question=question, answer=answer))
+    db.session.commit()
+    return user, chat
+
+
+def test_archive_search_rehydrate():
+    """Archived messages match at the chat level, and per message once restored"""
+    print("Testing search across archive and rehydrate...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        with app.app_context():
+            store = ArchiveStore('database')
+            user, chat = add_chat('ada', 'Trip planning', [
+                ('Which trains go to Antioch?', 'The yellow line runs to Antioch.'),
+                ('Is there parking?', 'Most stations have parking lots.'),
+            ])
+            other, _ = add_chat('bob', 'Other', [('Antioch trains?', 'Yellow line.')])
+            user_id, other_id, chat_id = user.id, other.id, chat.id
+            hot = search(user_id, 'antioch')
+            assert len(hot['messages']) == 1 and not hot['archived_chats'], hot
+
+            assert archive_chat(chat, store) == 2
+            assert ChatHistory.query.filter_by(chat_id=chat_id).count() == 0
+            archived = search(user_id, 'antioch')
+            assert not archived['messages'], archived
+            assert [hit['chat_id'] for hit in archived['archived_chats']] == [chat_id], archived
+            assert '<mark>' in archived['archived_chats'][0]['snippet']
+            assert search(user_id, 'parking')['archived_chats'], "second message not indexed"
+            # Other users' archives and words not in the chat do not match
+            assert not search(other_id, 'parking')['archived_chats']
+            assert not search(user_id, 'helicopter')['archived_chats']
+            print("✓ archived chat found by its messages")
+
+            # Rebuilding the index keeps one entry per chat
+            assert index_archives(store) == 1
+            assert len(search(user_id, 'antioch')['archived_chats']) == 1
+
+            chat = db.session.get(Chat, chat_id)
+            assert rehydrate_chat(chat, store) == 2
+            restored = search(user_id, 'antioch')
+            assert len(restored['messages']) == 1, restored
+            assert not restored['archived_chats'], restored
+            assert ChatArchive.query.count() == 0
+            print("✓ rehydrated messages match individually again")
+
+
+def main():
+    """Main test function."""
+    print("=== Archive Search Test ===\n")
+
+    tests = [
+        test_archive_search_rehydrate
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test the benchmark harness: the fake OpenAI server speaks the API the app
+uses, and an end-to-end run produces a baseline that compare() can check
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.e2e import compare, percentile
+from benchmarks.fake_openai import FakeOpenAIServer
+from app.services.openai_service import OpenAIService
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MESSAGES = [{'role': 'user', 'content': 'What is a benchmark?'}]
+
+
+def test_openai_service_against_fake_server():
+    """Completions, streams, max_tokens and injected errors behave like the real API"""
+    print("Testing OpenAIService against the fake server...")
+    server = FakeOpenAIServer(completion_tokens=20).start()
+    try:
+        service = OpenAIService(api_key='bench', base_url=server.base_url)
+        result = service.get_chat_response(MESSAGES)
+        assert result['success'], result
+        assert result['response'].startswith('Echo: What is a benchmark?'), result['response']
+        assert result['usage']['completion_tokens'] == 20, result['usage']
+
+        capped = service.get_chat_response(MESSAGES, max_tokens=5)
+        assert capped['usage']['completion_tokens'] == 5, capped['usage']
+
+        tokens = []
+        streamed = service.stream_chat_response(MESSAGES, on_token=tokens.append)
+        assert streamed['success'] and len(tokens) == 20, (streamed, tokens)
+        assert ''.join(tokens) == streamed['response']
+        print("✓ completion, max_tokens cap and stream")
+
+        assert sorted(service.get_models()) == ['gpt-3.5-turbo', 'gpt-4o', 'gpt-4o-mini']
+        server.error_rate = 1.0
+        failed = service.get_chat_response(MESSAGES)
+        assert not failed['success'] and failed['error'], failed
+        assert server.stats['errors'] >= 1
+        print("✓ model list and injected server errors")
+    finally:
+        server.stop()
+
+
+def test_compare_flags_regressions():
+    """compare() fails on a slower p95 or lower throughput beyond the threshold"""
+    print("Testing baseline comparison...")
+    assert percentile([5, 1, 4, 2, 3], 50) == 3
+    assert percentile([], 95) == 0.0
+
+    baseline = {'operations': {'send_message': {'p95_ms': 100.0}}, 'throughput_rps': 50.0}
+    same = {'operations': {'send_message': {'p95_ms': 110.0}}, 'throughput_rps': 48.0}
+    slower = {'operations': {'send_message': {'p95_ms': 150.0}}, 'throughput_rps': 50.0}
+    fewer = {'operations': {'send_message': {'p95_ms': 100.0}}, 'throughput_rps': 30.0}
+    assert compare(same, baseline, 0.2)
+    assert not compare(slower, baseline, 0.2)
+    assert not compare(fewer, baseline, 0.2)
+    print("✓ regressions beyond the threshold fail")
+
+
+def test_e2e_run_saves_baseline():
+    """A small end-to-end run completes without errors and saves a usable baseline"""
+    print("Testing an end-to-end run...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'baseline.json')
+        env = dict(os.environ, CHAT_SHARD_URLS='', DATABASE_REPLICA_URLS='')
+        completed = subprocess.run(
+            [sys.executable, os.path.join(HERE, 'benchmarks', 'e2e.py'), '--users', '2', '--turns', '1',
+             '--reloads', '1', '--latency', '0', '--token-rate', '0', '--save-baseline', path,
+             '--compare', path, '--threshold', '10'],
+            cwd=HERE, env=env, capture_output=True, text=True, timeout=300)
+        assert completed.returncode == 0, completed.stdout[-2000:] + completed.stderr[-2000:]
+        with open(path) as f:
+            results = json.load(f)
+        operations = results['operations']
+        assert {'register', 'login', 'create_chat', 'send_message', 'dashboard'} <= set(operations), operations
+        assert all(stats['errors'] == 0 for stats in operations.values()), operations
+        assert results['upstream']['requests'] >= 2, results['upstream']
+        assert results['db_queries_per_request'], results
+        print(f"✓ {results['requests']} requests, baseline saved and compared")
+
+
+def main():
+    """Main test function."""
+    print("=== Benchmark Harness Test ===\n")
+
+    tests = [
+        test_openai_service_against_fake_server,
+        test_compare_flags_regressions,
+        test_e2e_run_saves_baseline
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test chat purging with CHAT_PURGE_ASYNC=false: a delete purges the chats it
+marked inside the request, and leaves other marked chats to the sweep
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Chat, ChatHistory, User
+from app.services.chat_purge import purge_deleted_chats, schedule_purge
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory` and synchronous purging"""
+    settings = {'DATABASE_URL': f'sqlite:///{directory}/app.db', 'CHAT_SHARD_URLS': '',
+                'CHAT_PURGE_ASYNC': 'false'}
+    saved = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    try:
+        return create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def add_marked_chats(username, count, messages=3):
+    """Create a user with `count` chats marked deleted; returns (user ID, chat IDs)"""
+    user = User(username=username, email=f'{username}@example.com')
+    db.session.add(user)
+    db.session.flush()
+    chat_ids = []
+    for number in range(count):
+        chat = Chat(title=f'{username} {number}', user_id=user.id, deleted_at=datetime.utcnow())
+        db.session.add(chat)
+        db.session.flush()
+        for index in range(messages):
+            db.session.add(ChatHistory(chat_id=chat.id, question=f'q{index}', answer=f'a{index}'))
+        chat_ids.append(chat.id)
+    db.session.commit()
+    return user.id, chat_ids
+
+
+def remaining(chat_ids):
+    return {chat_id for chat_id in chat_ids if db.session.get(Chat, chat_id) is not None}
+
+
+def test_sync_purge_is_scoped():
+    """Only the deleted chat, or the deleting user's chats, are purged in the request"""
+    print("Testing scoped synchronous purge...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        assert 'chat_purge' not in app.extensions
+        with app.app_context():
+            ada, ada_chats = add_marked_chats('ada', 2)
+            bob, bob_chats = add_marked_chats('bob', 2)
+
+            schedule_purge(app, None, user_id=ada, chat_id=ada_chats[0])
+            assert remaining(ada_chats + bob_chats) == {ada_chats[1]} | set(bob_chats)
+            assert ChatHistory.query.filter_by(chat_id=ada_chats[0]).count() == 0
+            print("✓ a single delete purged only that chat")
+
+            schedule_purge(app, None, user_id=ada)
+            assert remaining(ada_chats + bob_chats) == set(bob_chats)
+            print("✓ a bulk delete purged only the user's chats")
+
+            assert purge_deleted_chats() == {'chats': 2, 'messages': 6}
+            assert not remaining(bob_chats)
+            print("✓ the sweep purged the rest")
+
+
+def main():
+    """Main test function."""
+    print("=== Chat Purge Test ===\n")
+
+    tests = [
+        test_sync_purge_is_scoped
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Test the health checks behind /healthz and /readyz and the cached provider
+model catalogs they refresh
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.controllers.chat_controller import ChatController
+from app.services.health import HealthMonitor
+from app.services.llm_providers import EchoProvider, ProviderRegistry
+
+
+class CatalogProvider(EchoProvider):
+    """Echo provider with a model catalog that can go unreachable"""
+
+    def __init__(self):
+        self.fetches = 0
+        self.down = False
+
+    def list_models(self, timeout=None):
+        self.fetches += 1
+        if self.down:
+            raise ConnectionError('catalog unreachable')
+        return ['echo-small', 'echo-large']
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory`, probing only the echo provider"""
+    settings = {'DATABASE_URL': f'sqlite:///{directory}/app.db', 'CHAT_SHARD_URLS': '',
+                'HEALTH_CHECK_PROVIDERS': 'echo', 'HEALTH_CHECK_SECONDS': '0.1'}
+    saved = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    try:
+        return create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def make_monitor(app, **kwargs):
+    """Monitor over a CatalogProvider whose checks only run when asked"""
+    provider = CatalogProvider()
+    providers = ProviderRegistry(default='echo')
+    providers.register('echo', provider)
+    monitor = HealthMonitor(app, providers, ['echo'], interval=1.0, **kwargs)
+    monitor.close()
+    return monitor, provider
+
+
+def test_endpoints():
+    """/healthz answers at once; /readyz turns ready after the first background round"""
+    print("Testing /healthz and /readyz...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        client = app.test_client()
+        try:
+            assert client.get('/healthz').get_json() == {'status': 'ok'}
+
+            deadline = time.monotonic() + 5
+            response = client.get('/readyz')
+            while response.status_code != 200 and time.monotonic() < deadline:
+                time.sleep(0.05)
+                response = client.get('/readyz')
+            body = response.get_json()
+            assert response.status_code == 200 and body['status'] == 'ready', body
+            assert set(body['checks']) == {'database', 'provider:echo'}, body
+            assert body['checks']['database']['databases'] == 1
+            print("✓ readiness served from background checks")
+
+            started = time.perf_counter()
+            for _ in range(20):
+                client.get('/readyz')
+            per_request_ms = (time.perf_counter() - started) * 1000 / 20
+            assert per_request_ms < 10, per_request_ms
+            print(f"✓ /readyz answers from memory ({per_request_ms:.1f} ms)")
+        finally:
+            app.extensions['health'].close()
+
+
+def test_readiness_rules():
+    """Database failures and stale results fail readiness; provider failures only when required"""
+    print("Testing readiness rules...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        app.extensions['health'].close()
+
+        monitor, provider = make_monitor(app)
+        assert monitor.readiness() == (False, {'status': 'starting', 'checks': {}})
+        monitor.check_now()
+        ready, body = monitor.readiness()
+        assert ready and body['checks']['provider:echo']['models'] == 2, body
+
+        provider.down = True
+        monitor.check_now()
+        ready, body = monitor.readiness()
+        assert ready and body['checks']['provider:echo']['error'] == 'catalog unreachable', body
+        strict, provider = make_monitor(app, require_providers=True)
+        provider.down = True
+        strict.check_now()
+        assert strict.readiness()[0] is False
+        print("✓ provider failures fail readiness only with require_providers")
+
+        monitor.check_now()
+        monitor._results['database']['checked_at'] -= monitor.interval * 4
+        ready, body = monitor.readiness()
+        assert not ready and not body['checks']['database']['ok'], body
+        print("✓ stale database results fail readiness")
+
+        def database_down():
+            raise ConnectionError('database unreachable')
+
+        monitor._check_databases = database_down
+        monitor.check_now()
+        ready, body = monitor.readiness()
+        assert not ready and body['checks']['database']['error'] == 'database unreachable', body
+        print("✓ database failures fail readiness")
+
+
+def test_model_catalog_cache():
+    """get_models serves the cached catalog, the last known one on errors, and backs off"""
+    print("Testing the model catalog cache...")
+    provider = CatalogProvider()
+    saved = os.environ.get('MODEL_CATALOG_RETRY_SECONDS')
+    os.environ['MODEL_CATALOG_RETRY_SECONDS'] = '60'
+    try:
+        provider.down = True
+        assert provider.get_models() == ['echo'] and provider.fetches == 1
+        provider.down = False
+        assert provider.get_models() == ['echo'] and provider.fetches == 1
+        print("✓ unreachable catalog: default model served, retry backed off")
+
+        provider._models_retry_at = 0
+        assert provider.get_models() == ['echo-small', 'echo-large'] and provider.fetches == 2
+        assert provider.get_models() == ['echo-small', 'echo-large'] and provider.fetches == 2
+        print("✓ catalog fetched once and served from cache")
+
+        provider.down = True
+        assert provider.get_models(max_age=0) == ['echo-small', 'echo-large'] and provider.fetches == 3
+        assert provider.get_models(max_age=0) == ['echo-small', 'echo-large'] and provider.fetches == 3
+        print("✓ stale catalog: last known list served while the backend is down")
+    finally:
+        if saved is None:
+            os.environ.pop('MODEL_CATALOG_RETRY_SECONDS', None)
+        else:
+            os.environ['MODEL_CATALOG_RETRY_SECONDS'] = saved
+
+    controller = ChatController()
+    controller.providers = ProviderRegistry(default='echo')
+    controller.providers.register('echo', CatalogProvider())
+    assert controller.get_models() == (True, 'Models retrieved successfully', ['echo-small', 'echo-large'])
+    assert controller.get_models('nope') == (False, 'Unknown provider: nope', None)
+    print("✓ controller reports unknown providers")
+
+
+def main():
+    """Main test function."""
+    print("=== Health Test ===\n")
+
+    tests = [
+        test_endpoints,
+        test_readiness_rules,
+        test_model_catalog_cache
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test Idempotency-Key handling across worker processes: each controller
+stands in for a worker with its own in-process coalescing, and they share
+only the database
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask_login import login_user
+from app import create_app, db
+from app.controllers.chat_controller import ChatController
+from app.models import IdempotencyKey, User
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory`, plus one user"""
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', 'CHAT_SHARD_URLS')}
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/app.db'
+    os.environ['CHAT_SHARD_URLS'] = ''
+    try:
+        app = create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    with app.app_context():
+        user = User(username='retrier', email='retrier@example.com')
+        db.session.add(user)
+        db.session.commit()
+        app.config['TEST_USER_ID'] = user.id
+    return app
+
+
+class CountingSend:
+    """Stands in for the upstream call plus insert"""
+
+    def __init__(self, success=True, delay=0):
+        self.calls = 0
+        self.success = success
+        self.delay = delay
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if not self.success:
+            return False, 'upstream failed', None
+        return True, 'Message sent successfully', {'response': f'answer {self.calls}', 'timestamp': 'now'}
+
+
+def send_as_user(app, controller, key, send):
+    with app.test_request_context():
+        login_user(db.session.get(User, app.config['TEST_USER_ID']))
+        return controller._send_once(1, 'hello', key, None, send)
+
+
+def test_retry_on_another_worker_gets_original_result():
+    """A retry handled by a different worker returns the stored answer"""
+    print("Testing idempotent retry across workers...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        first_worker, second_worker = ChatController(), ChatController()
+        send = CountingSend()
+
+        first = send_as_user(app, first_worker, 'key-1', send)
+        retry = send_as_user(app, second_worker, 'key-1', send)
+        assert send.calls == 1, send.calls
+        assert first[:2] == retry[:2]
+        assert retry[2] == dict(first[2], coalesced=True), retry
+        print("✓ the second worker answered from the idempotency_keys table")
+
+        other = send_as_user(app, second_worker, 'key-2', send)
+        assert send.calls == 2 and other[2]['response'] == 'answer 2'
+        print("✓ a different key sends again")
+
+
+def test_concurrent_retry_waits_for_running_send():
+    """A retry arriving while another worker is still sending waits for its result"""
+    print("Testing concurrent retry across workers...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        first_worker, second_worker = ChatController(), ChatController()
+        send = CountingSend(delay=0.5)
+        results = {}
+
+        def first_request():
+            results['first'] = send_as_user(app, first_worker, 'key-1', send)
+
+        thread = threading.Thread(target=first_request)
+        thread.start()
+        time.sleep(0.1)
+        results['retry'] = send_as_user(app, second_worker, 'key-1', send)
+        thread.join()
+
+        assert send.calls == 1, send.calls
+        assert results['retry'][2]['response'] == results['first'][2]['response']
+        assert results['retry'][2]['coalesced']
+        print("✓ one upstream call for both requests")
+
+
+def test_failed_send_is_not_remembered():
+    """A failed send frees its key so the retry runs"""
+    print("Testing retry after failure...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        controller = ChatController()
+        assert send_as_user(app, controller, 'key-1', CountingSend(success=False))[0] is False
+        with app.app_context():
+            assert IdempotencyKey.query.count() == 0
+        send = CountingSend()
+        assert send_as_user(app, ChatController(), 'key-1', send)[0]
+        assert send.calls == 1
+        print("✓ the retry sent again")
+
+
+def main():
+    """Main test function."""
+    print("=== Idempotency Test ===\n")
+
+    tests = [
+        test_retry_on_another_worker_gets_original_result,
+        test_concurrent_retry_waits_for_running_send,
+        test_failed_send_is_not_remembered
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test the pluggable LLM providers: the registry, the shared chat/stream
+contract every provider gets from LLMProvider, and the OpenAI-compatible
+backend
+"""
+
+import os
+import sys
+import threading
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from app.services.llm_providers import (DEFAULT_SYSTEM_PROMPT, EchoProvider, LLMProvider, ProviderRegistry,
+                                        UnknownProviderError)
+
+MESSAGES = [{'role': 'user', 'content': 'one two three. four'}]
+
+
+class RecordingProvider(EchoProvider):
+    """Echo provider that keeps the messages it was sent"""
+
+    def __init__(self):
+        self.sent = []
+
+    def _complete(self, messages, model, max_tokens, temperature, stop=None):
+        self.sent.append(messages)
+        return super()._complete(messages, model, max_tokens, temperature, stop)
+
+
+class BrokenProvider(EchoProvider):
+    """Provider whose backend always fails"""
+
+    def _complete(self, messages, model, max_tokens, temperature, stop=None):
+        raise ConnectionError('backend down')
+
+    def _stream(self, messages, model, max_tokens, temperature, stop=None):
+        raise ConnectionError('backend down')
+        yield
+
+
+def expect_unknown(fn, text):
+    try:
+        fn()
+    except UnknownProviderError as e:
+        assert text in str(e), e
+        return
+    raise AssertionError(f"expected UnknownProviderError containing {text!r}")
+
+
+def test_registry():
+    """Providers are built once on first use; unknown or unconfigured names are refused"""
+    print("Testing the provider registry...")
+    built = []
+    registry = ProviderRegistry(default='echo', factories={'echo': lambda: built.append(1) or EchoProvider()})
+    assert registry.get() is registry.get('echo')
+    assert len(built) == 1
+    expect_unknown(lambda: registry.get('nope'), 'Unknown provider: nope')
+
+    replacement = RecordingProvider()
+    registry.register('echo', replacement)
+    registry.register('other', EchoProvider())
+    assert registry.get() is replacement
+    assert registry.names() == ['echo', 'other']
+    print("✓ built lazily and shared; register replaces; unknown names raise")
+
+    saved = os.environ.pop('LLM_COMPATIBLE_BASE_URL', None)
+    try:
+        expect_unknown(lambda: ProviderRegistry().get('compatible'), 'LLM_COMPATIBLE_BASE_URL')
+    finally:
+        if saved is not None:
+            os.environ['LLM_COMPATIBLE_BASE_URL'] = saved
+    assert isinstance(UnknownProviderError('x'), ValueError)
+    print("✓ an unconfigured backend raises UnknownProviderError")
+
+    try:
+        type('Incomplete', (LLMProvider,), {})()
+    except TypeError:
+        print("✓ a provider without _complete cannot be created")
+    else:
+        raise AssertionError('LLMProvider subclass without _complete was instantiated')
+
+
+def test_chat_contract():
+    """Every provider gets the system prompt, estimated usage, stop sequences and error results"""
+    print("Testing the chat contract...")
+    provider = RecordingProvider()
+    result = provider.get_chat_response(MESSAGES, max_tokens=50)
+    assert result['success'] and result['response'] == 'echo: one two three. four', result
+    assert provider.sent[-1][0] == {'role': 'system', 'content': DEFAULT_SYSTEM_PROMPT}
+    assert result['model'] == 'echo' and result['max_tokens'] == 50
+    usage = result['usage']
+    assert usage['estimated'] and usage['total_tokens'] == usage['prompt_tokens'] + usage['completion_tokens']
+    print("✓ system prompt added and usage estimated")
+
+    provider.get_chat_response(MESSAGES, system_prompt='Be brief.')
+    assert provider.sent[-1][0] == {'role': 'system', 'content': 'Be brief.'}
+    result = provider.get_chat_response(MESSAGES, stop=['.'])
+    assert result['response'] == 'echo: one two three', result
+    print("✓ per-call system prompt and stop sequences")
+
+    failed = BrokenProvider().get_chat_response(MESSAGES)
+    assert failed == {'success': False, 'error': 'backend down', 'response': None, 'usage': {}}, failed
+    failed = BrokenProvider().stream_chat_response(MESSAGES)
+    assert not failed['success'] and failed['error'] == 'backend down', failed
+    print("✓ backend errors returned, not raised")
+
+
+def test_stream_contract():
+    """Streams report each delta and stop early once cancelled"""
+    print("Testing the stream contract...")
+    provider = EchoProvider()
+    deltas = []
+    result = provider.stream_chat_response(MESSAGES, on_token=deltas.append)
+    assert deltas == ['echo: ', 'one ', 'two ', 'three. ', 'four'], deltas
+    assert result['success'] and result['response'] == ''.join(deltas) and not result['stopped']
+    assert result['usage']['completion_tokens'] == len(deltas)
+
+    cancel = threading.Event()
+
+    def cancel_after_two(delta):
+        deltas.append(delta)
+        if len(deltas) == 2:
+            cancel.set()
+
+    deltas = []
+    result = provider.stream_chat_response(MESSAGES, on_token=cancel_after_two, cancel=cancel)
+    assert result['stopped'] and result['response'] == 'echo: one ', result
+    print("✓ deltas streamed; cancel returns the partial answer")
+
+
+def test_compatible_provider():
+    """The compatible provider talks to any OpenAI-style server set in the environment"""
+    print("Testing the OpenAI-compatible provider...")
+    server = FakeOpenAIServer(completion_tokens=8).start()
+    settings = {'LLM_COMPATIBLE_BASE_URL': server.base_url, 'LLM_COMPATIBLE_MODEL': 'gpt-4o-mini'}
+    saved = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    try:
+        provider = ProviderRegistry(default='compatible').get()
+        assert provider.name == 'compatible' and provider.default_model == 'gpt-4o-mini'
+        result = provider.get_chat_response(MESSAGES)
+        assert result['success'] and result['model'] == 'gpt-4o-mini', result
+        assert result['usage']['completion_tokens'] == 8, result['usage']
+        assert 'gpt-4o-mini' in provider.get_models()
+        print("✓ chat and model list served by the configured server")
+    finally:
+        server.stop()
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def main():
+    """Main test function."""
+    print("=== LLM Providers Test ===\n")
+
+    tests = [
+        test_registry,
+        test_chat_contract,
+        test_stream_contract,
+        test_compatible_provider
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
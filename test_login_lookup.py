@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test the single-query login lookup and registration that relies on the
+database's unique constraints
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.controllers.auth_controller import AuthController
+from app.models import User
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory`"""
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', 'CHAT_SHARD_URLS')}
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/app.db'
+    os.environ['CHAT_SHARD_URLS'] = ''
+    try:
+        return create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextmanager
+def count_queries():
+    """Count the statements run on the primary engine"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_lookup_by_username_or_email():
+    """One query finds a user by username or any-case email; a username match wins"""
+    print("Testing login lookup...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        with app.app_context():
+            ada = User(username='ada', email='Ada.Lovelace@Example.com')
+            # Username that looks like another user's email
+            lookalike = User(username='ada.lovelace@example.com', email='other@example.com')
+            db.session.add_all([ada, lookalike])
+            db.session.commit()
+
+            with count_queries() as statements:
+                assert User.find_by_login('ada') is ada
+                assert User.find_by_login('ADA.LOVELACE@example.com') is ada
+                assert User.find_by_login('ada.lovelace@example.com') is lookalike
+                assert User.find_by_login('nobody') is None
+            assert len(statements) == 4, statements
+            print("✓ username, mixed-case email and misses each take one query")
+
+
+def test_registration_uses_unique_constraints():
+    """Duplicate usernames and any-case duplicate emails are reported without pre-checks"""
+    print("Testing registration conflicts...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        with app.test_request_context():
+            success, _, user = AuthController.register_user('ada', 'ada@example.com', 'secret-1')
+            assert success and user.id
+
+            assert AuthController.register_user('ada', 'new@example.com', 'secret-2')[:2] == \
+                (False, 'Username already exists')
+            assert AuthController.register_user('ada2', 'ADA@example.com', 'secret-2')[:2] == \
+                (False, 'Email already registered')
+            assert User.query.count() == 1
+            print("✓ conflicts mapped to the right message")
+
+            assert AuthController.login_user('Ada@Example.com', 'secret-1')[0]
+            assert not AuthController.login_user('ada', 'wrong')[0]
+            print("✓ login by email and by username")
+
+
+def main():
+    """Main test function."""
+    print("=== Login Lookup Test ===\n")
+
+    tests = [
+        test_lookup_by_username_or_email,
+        test_registration_uses_unique_constraints
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test the Prometheus /metrics endpoint: request, token and pool metrics are
+exported, and METRICS_TOKEN guards scrapes
+"""
+
+import os
+import sys
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.models import User
+from app.services.metrics import record_tokens
+
+
+def make_app(directory):
+    """App with metrics on and a SQLite database in `directory`"""
+    settings = {'DATABASE_URL': f'sqlite:///{directory}/app.db', 'CHAT_SHARD_URLS': '',
+                'METRICS_ENABLED': 'true', 'PROMETHEUS_MULTIPROC_DIR': ''}
+    saved = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    try:
+        return create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def sample(body, name, **labels):
+    """Value of one sample in a Prometheus text exposition, or None"""
+    wanted = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    for line in body.splitlines():
+        if line.startswith('#'):
+            continue
+        series, _, value = line.rpartition(' ')
+        metric, _, label_text = series.partition('{')
+        if metric == name and all(part in label_text for part in wanted.split(',') if part):
+            return float(value)
+    return None
+
+
+def test_metrics_exported():
+    """Request latency, tokens and pool capacity appear on /metrics"""
+    print("Testing exported metrics...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        client = app.test_client()
+        with app.app_context():
+            User.query.count()  # check out a pool connection
+        assert client.get('/healthz').status_code == 200
+        record_tokens('test-model', {'prompt_tokens': 30, 'completion_tokens': 12, 'cached_prompt_tokens': 8})
+
+        response = client.get('/metrics')
+        assert response.status_code == 200, response.status_code
+        assert response.content_type.startswith('text/plain'), response.content_type
+        body = response.get_data(as_text=True)
+        assert sample(body, 'bart_http_request_duration_seconds_count', endpoint='health.healthz') >= 1
+        assert sample(body, 'bart_openai_tokens_total', model='test-model', direction='in') == 30
+        assert sample(body, 'bart_openai_tokens_total', model='test-model', direction='out') == 12
+        assert sample(body, 'bart_openai_tokens_total', model='test-model', direction='cached') == 8
+        assert sample(body, 'bart_db_pool_size') > 0
+        # Scrapes are not timed as requests
+        assert sample(body, 'bart_http_request_duration_seconds_count', endpoint='metrics.metrics') is None
+        print("✓ request, token and pool metrics exported")
+
+
+def test_metrics_token_required():
+    """With METRICS_TOKEN set, only 'Bearer <token>' may scrape"""
+    print("Testing METRICS_TOKEN...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        client = app.test_client()
+        saved = os.environ.get('METRICS_TOKEN')
+        os.environ['METRICS_TOKEN'] = 's3cret-token'
+        try:
+            assert client.get('/metrics').status_code == 401
+            for header in ('Bearer wrong', 'Basic s3cret-token', 'Digest s3cret-token', 's3cret-token'):
+                status = client.get('/metrics', headers={'Authorization': header}).status_code
+                assert status == 401, (header, status)
+            assert client.get('/metrics', headers={'Authorization': 'Bearer s3cret-token'}).status_code == 200
+        finally:
+            if saved is None:
+                os.environ.pop('METRICS_TOKEN', None)
+            else:
+                os.environ['METRICS_TOKEN'] = saved
+        print("✓ missing, wrong and mis-schemed tokens rejected")
+
+
+def main():
+    """Main test function."""
+    print("=== Metrics Test ===\n")
+
+    tests = [
+        test_metrics_exported,
+        test_metrics_token_required
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Test the model router: complexity routing, circuit breakers and fallback to
+a cheaper tier, and the no-splice rule for streams
+"""
+
+import os
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.llm_providers import EchoProvider, ProviderRegistry
+from app.services.model_router import CircuitBreaker, ModelRouter, ModelTier
+
+SIMPLE = [{'role': 'user', 'content': 'Hi there'}]
+COMPLEX = [{'role': 'user', 'content': 'Explain why this fails:\n```\ndef f(): return g()\n```'}]
+
+
+class FlakyProvider(EchoProvider):
+    """Echo provider that can fail, optionally after streaming a token"""
+
+    def __init__(self):
+        self.failing = False
+        self.partial = False
+        self.calls = 0
+
+    def _complete(self, messages, model, max_tokens, temperature, stop=None):
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError('upstream unavailable')
+        return super()._complete(messages, model, max_tokens, temperature, stop)
+
+    def _stream(self, messages, model, max_tokens, temperature, stop=None):
+        self.calls += 1
+        if self.failing:
+            if self.partial:
+                yield 'partial '
+            raise ConnectionError('upstream unavailable')
+        yield from super()._stream(messages, model, max_tokens, temperature, stop)
+
+
+def make_router(failures=2, reset=0.2):
+    small, large = FlakyProvider(), FlakyProvider()
+    providers = ProviderRegistry(default='small')
+    providers.register('small', small)
+    providers.register('large', large)
+    router = ModelRouter([
+        ModelTier('small', 'small', 'small-model', max_tokens=800, breaker=CircuitBreaker(failures, reset)),
+        ModelTier('large', 'large', 'large-model', max_tokens=2000, breaker=CircuitBreaker(failures, reset))
+    ])
+    return router, providers, small, large
+
+
+def test_complexity_routing():
+    """Simple turns go to the cheap tier, code and reasoning to the large one"""
+    print("Testing complexity routing...")
+    router, providers, small, large = make_router()
+    assert router.route(SIMPLE).tier.name == 'small'
+    decision = router.route(COMPLEX)
+    assert decision.tier.name == 'large' and decision.features['has_code'] and decision.features['reasoning']
+    assert [tier.name for tier in decision.fallbacks] == ['small']
+
+    result = router.get_chat_response(providers, COMPLEX)
+    assert result['success'] and result['tier'] == 'large' and result['model'] == 'large-model', result
+    assert router.tiers[1].latency_ms is not None
+    print("✓ complex turn routed to the large tier, with the small one as fallback")
+
+
+def test_circuit_breaker():
+    """The breaker opens after consecutive failures and lets one probe through per timeout"""
+    print("Testing the circuit breaker...")
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.is_open()
+    breaker.record_failure()
+    assert breaker.is_open() and not breaker.allow()
+
+    time.sleep(0.25)
+    assert breaker.allow(), 'half-open breaker should let a probe through'
+    assert not breaker.allow(), 'only one probe per timeout'
+    breaker.record_success()
+    assert not breaker.is_open() and breaker.allow() and breaker.failures == 0
+    print("✓ opens at the threshold, probes once, closes on success")
+
+
+def test_fallback_to_cheaper_tier():
+    """A failing tier falls back to the cheaper one, then is skipped while its breaker is open"""
+    print("Testing fallback...")
+    router, providers, small, large = make_router()
+    large.failing = True
+
+    for _ in range(2):
+        result = router.get_chat_response(providers, COMPLEX)
+        assert result['success'] and result['tier'] == 'small', result
+    assert large.calls == 2 and router.tiers[1].breaker.is_open()
+    print("✓ failed large calls answered by the small tier")
+
+    decision = router.route(COMPLEX)
+    assert decision.tier.name == 'small' and 'large:breaker_open' in decision.reasons, decision.reasons
+    router.get_chat_response(providers, COMPLEX)
+    assert large.calls == 2, 'open breaker should skip the large tier'
+    print("✓ open breaker routes straight to the small tier")
+
+    large.failing = False
+    time.sleep(0.25)
+    result = router.get_chat_response(providers, COMPLEX)
+    assert result['tier'] == 'large' and not router.tiers[1].breaker.is_open(), result
+    print("✓ after the reset timeout a probe closes the breaker")
+
+    small.failing = True
+    large.failing = True
+    result = router.get_chat_response(providers, SIMPLE)
+    assert not result['success'] and result['tier'] == 'small', result
+    print("✓ when every tier fails the error is returned")
+
+
+def test_stream_not_spliced():
+    """A stream that failed after emitting tokens is not retried on another tier"""
+    print("Testing stream fallback...")
+    router, providers, small, large = make_router()
+    large.failing = True
+    tokens = []
+    result = router.stream_chat_response(providers, COMPLEX, on_token=tokens.append)
+    assert result['success'] and result['tier'] == 'small', result
+    assert ''.join(tokens) == result['response']
+    print("✓ a stream that failed before any token fell back")
+
+    large.partial = True
+    tokens = []
+    result = router.stream_chat_response(providers, COMPLEX, on_token=tokens.append)
+    assert not result['success'] and result['tier'] == 'large', result
+    assert tokens == ['partial '] and small.calls == 1, (tokens, small.calls)
+    print("✓ a stream that failed mid-answer was not retried")
+
+
+def test_from_env():
+    """MODEL_TIERS and ROUTER_* configure the tiers and breakers"""
+    print("Testing configuration...")
+    settings = {
+        'MODEL_TIERS': '[{"name": "only", "provider": "echo", "model": "echo", "max_tokens": 100}]',
+        'ROUTER_BREAKER_FAILURES': '3',
+        'ROUTER_BREAKER_RESET_SECONDS': '7'
+    }
+    saved = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    try:
+        router = ModelRouter.from_env()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    [tier] = router.tiers
+    assert (tier.name, tier.max_tokens, tier.breaker.failure_threshold, tier.breaker.reset_timeout) == \
+        ('only', 100, 3, 7.0)
+    print("✓ tiers and breaker settings read from the environment")
+
+
+def main():
+    """Main test function."""
+    print("=== Model Router Test ===\n")
+
+    tests = [
+        test_complexity_routing,
+        test_circuit_breaker,
+        test_fallback_to_cheaper_tier,
+        test_stream_not_spliced,
+        test_from_env
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test OneLoginService against the local fake OneLogin server: cached
+discovery and JWKS, local ID token validation, nonce checks and the
+userinfo fallback
+"""
+
+import os
+import secrets
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fake_onelogin import FakeOneLoginServer
+from app.services.onelogin_service import OneLoginError, OneLoginService
+
+
+def make_service(server, **kwargs):
+    return OneLoginService(issuer=server.issuer, client_id=server.client_id,
+                           client_secret=server.client_secret, **kwargs)
+
+
+def login(service, server):
+    nonce = secrets.token_urlsafe(8)
+    return service.login(server.issue_code(nonce), nonce=nonce)
+
+
+def expect_error(fn, text):
+    try:
+        fn()
+    except OneLoginError as e:
+        assert text in str(e), e
+        return
+    raise AssertionError(f"expected OneLoginError containing {text!r}")
+
+
+def test_discovery_and_jwks_cached():
+    """Repeat logins reuse discovery and keys; a rotated key refetches the JWKS once"""
+    print("Testing discovery and JWKS caching...")
+    server = FakeOneLoginServer().start()
+    try:
+        service = make_service(server)
+        for _ in range(3):
+            user = login(service, server)
+            assert user['email'] == server.user['email'], user
+        assert server.hits['/.well-known/openid-configuration'] == 1, server.hits
+        assert server.hits['/certs'] == 1, server.hits
+        print("✓ 3 logins, 1 discovery and 1 JWKS request")
+
+        server.rotate_key()
+        login(service, server)
+        assert server.hits['/certs'] == 2, server.hits
+        assert server.hits['/.well-known/openid-configuration'] == 1
+        print("✓ an unknown key ID refreshed the JWKS once")
+    finally:
+        server.stop()
+
+
+def test_id_token_validated_locally():
+    """Tokens with a foreign signature, wrong audience or wrong nonce are rejected"""
+    print("Testing ID token validation...")
+    server = FakeOneLoginServer().start()
+    try:
+        service = make_service(server)
+        now = int(time.time())
+        claims = {'iss': server.issuer, 'aud': server.client_id, 'sub': '1001', 'iat': now, 'exp': now + 300}
+        genuine = server._id_token(None)
+        assert service.validate_id_token(genuine)['sub'] == server.user['sub']
+
+        forger = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        forged = jwt.encode(claims, forger, algorithm='RS256', headers={'kid': server._kid})
+        expect_error(lambda: service.validate_id_token(forged), 'Invalid ID token')
+
+        other_audience = jwt.encode(dict(claims, aud='someone-else'), server._key, algorithm='RS256',
+                                    headers={'kid': server._kid})
+        expect_error(lambda: service.validate_id_token(other_audience), 'Invalid ID token')
+
+        expired = jwt.encode(dict(claims, iat=now - 900, exp=now - 600), server._key, algorithm='RS256',
+                             headers={'kid': server._kid})
+        expect_error(lambda: service.validate_id_token(expired), 'Invalid ID token')
+        print("✓ foreign signature, other audience and expired tokens rejected")
+
+        code = server.issue_code('sent-nonce')
+        expect_error(lambda: service.login(code, nonce='other-nonce'), 'nonce mismatch')
+        print("✓ nonce mismatch rejected")
+    finally:
+        server.stop()
+
+
+def test_userinfo_fallback():
+    """Without a profile in the ID token, the userinfo endpoint supplies it"""
+    print("Testing userinfo fallback...")
+    server = FakeOneLoginServer(profile_in_id_token=False).start()
+    try:
+        service = make_service(server)
+        user = login(service, server)
+        assert user == {'one_login_id': '1001', 'email': server.user['email'],
+                        'name': server.user['name'], 'faceDescriptor': []}, user
+        assert server.hits['/me'] == 1, server.hits
+        print("✓ profile fetched from userinfo")
+
+        bad_client = OneLoginService(issuer=server.issuer, client_id=server.client_id, client_secret='wrong')
+        expect_error(lambda: login(bad_client, server), 'Bad client credentials')
+        print("✓ bad client credentials reported")
+    finally:
+        server.stop()
+
+
+def main():
+    """Main test function."""
+    print("=== OneLogin Test ===\n")
+
+    tests = [
+        test_discovery_and_jwks_cached,
+        test_id_token_validated_locally,
+        test_userinfo_fallback
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test monthly chat history partitions: month arithmetic, which partitions
+ensure_partitions creates, and the no-op behaviour off PostgreSQL
+
+PostgreSQL is not needed: partition planning runs against a recording
+connection that reports a partitioned table with the given partitions.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date, datetime
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.services.partitions import (add_months, convert, detach_partitions, ensure_partitions, list_partitions,
+                                     month_start, partition_name)
+
+
+class Result:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.value
+
+
+class RecordingConnection:
+    """Stand-in for a PostgreSQL connection whose chat_histories has `partitions`"""
+
+    class dialect:
+        name = 'postgresql'
+
+    def __init__(self, partitions):
+        self.partitions = [
+            {'name': name, 'bound': bound, 'rows': 0, 'bytes': 8192} for name, bound in partitions
+        ]
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if 'pg_partitioned_table' in sql:
+            return Result(True)
+        if 'pg_inherits' in sql:
+            return Result(self.partitions)
+        self.statements.append(' '.join(sql.split()))
+        return Result(None)
+
+
+def monthly(month):
+    return partition_name(month), f"FOR VALUES FROM ('{month} 00:00:00') TO ('{add_months(month, 1)} 00:00:00')"
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory`"""
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', 'CHAT_SHARD_URLS')}
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/app.db'
+    os.environ['CHAT_SHARD_URLS'] = ''
+    try:
+        return create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def test_month_arithmetic():
+    """Months roll over years in both directions"""
+    print("Testing month arithmetic...")
+    assert month_start(datetime(2026, 10, 19, 13, 5)) == date(2026, 10, 1)
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2027, 1, 1)) == 'chat_histories_2027_01'
+    print("✓ month starts, offsets and partition names")
+
+
+def test_ensure_partitions():
+    """Missing months up to months_ahead are created; covered months are skipped"""
+    print("Testing partition creation...")
+    today = date(2026, 11, 19)
+    connection = RecordingConnection([
+        ('chat_histories_default', 'DEFAULT'),
+        monthly(date(2026, 12, 1)),
+    ])
+    created = ensure_partitions(connection, months_ahead=3, today=today)
+    assert created == ['chat_histories_2026_11', 'chat_histories_2027_01', 'chat_histories_2027_02'], created
+    assert connection.statements[0] == (
+        "CREATE TABLE IF NOT EXISTS chat_histories_2026_11 PARTITION OF chat_histories "
+        "FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')"), connection.statements[0]
+    print("✓ this month and the next three, across the year boundary")
+
+    # The legacy partition covers everything before its upper bound
+    connection = RecordingConnection([
+        ('chat_histories_legacy', "FOR VALUES FROM (MINVALUE) TO ('2026-12-01 00:00:00')"),
+    ])
+    created = ensure_partitions(connection, months_ahead=1, today=today)
+    assert created == ['chat_histories_2026_12'], created
+    print("✓ months inside the legacy range are not created")
+
+    partitions = list_partitions(RecordingConnection([monthly(date(2026, 12, 1))]))
+    assert partitions[0]['month'] == date(2026, 12, 1) and partitions[0]['upper'] == date(2027, 1, 1)
+    print("✓ partition bounds parsed")
+
+
+def test_detach_partitions():
+    """Partitions ending on or before the cut-off are detached into the archive schema"""
+    print("Testing partition detach...")
+    connection = RecordingConnection([
+        ('chat_histories_legacy', "FOR VALUES FROM (MINVALUE) TO ('2026-09-01 00:00:00')"),
+        monthly(date(2026, 9, 1)),
+        monthly(date(2026, 10, 1)),
+        ('chat_histories_default', 'DEFAULT'),
+    ])
+    detached = detach_partitions(connection, date(2026, 10, 15))
+    assert detached == ['chat_histories_legacy', 'chat_histories_2026_09'], detached
+    assert connection.statements == [
+        'CREATE SCHEMA IF NOT EXISTS archive',
+        'ALTER TABLE chat_histories DETACH PARTITION chat_histories_legacy',
+        'ALTER TABLE chat_histories_legacy SET SCHEMA archive',
+        'ALTER TABLE chat_histories DETACH PARTITION chat_histories_2026_09',
+        'ALTER TABLE chat_histories_2026_09 SET SCHEMA archive',
+    ], connection.statements
+    print("✓ old months detached; the current month and DEFAULT kept")
+
+
+def test_plain_table_elsewhere():
+    """On SQLite every partition function is a no-op and convert refuses"""
+    print("Testing databases without partitioning...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        with app.app_context(), db.engine.connect() as connection:
+            assert ensure_partitions(connection) == []
+            assert list_partitions(connection) == []
+            assert detach_partitions(connection, date.today()) == []
+            try:
+                convert(connection)
+            except RuntimeError as e:
+                assert 'PostgreSQL' in str(e), e
+            else:
+                raise AssertionError('convert should refuse SQLite')
+    print("✓ no-ops on SQLite; convert needs PostgreSQL")
+
+
+def main():
+    """Main test function."""
+    print("=== Partitions Test ===\n")
+
+    tests = [
+        test_month_arithmetic,
+        test_ensure_partitions,
+        test_detach_partitions,
+        test_plain_table_elsewhere
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
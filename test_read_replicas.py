@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Test read replica routing: read-only paths use the replica, users read
+their own writes, and lagging or missing replicas fall back to the primary
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.models import Chat, ChatHistory, User
+import app.services.db_routing as db_routing
+
+STICKY_SECONDS = 0.3
+
+
+def make_app(directory, replica_url=None):
+    """App with a SQLite primary and one replica (a copy taken by replicate())"""
+    settings = {
+        'DATABASE_URL': f'sqlite:///{directory}/primary.db',
+        'DATABASE_REPLICA_URLS': replica_url or f'sqlite:///{directory}/replica.db',
+        'CHAT_SHARD_URLS': '',
+        'REPLICA_STICKY_SECONDS': str(STICKY_SECONDS),
+        'REPLICA_CHECK_SECONDS': '0',
+    }
+    saved = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    try:
+        app = create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    with app.app_context():
+        user = User(username='reader', email='reader@example.com', password_hash=generate_password_hash('secret'))
+        db.session.add(user)
+        db.session.flush()
+        chat = Chat(title='Replica test', user_id=user.id)
+        db.session.add(chat)
+        db.session.flush()
+        db.session.add(ChatHistory(chat_id=chat.id, question='first', answer='one'))
+        db.session.commit()
+        app.config['TEST_CHAT_ID'] = chat.id
+    return app
+
+
+def replicate(directory):
+    """Copy the primary to the replica, like streaming replication catching up"""
+    source = sqlite3.connect(f'{directory}/primary.db')
+    target = sqlite3.connect(f'{directory}/replica.db')
+    source.backup(target)
+    source.close()
+    target.close()
+
+
+def add_message_on_primary(app, question):
+    """Commit a message the replica has not received yet"""
+    with app.app_context():
+        db.session.add(ChatHistory(chat_id=app.config['TEST_CHAT_ID'], question=question, answer='...'))
+        db.session.commit()
+
+
+def login(app):
+    client = app.test_client()
+    response = client.post('/auth/login', data={'username': 'reader', 'password': 'secret'})
+    assert response.status_code == 302, response.status_code
+    return client
+
+
+def message_count(app, client):
+    response = client.get(f"/chat/api/chat/{app.config['TEST_CHAT_ID']}")
+    assert response.status_code == 200, response.status_code
+    return len(response.get_json()['messages'])
+
+
+def test_reads_use_replica_and_stick_after_writes():
+    """Reads come from the replica, except right after the user wrote"""
+    print("Testing replica reads and read-your-writes...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        replicate(directory)
+        add_message_on_primary(app, 'second')
+        client = login(app)
+        time.sleep(STICKY_SECONDS)
+
+        # The replica does not have the second message yet
+        assert message_count(app, client) == 1
+        print("✓ chat reads are served by the replica")
+
+        response = client.put(f"/chat/api/chat/{app.config['TEST_CHAT_ID']}/settings", json={'temperature': 0.5})
+        assert response.status_code == 200, response.get_json()
+        cookies = response.headers.getlist('Set-Cookie')
+        assert any(cookie.startswith(f'{db_routing.WRITE_STAMP_COOKIE}=') for cookie in cookies), cookies
+        # The write is stamped without saving the session
+        assert not any(cookie.startswith(f"{app.config['SESSION_COOKIE_NAME']}=") for cookie in cookies), cookies
+        assert message_count(app, client) == 2
+        print("✓ a user who just wrote reads from the primary")
+
+        time.sleep(STICKY_SECONDS + 0.1)
+        assert message_count(app, client) == 1
+        client.set_cookie(db_routing.WRITE_STAMP_COOKIE, str(time.time() + 60))
+        assert message_count(app, client) == 1, "unsigned stamp was trusted"
+        other = login(app)
+        time.sleep(STICKY_SECONDS + 0.1)
+        assert message_count(app, other) == 1
+        print("✓ reads return to the replica after REPLICA_STICKY_SECONDS")
+
+
+def test_lagging_replica_is_skipped():
+    """A replica further behind than REPLICA_MAX_LAG_SECONDS is not used"""
+    print("Testing lag fallback...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        replicate(directory)
+        add_message_on_primary(app, 'second')
+        client = login(app)
+        time.sleep(STICKY_SECONDS)
+
+        saved = db_routing.LAG_QUERIES.get('sqlite')
+        db_routing.LAG_QUERIES['sqlite'] = 'SELECT 100'
+        try:
+            assert message_count(app, client) == 2
+            assert app.extensions['replicas'].replicas[0].lag == 100
+        finally:
+            if saved is None:
+                db_routing.LAG_QUERIES.pop('sqlite', None)
+            else:
+                db_routing.LAG_QUERIES['sqlite'] = saved
+        assert message_count(app, client) == 1
+        print("✓ lagging replica skipped, and used again once caught up")
+
+
+def test_missing_replica_falls_back_to_primary():
+    """An unreachable replica is marked down and reads go to the primary"""
+    print("Testing unreachable replica...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory, replica_url=f'sqlite:///{directory}/missing/replica.db')
+        client = login(app)
+        time.sleep(STICKY_SECONDS)
+
+        assert message_count(app, client) == 1
+        replica = app.extensions['replicas'].replicas[0]
+        assert replica.down_until > time.monotonic(), replica.down_until
+        assert message_count(app, client) == 1
+        print("✓ reads succeed on the primary while the replica is down")
+
+
+def main():
+    """Main test function."""
+    print("=== Read Replica Test ===\n")
+
+    tests = [
+        test_reads_use_replica_and_stick_after_writes,
+        test_lagging_replica_is_skipped,
+        test_missing_replica_falls_back_to_primary
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test message and title search on the SQLite FTS5 backend and on the LIKE
+fallback used by databases without full-text search
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from app import create_app, db
+from app.models import Chat, ChatHistory, User
+from app.services.search import fts5_query, search, search_backend
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory`"""
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', 'CHAT_SHARD_URLS')}
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/app.db'
+    os.environ['CHAT_SHARD_URLS'] = ''
+    try:
+        return create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def drop_full_text_search():
+    """Remove the FTS5 tables and triggers, as on a SQLite built without FTS5"""
+    for trigger in ('chat_search_insert', 'chat_search_update', 'chat_search_delete',
+                    'chat_title_search_insert', 'chat_title_search_update', 'chat_title_search_delete'):
+        db.session.execute(text(f'DROP TRIGGER {trigger}'))
+    db.session.execute(text('DROP TABLE chat_search'))
+    db.session.execute(text('DROP TABLE chat_title_search'))
+    db.session.commit()
+
+
+def add_chats():
+    """Two users with overlapping messages; returns (ada's ID, {title: chat ID})"""
+    ada = User(username='ada', email='ada@example.com')
+    bob = User(username='bob', email='bob@example.com')
+    db.session.add_all([ada, bob])
+    db.session.flush()
+    chats = {}
+    for user, title, exchanges in [
+        (ada, 'Train timetables', [('Which trains go to Antioch?', 'The yellow line runs to Antioch.'),
+                                   ('Is there parking?', 'Use <b>lot</b> 3 & the garage.')]),
+        (ada, 'Cooking', [('How long to boil an egg?', 'About nine minutes; trains of thought vary.'),
+                          ('Is it 100% done?', 'Name it boiled_egg.')]),
+        (ada, 'Old trains', [('Steam trains?', 'Gone.')]),
+        (bob, 'Bob trains', [('Which trains go to Antioch?', 'Same line.')]),
+    ]:
+        chat = Chat(title=title, user_id=user.id)
+        db.session.add(chat)
+        db.session.flush()
+        for question, answer in exchanges:
+            db.session.add(ChatHistory(chat_id=chat.id, question=question, answer=answer))
+        chats[title] = chat.id
+    db.session.get(Chat, chats['Old trains']).deleted_at = datetime.utcnow()
+    db.session.commit()
+    return ada.id, chats
+
+
+def test_fts5_query():
+    """Free text becomes quoted terms scoped to the owner; punctuation alone is no query"""
+    print("Testing FTS5 query building...")
+    assert fts5_query('trains "OR" antioch', 7) == 'owner:u7 AND - owner: ("trains" "OR" "antioch")'
+    assert fts5_query('anti', 7, prefix=True).endswith('("anti"*)')
+    assert fts5_query('?!', 7) == ''
+    print("✓ operators quoted, prefix opt-in, empty queries detected")
+
+
+def test_sqlite_fts():
+    """FTS5 search is stemmed, ranked, owner-scoped, highlighted and escaped"""
+    print("Testing the SQLite FTS5 backend...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        with app.app_context():
+            ada, chats = add_chats()
+            assert search_backend() == 'sqlite'
+
+            results = search(ada, 'train')
+            found = [message['chat_id'] for message in results['messages']]
+            # Question matches outrank answer matches; bob's and deleted chats never match
+            assert found == [chats['Train timetables'], chats['Cooking']], found
+            assert '<mark>trains</mark>' in results['messages'][0]['snippet'], results['messages'][0]
+            assert [chat['chat_id'] for chat in results['chats']] == [chats['Train timetables']], results['chats']
+            assert results['chats'][0]['snippet'] == '<mark>Train</mark> timetables'
+            print("✓ stemmed, ranked and limited to the user's live chats")
+
+            snippet = search(ada, 'garage')['messages'][0]['snippet']
+            assert '&lt;b&gt;lot&lt;/b&gt; 3 &amp; the <mark>garage</mark>' in snippet, snippet
+            print("✓ snippets HTML-escaped around the <mark> tags")
+
+            prefix = search(ada, 'Antio')
+            assert [message['chat_id'] for message in prefix['messages']] == [chats['Train timetables']], prefix
+            print("✓ a partial last word falls back to a prefix match")
+
+            scoped = search(ada, 'trains', chat_id=chats['Cooking'])
+            assert [message['chat_id'] for message in scoped['messages']] == [chats['Cooking']]
+            assert scoped['chats'] == []
+            page = search(ada, 'trains', limit=1, offset=1)
+            assert [message['chat_id'] for message in page['messages']] == [chats['Cooking']], page
+            assert search(ada, '!!') == {'messages': [], 'chats': [], 'archived_chats': []}
+            print("✓ chat filter, pagination and empty queries")
+
+
+def test_like_fallback():
+    """Without FTS5 the LIKE fallback finds substrings, case-insensitively and literally"""
+    print("Testing the LIKE fallback...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        with app.app_context():
+            drop_full_text_search()
+            ada, chats = add_chats()
+            assert search_backend() == 'like'
+
+            results = search(ada, 'ANTIOCH')
+            assert [message['chat_id'] for message in results['messages']] == [chats['Train timetables']], results
+            assert '<mark>Antioch</mark>' in results['messages'][0]['snippet'], results['messages'][0]
+            titles = search(ada, 'train')['chats']
+            assert [chat['chat_id'] for chat in titles] == [chats['Train timetables']], titles
+            print("✓ substring matches limited to the user's live chats")
+
+            snippet = search(ada, 'lot</b> 3 &')['messages'][0]['snippet']
+            assert snippet == 'Use &lt;b&gt;<mark>lot&lt;/b&gt; 3 &amp;</mark> the garage.', snippet
+            print("✓ snippets HTML-escaped around the <mark> tags")
+
+            results = search(ada, '100%')
+            assert [message['snippet'] for message in results['messages']] == ['Is it <mark>100%</mark> done?'], results
+            assert len(search(ada, 'd_egg')['messages']) == 1
+            assert len(search(ada, '%')['messages']) == 1
+            assert search(ada, 'n_')['messages'] == []
+            print("✓ %, _ in the query match literally, not as wildcards")
+
+
+def main():
+    """Main test function."""
+    print("=== Search Test ===\n")
+
+    tests = [
+        test_fts5_query,
+        test_sqlite_fts,
+        test_like_fallback
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Test chat data sharding: users' data lands on their shard, resharding
+moves only the users whose shard changed, and IDs from concurrent worker
+processes never collide
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Chat, ChatHistory, User
+from app.services.sharding import chat_shard, jump_hash, user_shard
+
+SHARDS = 2
+
+
+def shard_urls(directory, count):
+    return ','.join(f'sqlite:///{directory}/shard{i}.db' for i in range(count))
+
+
+@contextmanager
+def environment(directory, shards=SHARDS):
+    """DATABASE_URL and CHAT_SHARD_URLS for SQLite files in `directory` (shards=0: unsharded)"""
+    settings = {'DATABASE_URL': f'sqlite:///{directory}/primary.db',
+                'CHAT_SHARD_URLS': shard_urls(directory, shards) if shards else ''}
+    saved = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def make_app(directory, shards=SHARDS):
+    """App with a SQLite primary and `shards` SQLite shards in `directory`"""
+    with environment(directory, shards):
+        return create_app()
+
+
+def add_users_with_chats(count, messages=2):
+    """Create users, each with one chat of `messages` messages on the user's shard"""
+    user_ids = []
+    for number in range(count):
+        user = User(username=f'user{number}', email=f'user{number}@example.com')
+        db.session.add(user)
+        db.session.commit()
+        user_ids.append(user.id)
+        with chat_shard(user.id):
+            chat = Chat(title=f'Chat of user{number}', user_id=user.id)
+            db.session.add(chat)
+            db.session.flush()
+            for index in range(messages):
+                db.session.add(ChatHistory(chat_id=chat.id, question=f'q{index}', answer=f'a{index}'))
+            db.session.commit()
+    return user_ids
+
+
+def chats_in(path):
+    """{chat ID: user ID} of the chat rows in a SQLite file"""
+    connection = sqlite3.connect(path)
+    try:
+        return dict(connection.execute('SELECT id, user_id FROM chat'))
+    finally:
+        connection.close()
+
+
+def test_jump_hash_moves_few_keys():
+    """Adding a shard moves about 1/N of the users, all of them to the new shard"""
+    print("Testing jump consistent hash...")
+    keys = range(1, 20001)
+    before = [jump_hash(key, 4) for key in keys]
+    after = [jump_hash(key, 5) for key in keys]
+    moved = [(old, new) for old, new in zip(before, after) if old != new]
+    assert all(new == 4 for _, new in moved)
+    assert 0.17 < len(moved) / len(keys) < 0.23, len(moved)
+    counts = [after.count(bucket) for bucket in range(5)]
+    assert max(counts) / min(counts) < 1.1, counts
+    print(f"✓ {len(moved)} of {len(keys)} keys moved to the new shard; sizes {counts}")
+
+
+def test_chat_data_lands_on_user_shard():
+    """Chats and messages are written to, and read from, their owner's shard only"""
+    print("Testing chat data placement...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        with app.app_context():
+            user_ids = add_users_with_chats(12)
+            placement = {user_id: user_shard(user_id) for user_id in user_ids}
+            assert set(placement.values()) == set(range(SHARDS)), placement
+
+            for user_id in user_ids:
+                with chat_shard(user_id):
+                    chats = Chat.query.filter_by(user_id=user_id).all()
+                    assert len(chats) == 1 and chats[0].message_count == 2
+                    assert chats[0].id >= 1 << 40  # generated, time-ordered ID
+
+        for index in range(SHARDS):
+            owners = set(chats_in(f'{directory}/shard{index}.db').values())
+            assert owners == {user_id for user_id, shard in placement.items() if shard == index}
+        assert not chats_in(f'{directory}/primary.db')
+    print("✓ every chat is on its owner's shard and nowhere else")
+
+
+def test_reshard_moves_only_changed_users():
+    """reshard.py copies moved users, keeps their IDs, and cleans up the old shard"""
+    print("Testing resharding...")
+    import reshard
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Start unsharded: all chat data on the primary
+        app = make_app(directory, shards=0)
+        with app.app_context():
+            user_ids = add_users_with_chats(10)
+        original = chats_in(f'{directory}/primary.db')
+        assert len(original) == 10
+
+        two = SimpleNamespace(source=None, target=shard_urls(directory, 2), execute=True)
+        with environment(directory, shards=0):
+            assert reshard.copy(two)
+            assert reshard.copy(two)  # repeatable
+            assert reshard.cleanup(two)
+        assert not chats_in(f'{directory}/primary.db')
+        placed = {**chats_in(f'{directory}/shard0.db'), **chats_in(f'{directory}/shard1.db')}
+        assert placed == original  # same chat IDs, same owners, no duplicates
+
+        # Grow to three shards: only users whose shard changes move
+        three = SimpleNamespace(source=shard_urls(directory, 2), target=shard_urls(directory, 3), execute=True)
+        before = {chat_id: jump_hash(user_id, 2) for chat_id, user_id in placed.items()}
+        with environment(directory, shards=3):
+            assert reshard.copy(three)
+            assert reshard.cleanup(three)
+        for index in range(3):
+            for chat_id, user_id in chats_in(f'{directory}/shard{index}.db').items():
+                assert jump_hash(user_id, 3) == index
+                assert index == 2 or before[chat_id] == index
+        moved = len(chats_in(f'{directory}/shard2.db'))
+
+        app = make_app(directory, shards=3)
+        with app.app_context():
+            for user_id in user_ids:
+                with chat_shard(user_id):
+                    chat = Chat.query.filter_by(user_id=user_id).one()
+                    assert ChatHistory.query.filter_by(chat_id=chat.id).count() == 2
+    print(f"✓ 10 users moved onto 2 shards, then {moved} moved to the third")
+
+
+def generate_in_workers(app, workers, count):
+    """Fork `workers` processes that each generate `count` IDs at the same time"""
+    from app.services.sharding import id_generator
+
+    with app.app_context():
+        db.engine.dispose()
+    read_fd, write_fd = os.pipe()
+    start_read, start_write = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.close(start_write)
+            code = 0
+            try:
+                with app.app_context():
+                    db.engine.dispose(close=False)
+                    id_generator.next_id()  # lease a node before the race
+                    os.read(start_read, 1)
+                    ids = [id_generator.next_id() for _ in range(count)]
+                    id_generator.release()
+                with os.fdopen(write_fd, 'w') as out:
+                    out.write('\n'.join(map(str, ids)) + '\n')
+            except BaseException as e:
+                print(f"❌ worker failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        pids.append(pid)
+    os.close(write_fd)
+    os.close(start_read)
+    os.write(start_write, b'x' * workers)
+    os.close(start_write)
+    with os.fdopen(read_fd) as results:
+        ids = [int(line) for line in results if line.strip()]
+    failed = [pid for pid in pids if os.waitpid(pid, 0)[1] != 0]
+    assert not failed, f"{len(failed)} workers failed"
+    return ids
+
+
+def test_ids_unique_across_forked_workers():
+    """Forked workers lease distinct nodes, so their IDs never collide"""
+    print("Testing ID uniqueness across forked workers...")
+    from app.services.sharding import IdGenerator
+
+    workers, count = 6, 3000
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        ids = generate_in_workers(app, workers, count)
+
+    assert len(ids) == workers * count, len(ids)
+    duplicates = len(ids) - len(set(ids))
+    assert duplicates == 0, f"{duplicates} duplicate IDs"
+    node_mask = (1 << IdGenerator.NODE_BITS) - 1
+    nodes = {(i >> IdGenerator.SEQUENCE_BITS) & node_mask for i in ids}
+    assert len(nodes) == workers, nodes
+    assert max(ids) < 2 ** 53
+    print(f"✓ {len(ids)} IDs from {workers} workers, no duplicates")
+
+
+def test_released_node_continues_after_last_id():
+    """A process taking over a released node starts after its last millisecond"""
+    print("Testing node hand-over...")
+    from app.services.sharding import IdGenerator
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        with app.app_context():
+            first = IdGenerator()
+            issued = [first.next_id() for _ in range(200)]
+            node = first.node
+            first.release()
+            # Leave only that node free
+            table = db.metadata.tables['node_leases']
+            with db.engine.begin() as connection:
+                connection.execute(table.update().where(table.c.node != node)
+                                   .values(expires_at=datetime(2999, 1, 1)))
+
+            second = IdGenerator()
+            taken = second.next_id()
+            assert second.node == node, (second.node, node)
+            assert taken > max(issued)
+            second.release()
+    print("✓ the next holder of a node continues after the previous one")
+
+
+def main():
+    """Main test function."""
+    print("=== Sharding Test ===\n")
+
+    tests = [
+        test_jump_hash_moves_few_keys,
+        test_chat_data_lands_on_user_shard,
+        test_reshard_moves_only_changed_users,
+        test_ids_unique_across_forked_workers,
+        test_released_node_continues_after_last_id
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
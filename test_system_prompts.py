@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Test system prompt templates: validation, the compiled template cache keyed
+by version, and per-chat and per-user templates applied to sends
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.models import Chat, User
+from app.services.llm_providers import DEFAULT_SYSTEM_PROMPT, EchoProvider, ProviderRegistry
+from app.services.system_prompts import (TemplateCache, compile_template, next_version, resolve_system_prompt,
+                                         template_cache)
+from app.views.chat import chat_controller
+
+
+class RecordingProvider(EchoProvider):
+    """Echo provider that keeps the system prompt of every call"""
+
+    def __init__(self):
+        self.system_prompts = []
+
+    def _complete(self, messages, model, max_tokens, temperature, stop=None):
+        self.system_prompts.append(messages[0]['content'])
+        return super()._complete(messages, model, max_tokens, temperature, stop)
+
+
+class Owner:
+    """User or chat stand-in that counts reads of its template text"""
+
+    def __init__(self, id, system_prompt=None, version=0, **fields):
+        self.id = id
+        self._text = system_prompt
+        self.system_prompt_version = version
+        self.reads = 0
+        self.__dict__.update(fields)
+
+    @property
+    def system_prompt(self):
+        self.reads += 1
+        return self._text
+
+    def set_prompt(self, text):
+        self._text = text
+        self.system_prompt_version = next_version(self.system_prompt_version)
+
+
+def expect_invalid(text, message, **kwargs):
+    try:
+        compile_template(text, **kwargs)
+    except ValueError as e:
+        assert message in str(e), e
+        return
+    raise AssertionError(f"{text!r} should be rejected")
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory` and one user"""
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', 'CHAT_SHARD_URLS')}
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/app.db'
+    os.environ['CHAT_SHARD_URLS'] = ''
+    try:
+        app = create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    with app.app_context():
+        user = User(username='ada', email='ada@example.com', name='Ada',
+                    password_hash=generate_password_hash('secret'))
+        db.session.add(user)
+        db.session.flush()
+        chat = Chat(title='Trip', user_id=user.id)
+        db.session.add(chat)
+        db.session.commit()
+        app.config['TEST_CHAT_ID'] = chat.id
+    return app
+
+
+def test_compile_template():
+    """Templates are validated when set: length, syntax and known placeholders"""
+    print("Testing template validation...")
+    template = compile_template('Hi $name, costs are in $$. ${default_prompt}')
+    assert template.render(name='Ada', default_prompt='Be kind.') == 'Hi Ada, costs are in $. Be kind.'
+
+    expect_invalid('   ', 'non-empty')
+    expect_invalid(None, 'non-empty')
+    expect_invalid('x' * 11, 'at most 10 characters', max_length=10)
+    expect_invalid('Costs $ 5', 'malformed placeholder')
+    expect_invalid('Mail $email about $name', 'Unknown placeholder $email')
+    print("✓ empty, long, malformed and unknown-placeholder templates rejected")
+
+    now = int(time.time() * 1000)
+    assert next_version(0) >= now
+    assert next_version(now + 10 ** 6) == now + 10 ** 6 + 1
+    print("✓ versions always increase")
+
+
+def test_template_cache():
+    """A cached version is never reloaded; least recently used entries are evicted"""
+    print("Testing the template cache...")
+    cache = TemplateCache(maxsize=2)
+    loads = []
+
+    def load(text):
+        return lambda: loads.append(text) or text
+
+    first = cache.get(('user', 1, 1), load('one'))
+    assert cache.get(('user', 1, 1), load('changed')) is first and first.text == 'one'
+    assert cache.get(('user', 2, 1), load(None)) is None
+    assert cache.get(('user', 2, 1), load(None)) is None
+    assert loads == ['one', None], loads
+    print("✓ hits (including 'no template') skip the load")
+
+    cache.get(('user', 1, 1), load('one'))
+    cache.get(('chat', 3, 1), load('three'))
+    cache.get(('user', 2, 1), load(None))
+    assert loads == ['one', None, 'three', None], loads
+    print("✓ least recently used entry evicted")
+
+
+def test_resolve_system_prompt():
+    """Chat beats user beats default; a new version is picked up, the same version is not reloaded"""
+    print("Testing prompt resolution...")
+    template_cache.clear()
+    user = Owner(101, username='ada', name=None)
+    chat = Owner(201, title='Trip')
+    assert resolve_system_prompt(user, chat) is None
+    assert user.reads == 0, 'a user without a template is never read'
+
+    user.set_prompt('Help $name with $chat_title.')
+    assert resolve_system_prompt(user, chat) == 'Help ada with Trip.'
+    assert resolve_system_prompt(user) == 'Help ada with .'
+    assert user.reads == 1, user.reads
+    print("✓ user template rendered; its text read once per version")
+
+    chat.set_prompt('$default_prompt Plan $chat_title.')
+    assert resolve_system_prompt(user, chat) == f'{DEFAULT_SYSTEM_PROMPT} Plan Trip.'
+    chat._text = 'Edited without a version bump'
+    assert resolve_system_prompt(user, chat) == f'{DEFAULT_SYSTEM_PROMPT} Plan Trip.'
+    chat.set_prompt('Only $username.')
+    assert resolve_system_prompt(user, chat) == 'Only ada.'
+    print("✓ chat template wins; only a version change invalidates it")
+
+
+def test_templates_applied_to_sends():
+    """Templates set through the API reach the provider on the next send"""
+    print("Testing templates on sends...")
+    provider = RecordingProvider()
+    saved = (chat_controller.providers, chat_controller.router)
+    chat_controller.providers = ProviderRegistry(default='echo')
+    chat_controller.providers.register('echo', provider)
+    chat_controller.router = None
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            app = make_app(directory)
+            chat_id = app.config['TEST_CHAT_ID']
+            client = app.test_client()
+            response = client.post('/auth/login', data={'username': 'ada', 'password': 'secret'})
+            assert response.status_code == 302, response.status_code
+
+            def send():
+                response = client.post('/chat/send_message', json={'chat_id': chat_id, 'message': 'Hi'})
+                assert response.get_json()['success'], response.get_json()
+                return provider.system_prompts[-1]
+
+            assert send() == DEFAULT_SYSTEM_PROMPT
+            response = client.put('/chat/api/system_prompt', json={'system_prompt': 'Mail $email'})
+            assert response.status_code == 400 and 'Unknown placeholder' in response.get_json()['error']
+
+            response = client.put('/chat/api/system_prompt', json={'system_prompt': 'You help $name.'})
+            assert response.get_json()['version'] > 0, response.get_json()
+            assert send() == 'You help Ada.'
+            print("✓ user template applied; invalid templates refused")
+
+            url = f'/chat/api/chat/{chat_id}/system_prompt'
+            client.put(url, json={'system_prompt': 'Plan $chat_title.'})
+            assert send() == 'Plan Trip.'
+            client.put(url, json={'system_prompt': 'Plan $chat_title quickly.'})
+            assert send() == 'Plan Trip quickly.'
+            client.put(url, json={'system_prompt': ''})
+            assert client.get(url).get_json()['system_prompt'] is None
+            assert send() == 'You help Ada.'
+            print("✓ chat template applied, replaced and cleared")
+    finally:
+        chat_controller.providers, chat_controller.router = saved
+
+
+def main():
+    """Main test function."""
+    print("=== System Prompts Test ===\n")
+
+    tests = [
+        test_compile_template,
+        test_template_cache,
+        test_resolve_system_prompt,
+        test_templates_applied_to_sends
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test token usage accounting: per-day rollups upserted as messages are saved,
+the /chat/api/usage report and the daily token budget
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.models import Chat, User, UsageRollup
+from app.services.llm_providers import ProviderRegistry
+from app.views.chat import chat_controller
+
+USAGE = {'prompt_tokens': 30, 'completion_tokens': 10, 'total_tokens': 40}
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory` and one user"""
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', 'CHAT_SHARD_URLS')}
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/app.db'
+    os.environ['CHAT_SHARD_URLS'] = ''
+    try:
+        app = create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    with app.app_context():
+        user = User(username='counter', email='counter@example.com', password_hash=generate_password_hash('secret'))
+        db.session.add(user)
+        db.session.commit()
+        app.config['TEST_USER_ID'] = user.id
+    return app
+
+
+def login(app):
+    client = app.test_client()
+    response = client.post('/auth/login', data={'username': 'counter', 'password': 'secret'})
+    assert response.status_code == 302, response.status_code
+    return client
+
+
+def send(client, chat_id, message):
+    return client.post('/chat/send_message', json={'chat_id': chat_id, 'message': message})
+
+
+def test_rollup_upsert():
+    """Repeat records for a day add up in one row; other days and users stay apart"""
+    print("Testing usage rollups...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        with app.app_context():
+            user_id = app.config['TEST_USER_ID']
+            today = datetime.utcnow().date()
+            yesterday = today - timedelta(days=1)
+            UsageRollup.record(user_id, USAGE)
+            UsageRollup.record(user_id, USAGE)
+            UsageRollup.record(user_id, dict(USAGE, total_tokens=None))
+            UsageRollup.record(user_id, {'total_tokens': 100}, day=yesterday, messages=5)
+            db.session.commit()
+
+            rollup = db.session.get(UsageRollup, (user_id, today))
+            assert (rollup.prompt_tokens, rollup.completion_tokens, rollup.total_tokens,
+                    rollup.message_count) == (90, 30, 80, 3), rollup
+            assert UsageRollup.tokens_for_day(user_id) == 80
+            assert UsageRollup.tokens_for_day(user_id, yesterday) == 100
+            assert UsageRollup.tokens_for_day(user_id + 1) == 0
+            assert UsageRollup.query.count() == 2
+            print("✓ counters incremented in place, missing counts treated as 0")
+
+
+def test_usage_report_and_budget():
+    """Sent messages show up in /chat/api/usage, and the budget stops new sends"""
+    print("Testing the usage report and daily budget...")
+    saved = (chat_controller.providers, chat_controller.router, chat_controller.daily_token_budget)
+    chat_controller.providers = ProviderRegistry(default='echo')
+    chat_controller.router = None
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            app = make_app(directory)
+            client = login(app)
+            chat_controller.daily_token_budget = 0
+
+            response = client.post('/chat/new', json={'first_message': 'How many tokens?'})
+            assert response.get_json()['success'], response.get_json()
+            chat_id = response.get_json()['chat_id']
+            assert send(client, chat_id, 'And now?').get_json()['success']
+
+            usage = client.get('/chat/api/usage?days=7').get_json()
+            assert 'budget' not in usage
+            assert len(usage['days']) == 1 and usage['totals']['message_count'] == 2, usage
+            spent = usage['totals']['total_tokens']
+            with app.app_context():
+                assert spent == db.session.get(Chat, chat_id).total_tokens > 0
+            top = client.get('/chat/api/usage/chats').get_json()['chats']
+            assert [chat['id'] for chat in top] == [chat_id], top
+            print(f"✓ {spent} tokens reported per day, in totals and per chat")
+
+            chat_controller.daily_token_budget = spent
+            budget = client.get('/chat/api/usage').get_json()['budget']
+            assert budget == {'daily_tokens': spent, 'exceeded': True}, budget
+            response = send(client, chat_id, 'One more')
+            assert response.get_json()['error'] == 'Daily token budget exceeded', response.get_json()
+
+            chat_controller.daily_token_budget = spent + 1000
+            assert not client.get('/chat/api/usage').get_json()['budget']['exceeded']
+            assert send(client, chat_id, 'One more').get_json()['success']
+            print("✓ sends refused once today's usage reaches the budget")
+    finally:
+        chat_controller.providers, chat_controller.router, chat_controller.daily_token_budget = saved
+
+
+def main():
+    """Main test function."""
+    print("=== Usage Test ===\n")
+
+    tests = [
+        test_rollup_upsert,
+        test_usage_report_and_budget
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Test write-behind group commit: concurrent messages share transactions,
+every request gets its own durable row, and a bad row only fails itself
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Chat, ChatHistory, UsageRollup, User
+from app.services.write_behind import WriteBehindBuffer
+
+
+def make_app(directory):
+    """App with a SQLite database in `directory`, plus one user and chat"""
+    saved = {name: os.environ.get(name) for name in ('DATABASE_URL', 'CHAT_SHARD_URLS')}
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/app.db'
+    os.environ['CHAT_SHARD_URLS'] = ''
+    try:
+        app = create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    with app.app_context():
+        user = User(username='writer', email='writer@example.com')
+        db.session.add(user)
+        db.session.flush()
+        chat = Chat(title='Write-behind test', user_id=user.id)
+        db.session.add(chat)
+        db.session.commit()
+        app.config['TEST_USER_ID'], app.config['TEST_CHAT_ID'] = user.id, chat.id
+    return app
+
+
+class CountingBuffer(WriteBehindBuffer):
+    """Buffer that records the size of every transaction"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    def _commit(self, batch):
+        self.batches.append(len(batch))
+        return super()._commit(batch)
+
+
+def submit_concurrently(buffer, rows, user_id):
+    """Submit each row from its own thread, all at once; returns (ids, errors)"""
+    ids, errors = [None] * len(rows), [None] * len(rows)
+    start = threading.Barrier(len(rows))
+
+    def send(index):
+        start.wait()
+        try:
+            ids[index] = buffer.submit(rows[index], user_id)
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=send, args=(index,)) for index in range(len(rows))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return ids, errors
+
+
+def message(chat_id, number):
+    return {'chat_id': chat_id, 'question': f'question {number}', 'answer': f'answer {number}',
+            'created_at': datetime.utcnow(), 'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}
+
+
+def test_concurrent_messages_share_transactions():
+    """Messages arriving together are committed in a few transactions"""
+    print("Testing group commit...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        user_id, chat_id = app.config['TEST_USER_ID'], app.config['TEST_CHAT_ID']
+        buffer = CountingBuffer(app, interval_ms=50, max_batch=16)
+        try:
+            ids, errors = submit_concurrently(buffer, [message(chat_id, n) for n in range(40)], user_id)
+        finally:
+            buffer.close()
+
+        assert errors == [None] * 40, errors
+        assert len(set(ids)) == 40 and None not in ids
+        assert sum(buffer.batches) == 40
+        assert max(buffer.batches) <= 16, buffer.batches
+        assert len(buffer.batches) < 40, buffer.batches
+        print(f"✓ 40 messages in {len(buffer.batches)} transactions {buffer.batches}")
+
+        with app.app_context():
+            rows = {row.id: row for row in ChatHistory.query.filter_by(chat_id=chat_id)}
+            assert set(rows) == set(ids)
+            for number, row_id in enumerate(ids):
+                assert rows[row_id].question == f'question {number}'
+            assert db.session.get(Chat, chat_id).total_tokens == 40 * 15
+            rollup = UsageRollup.query.filter_by(user_id=user_id).one()
+            assert (rollup.total_tokens, rollup.message_count) == (40 * 15, 40)
+        print("✓ each request got its own row; chat totals and usage rollup match")
+
+
+def test_bad_row_only_fails_its_own_request():
+    """A row that cannot be inserted fails its request, not the rest of its batch"""
+    print("Testing failure isolation...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        user_id, chat_id = app.config['TEST_USER_ID'], app.config['TEST_CHAT_ID']
+        buffer = CountingBuffer(app, interval_ms=50)
+        rows = [message(chat_id, n) for n in range(8)]
+        rows[3]['question'] = None  # NOT NULL column
+        try:
+            ids, errors = submit_concurrently(buffer, rows, user_id)
+        finally:
+            buffer.close()
+
+        assert errors[3] is not None and ids[3] is None
+        assert all(error is None for index, error in enumerate(errors) if index != 3), errors
+        with app.app_context():
+            assert ChatHistory.query.filter_by(chat_id=chat_id).count() == 7
+            assert UsageRollup.query.filter_by(user_id=user_id).one().message_count == 7
+        print("✓ the other 7 messages were committed")
+
+
+class StuckBuffer(WriteBehindBuffer):
+    """Buffer whose first transaction hangs until released"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = threading.Event()
+
+    def _commit(self, batch):
+        if threading.current_thread() is self._thread:
+            self.release.wait()
+        return super()._commit(batch)
+
+
+def test_stuck_or_dead_writer_does_not_hang_requests():
+    """Queued rows are committed by the request itself, and a dead writer is replaced"""
+    print("Testing stuck and dead writers...")
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        user_id, chat_id = app.config['TEST_USER_ID'], app.config['TEST_CHAT_ID']
+        buffer = StuckBuffer(app, interval_ms=1, timeout=0.3)
+        try:
+            first_error = []
+
+            def submit_first():
+                try:
+                    buffer.submit(message(chat_id, 0), user_id)
+                except TimeoutError as e:
+                    first_error.append(e)
+
+            first = threading.Thread(target=submit_first)
+            first.start()
+            time.sleep(0.1)  # the writer is now stuck on the first row
+            started = time.monotonic()
+            second_id = buffer.submit(message(chat_id, 1), user_id)
+            assert second_id is not None
+            assert time.monotonic() - started < 2
+            print("✓ a queued row was committed by its request after the timeout")
+            buffer.release.set()
+            first.join(timeout=5)
+            # Its transaction was already running, so it could only give up
+            assert first_error, "in-flight row did not time out"
+        finally:
+            buffer.release.set()
+            buffer.close()
+
+        buffer = WriteBehindBuffer(app, interval_ms=1)
+        try:
+            buffer.submit(message(chat_id, 2), user_id)
+            dead = buffer._thread
+            with buffer._cond:
+                buffer._closed = True
+                buffer._cond.notify()
+            dead.join(timeout=5)
+            buffer._closed = False
+            assert buffer.submit(message(chat_id, 3), user_id) is not None
+            assert buffer._thread is not dead and buffer._thread.is_alive()
+        finally:
+            buffer.close()
+
+        with app.app_context():
+            assert ChatHistory.query.filter_by(chat_id=chat_id).count() == 4
+        print("✓ a new writer replaced the dead one")
+
+
+def main():
+    """Main test function."""
+    print("=== Write-Behind Test ===\n")
+
+    tests = [
+        test_concurrent_messages_share_transactions,
+        test_bad_row_only_fails_its_own_request,
+        test_stuck_or_dead_writer_does_not_hang_requests
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
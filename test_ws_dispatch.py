@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test the WebSocket reader: it keeps answering ping and stop frames while
+every in-flight slot is busy, and rejects extra sends instead of blocking
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from app.views.ws import ChatSocket
+
+
+class FakeSocket:
+    """Feeds scripted frames to the reader and collects what is sent back"""
+
+    def __init__(self):
+        self.inbound = queue.Queue()
+        self.sent = queue.Queue()
+
+    def receive(self):
+        return self.inbound.get()
+
+    def send(self, data):
+        self.sent.put(json.loads(data))
+
+    def push(self, **frame):
+        self.inbound.put(json.dumps(frame))
+
+    def next_frame(self, timeout=2):
+        try:
+            return self.sent.get(timeout=timeout)
+        except queue.Empty:
+            raise AssertionError(f'no frame within {timeout}s') from None
+
+
+class BlockingController:
+    """Streams until the request is cancelled"""
+
+    def __init__(self):
+        self.started = threading.Semaphore(0)
+
+    def stream_message(self, chat_id, message, on_token, cancel=None, **kwargs):
+        self.started.release()
+        stopped = cancel.wait(timeout=5)
+        return True, 'ok', {'response': 'partial', 'timestamp': 'now', 'stopped': stopped}
+
+
+def test_reader_not_blocked_by_busy_slots():
+    """Ping, stop and over-limit sends are answered while both slots are held"""
+    print("Testing WebSocket reader under a full in-flight limit...")
+    ws = FakeSocket()
+    controller = BlockingController()
+    connection = ChatSocket(ws, user_id=1, chat_controller=controller, max_inflight=2)
+    app = Flask(__name__)
+
+    def serve():
+        with app.test_request_context():
+            connection.serve()
+
+    server = threading.Thread(target=serve, daemon=True)
+    server.start()
+    try:
+        assert ws.next_frame()['type'] == 'ready'
+        ws.push(id='r1', type='send', chat_id=1, message='one')
+        ws.push(id='r2', type='send', chat_id=1, message='two')
+        assert controller.started.acquire(timeout=2) and controller.started.acquire(timeout=2)
+
+        ws.push(id='r3', type='send', chat_id=1, message='three')
+        busy = ws.next_frame()
+        assert (busy['id'], busy['type'], busy['code']) == ('r3', 'error', 'busy'), busy
+        ws.push(id='p1', type='ping')
+        assert ws.next_frame() == {'id': 'p1', 'type': 'pong'}
+        print("✓ extra sends get a busy error and pings are answered")
+
+        ws.push(id='s1', type='stop', request='r1')
+        done = ws.next_frame()
+        assert (done['id'], done['type'], done['stopped']) == ('r1', 'done', True), done
+        print("✓ a stop frame reaches a running request")
+    finally:
+        ws.inbound.put(None)
+        for cancel in list(connection.cancels.values()):
+            cancel.set()
+        server.join(timeout=5)
+
+
+def test_stop_right_after_send():
+    """A stop sent straight after its send is not lost"""
+    print("Testing stop immediately after send...")
+    ws = FakeSocket()
+    controller = BlockingController()
+    connection = ChatSocket(ws, user_id=1, chat_controller=controller)
+    app = Flask(__name__)
+    with app.test_request_context():
+        connection._dispatch(json.dumps({'id': 'r1', 'type': 'send', 'chat_id': 1, 'message': 'hi'}))
+        connection._dispatch(json.dumps({'id': 's1', 'type': 'stop', 'request': 'r1'}))
+        event = connection.outbound.get(timeout=5)
+        assert (event['type'], event['stopped']) == ('done', True), event
+    print("✓ the request stopped")
+
+
+def main():
+    """Main test function."""
+    print("=== WebSocket Dispatch Test ===\n")
+
+    tests = [
+        test_reader_not_blocked_by_busy_slots,
+        test_stop_right_after_send
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+        print()
+
+    print("=== Test Results ===")
+    print(f"Passed: {passed}/{len(tests)}")
+    if passed != len(tests):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Bart Chatbot - Production WSGI Entry Point
+
+Serve with:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+import resource
+import time
+
+_boot_started = time.perf_counter()
+
+from app import create_app, db
+
+# Create the application
+app = create_app()
+
+BOOT_SECONDS = time.perf_counter() - _boot_started
+
+
+def current_rss_mb():
+    """
+    Get resident set size of the current process
+
+    Returns:
+        float: RSS in megabytes (peak RSS where /proc is unavailable)
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        # ru_maxrss is KB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if os.uname().sysname == 'Darwin' else maxrss / 1024
+
+
+def dispose_db_connections():
+    """
+    Drop pooled connections inherited from the parent process.
+
+    Must run in each worker after fork when the app is preloaded, otherwise
+    workers would share the master's sockets. Covers every engine: the
+    primary, read replicas and chat shards.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)